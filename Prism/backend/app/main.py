@@ -1,4 +1,4 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form, Request
 # try:
 #     import torch
 # except ImportError:
@@ -8,21 +8,27 @@ from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, F
 # ... (omitting lines for brevity, the tool finds the import line by context or I replace just the import)
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import os
 import shutil
 from pathlib import Path
 import logging
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 import uuid
+import asyncio
 
 from .services.qa_service import qa_service
 from .services.audit_service import audit_service
-from .services.llm_service import ollama_llm
+from .services.llm_service import ollama_llm, OllamaConfig, LLMQueueTimeout
 from .services.progress_service import progress_service
 from .services.progress_service import progress_service
 from .services.audio_service import audio_service
 from .services.folder_service import folder_service
+from .services.deletion_service import deletion_service
+from .services.qdrant_service import qdrant_service
+from .services.singleflight import SingleFlight
+from .services.deadline import Deadline, RequestCancelled
 import base64
 
 # -------------------------------------------------
@@ -74,12 +80,41 @@ class QuestionRequest(BaseModel):
     question: str
     file_id: Optional[str] = None
     folder_id: Optional[str] = None
+    expansion_mode: Optional[str] = None  # local | llm | off (defaults to QUERY_EXPANSION_MODE)
+    budget_ms: Optional[int] = None  # latency budget; defaults to QA_BUDGET_MS (0 = unlimited)
+    profile: Optional[str] = None  # low_latency | balanced | high_recall (defaults to RETRIEVAL_PROFILE)
 
 class QuestionResponse(BaseModel):
     success: bool
     answer: Optional[str] = None
     sources: Optional[list] = None
     chunks_used: Optional[int] = None
+    expansion: Optional[dict] = None
+    routing: Optional[dict] = None
+    profile: Optional[str] = None
+    deadline: Optional[dict] = None  # budget, elapsed time and degradations taken
+    error: Optional[str] = None
+
+class SearchRequest(BaseModel):
+    query: str
+    file_id: Optional[str] = None
+    folder_id: Optional[str] = None
+    file_type: Optional[str] = None
+    rerank: bool = True  # False: fused hybrid order only (fastest)
+    page: int = 1
+    page_size: int = 10
+    profile: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    success: bool
+    query: Optional[str] = None
+    results: Optional[list] = None
+    page: Optional[int] = None
+    page_size: Optional[int] = None
+    has_more: Optional[bool] = None
+    candidates: Optional[int] = None
+    profile: Optional[str] = None
+    took_ms: Optional[float] = None
     error: Optional[str] = None
 
 class ChatRequest(BaseModel):
@@ -91,6 +126,43 @@ class ChatResponse(BaseModel):
     model_info: Optional[dict] = None
     error: Optional[str] = None
 
+# -------------------------------------------------
+# Client disconnects
+# -------------------------------------------------
+
+DISCONNECT_POLL_S = float(os.getenv("DISCONNECT_POLL_S", "0.5"))
+# endpoint -> requests whose client left before the answer was ready
+client_disconnects = {}
+
+
+async def run_until_disconnect(
+    http_request: Request,
+    endpoint: str,
+    work: Awaitable,
+    on_disconnect: Optional[Callable[[], None]] = None
+):
+    """
+    Await `work` while polling the client connection. If the client goes away first,
+    call on_disconnect (e.g. Deadline.cancel, so the worker thread stops at its next
+    stage or mid-stream), drop the await and raise RequestCancelled.
+    """
+    task = asyncio.ensure_future(work)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            break
+
+    if on_disconnect is not None:
+        on_disconnect()
+    # Threadpool work cannot be interrupted; it winds down on its own once cancelled
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    task.cancel()
+    client_disconnects[endpoint] = client_disconnects.get(endpoint, 0) + 1
+    logger.info(f"Client disconnected from {endpoint}, pending work cancelled")
+    raise RequestCancelled(endpoint)
+
 # -------------------------------------------------
 # Root / Health
 # -------------------------------------------------
@@ -105,6 +177,23 @@ async def root():
         "provider": "ollama",
     }
 
+# -------------------------------------------------
+# Metrics
+# -------------------------------------------------
+
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "question_coalescing": question_flight.metrics(),
+        "llm_gateway": ollama_llm.gateway.metrics(),
+        "cancellation": {
+            "client_disconnects": dict(client_disconnects),
+            "qa_cancelled_by_stage": dict(qa_service.cancelled_by_stage),
+            "llm_streams_aborted": ollama_llm.streams_aborted,
+            "llm_chunks_discarded": ollama_llm.chunks_discarded,
+        },
+    }
+
 # -------------------------------------------------
 # Model status
 # -------------------------------------------------
@@ -114,8 +203,10 @@ async def model_status():
     return {
         "model_loaded": ollama_llm.is_ready(),
         "model_name": os.getenv("OLLAMA_MODEL", "deepseek-v3.1:671b-cloud"),
-        "ollama_url": os.getenv("OLLAMA_URL", "http://localhost:11434"),
+        "ollama_url": OllamaConfig.URLS[0],
+        "ollama_urls": OllamaConfig.URLS,
         "provider": "ollama",
+        "health": ollama_llm.health(),
     }
 
 # -------------------------------------------------
@@ -190,7 +281,7 @@ class ImageQuestionRequest(BaseModel):
     image_id: str
 
 @app.post("/api/image-question")
-async def ask_image_question(request: ImageQuestionRequest):
+async def ask_image_question(request: ImageQuestionRequest, http_request: Request):
     # Find the image file
     upload_dir = Path("data/uploads")
     image_path = None
@@ -227,9 +318,17 @@ async def ask_image_question(request: ImageQuestionRequest):
             logger.warning(f"Failed to convert image {image_path}, falling back to raw bytes: {img_err}")
             image_base64 = base64.b64encode(img_bytes).decode('utf-8')
         
-        response = ollama_llm.generate_vision_response(
-            prompt=request.question,
-            image_base64=image_base64
+        token = Deadline(0)
+        response = await run_until_disconnect(
+            http_request,
+            "image-question",
+            run_in_threadpool(
+                ollama_llm.generate_vision_response,
+                prompt=request.question,
+                image_base64=image_base64,
+                should_stop=lambda: token.cancelled
+            ),
+            on_disconnect=token.cancel
         )
         
         sources = [{"file_name": image_path.name}]
@@ -247,6 +346,8 @@ async def ask_image_question(request: ImageQuestionRequest):
             "answer": response,
             "sources": sources
         }
+    except RequestCancelled as e:
+        return {"success": False, "error": str(e)}
     except Exception as e:
         logger.error(f"Image Q&A error: {e}")
         return {
@@ -259,7 +360,7 @@ class AudioQuestionRequest(BaseModel):
     audio_id: str
 
 @app.post("/api/audio-question")
-async def ask_audio_question(request: AudioQuestionRequest):
+async def ask_audio_question(request: AudioQuestionRequest, http_request: Request):
     # Find the audio file
     upload_dir = Path("data/uploads")
     audio_path = None
@@ -272,7 +373,9 @@ async def ask_audio_question(request: AudioQuestionRequest):
     if not audio_path:
         raise HTTPException(status_code=404, detail="Audio not found")
 
-    try:
+    token = Deadline(0)
+
+    def transcribe_and_answer():
         # Check for existing transcript
         transcript_path = audio_path.with_suffix('.txt')
         transcript = ""
@@ -282,12 +385,18 @@ async def ask_audio_question(request: AudioQuestionRequest):
         else:
             # Transcribe
             transcript = audio_service.transcribe(str(audio_path))
-            # Save for future use
+            # Save for future use (even if the client has gone, the next ask reuses it)
             transcript_path.write_text(transcript, encoding='utf-8')
             
         # Ask LLM
+        token.check("generation")
         context = f"Audio Transcript:\n{transcript}"
-        answer = ollama_llm.answer_question(context, request.question)
+        return ollama_llm.answer_question(context, request.question, should_stop=lambda: token.cancelled)
+
+    try:
+        answer = await run_until_disconnect(
+            http_request, "audio-question", run_in_threadpool(transcribe_and_answer), on_disconnect=token.cancel
+        )
         
         sources = [{"file_name": audio_path.name, "timestamp": "Full Audio"}]
 
@@ -305,6 +414,8 @@ async def ask_audio_question(request: AudioQuestionRequest):
             "sources": sources
         }
         
+    except RequestCancelled as e:
+        return {"success": False, "error": str(e)}
     except Exception as e:
         logger.error(f"Audio Q&A error: {e}")
         return {
@@ -317,12 +428,23 @@ class VideoQuestionRequest(BaseModel):
     video_id: str
 
 @app.post("/api/video-question")
-async def ask_video_question(request: VideoQuestionRequest):
+async def ask_video_question(request: VideoQuestionRequest, http_request: Request):
     # Use the general QA service tailored to this file
-    result = qa_service.answer_question(
-        question=request.question,
-        file_id=request.video_id
-    )
+    deadline = Deadline()
+    try:
+        result = await run_until_disconnect(
+            http_request,
+            "video-question",
+            run_in_threadpool(
+                qa_service.answer_question,
+                question=request.question,
+                file_id=request.video_id,
+                deadline=deadline
+            ),
+            on_disconnect=deadline.cancel
+        )
+    except RequestCancelled as e:
+        return {"success": False, "error": str(e)}
 
     if result["success"]:
         return {
@@ -343,6 +465,8 @@ from .services.ingestion_service import ingestion_service
 
 @app.on_event("startup")
 async def startup_event():
+    # Ollama health probe + model preload (keeps /api/question from probing per request)
+    await run_in_threadpool(ollama_llm.start_health_probe)
     await ingestion_service.start()
     if os.getenv("ENABLE_BACKGROUND_INGESTION", "false").lower() != "true":
         logger.info("Background ingestion service is disabled. Files will stay in 'pending' status.")
@@ -350,6 +474,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     await ingestion_service.stop()
+    await run_in_threadpool(qdrant_service.close)
 
 # -------------------------------------------------
 # Processing status
@@ -441,7 +566,6 @@ async def upload_document(
             logger.error(f"Failed to assign file {file_id} to folder {folder_id}: {e}")
 
     # Use IngestionService (FAST SYNC & Synchronous)
-    import asyncio
     await ingestion_service.process_document_sync(upload_path, file_id, folder_id)
 
     return {
@@ -457,18 +581,31 @@ async def upload_document(
 # -------------------------------------------------
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
     if not ollama_llm.is_ready():
         raise HTTPException(status_code=503, detail="Ollama server not running")
 
-    response_text = ollama_llm.generate_response(
-        prompt=request.message,
-        max_tokens=512,
-        temperature=0.7,
-    )
+    token = Deadline(0)
+    try:
+        response_text = await run_until_disconnect(
+            http_request,
+            "chat",
+            run_in_threadpool(
+                ollama_llm.generate_response,
+                prompt=request.message,
+                max_tokens=512,
+                temperature=0.7,
+                should_stop=lambda: token.cancelled,
+            ),
+            on_disconnect=token.cancel
+        )
+    except RequestCancelled as e:
+        return ChatResponse(success=False, error=str(e))
+    except LLMQueueTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     # Log to audit history
     audit_service.log_event("CHAT_TRACE", {
@@ -490,20 +627,59 @@ async def chat(request: ChatRequest):
 # Document Q&A
 # -------------------------------------------------
 
-@app.post("/api/question", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
-    result = qa_service.answer_question(
-        question=request.question,
-        file_id=request.file_id,
-        folder_id=request.folder_id,
+# Identical questions in flight at the same time share one pipeline run
+question_flight = SingleFlight("question")
+
+
+def _question_key(request: QuestionRequest) -> tuple:
+    """Normalized question + everything else that changes the answer."""
+    question = " ".join(request.question.lower().split()).rstrip("?!. ")
+    return (
+        question,
+        request.file_id,
+        request.folder_id,
+        request.expansion_mode,
+        request.budget_ms,
+        request.profile,
     )
 
+
+@app.post("/api/question", response_model=QuestionResponse)
+async def ask_question(request: QuestionRequest, http_request: Request):
+    # Run in the threadpool so concurrent duplicates can actually wait on the leader.
+    # The shared run is cancelled only once every client waiting on it has disconnected.
+    deadline = Deadline(request.budget_ms)
+    try:
+        result = await run_until_disconnect(
+            http_request,
+            "question",
+            question_flight.do(
+                _question_key(request),
+                lambda: run_in_threadpool(
+                    qa_service.answer_question,
+                    question=request.question,
+                    file_id=request.file_id,
+                    folder_id=request.folder_id,
+                    expansion_mode=request.expansion_mode,
+                    deadline=deadline,
+                    profile=request.profile,
+                ),
+                abort=deadline.cancel
+            )
+        )
+    except RequestCancelled as e:
+        return QuestionResponse(success=False, error=str(e))
+
     if result["success"]:
         return QuestionResponse(
             success=True,
             answer=result["answer"],
             sources=result["sources"],
-            chunks_used=result["chunks_used"],
+            chunks_used=result.get("chunks_used"),
+            expansion=result.get("expansion"),
+            routing=result.get("routing"),
+            profile=result.get("profile"),
+            deadline=result.get("deadline"),
         )
 
     return QuestionResponse(
@@ -511,6 +687,29 @@ async def ask_question(request: QuestionRequest):
         error=result["error"],
     )
 
+# -------------------------------------------------
+# Passage search (retrieval only, no LLM)
+# -------------------------------------------------
+
+@app.post("/api/search", response_model=SearchResponse)
+async def search_passages(request: SearchRequest):
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query is empty")
+
+    # Retrieval and reranking are CPU-bound: keep them off the event loop
+    result = await run_in_threadpool(
+        qa_service.search_passages,
+        query=request.query,
+        file_id=request.file_id,
+        folder_id=request.folder_id,
+        file_type=request.file_type,
+        rerank=request.rerank,
+        page=request.page,
+        page_size=request.page_size,
+        profile=request.profile,
+    )
+    return SearchResponse(**result)
+
 # -------------------------------------------------
 # History / Audit
 # -------------------------------------------------
@@ -548,16 +747,15 @@ async def get_document_info(file_id: str):
 
 @app.delete("/api/documents/{file_id}")
 async def delete_document(file_id: str):
-    qa_service.document_chunks.pop(file_id, None)
-    qa_service.document_metadata.pop(file_id, None)
-
-    processed_file = Path("data/processed") / f"{file_id}.json"
-    if processed_file.exists():
-        processed_file.unlink()
+    report = await deletion_service.delete_files([file_id])
 
     return {
-        "success": True,
-        "message": f"Document '{file_id}' deleted successfully",
+        "success": not report["errors"],
+        "message": (
+            f"Document '{file_id}' deleted successfully" if not report["errors"]
+            else f"Document '{file_id}' deleted with errors: {'; '.join(report['errors'])}"
+        ),
+        "report": report,
     }
 
 # -------------------------------------------------
@@ -613,51 +811,11 @@ class BulkDeleteRequest(BaseModel):
 
 @app.delete("/api/files/bulk-delete")
 async def bulk_delete_files(request: BulkDeleteRequest):
-    deleted_count = 0
-    errors = []
-
-    for file_id in request.file_ids:
-        try:
-            # 1. Remove from memory chunks
-            qa_service.document_chunks.pop(file_id, None)
-            qa_service.document_metadata.pop(file_id, None)
-
-            # 2. Remove processed JSON
-            processed_file = Path("data/processed") / f"{file_id}.json"
-            if processed_file.exists():
-                processed_file.unlink()
-
-            # 3. Remove physical file (finding by prefix if necessary, but we store full name in metadata usually)
-            # However, uploads are stored as uuid_original.name. 
-            # We need to find the file in uploads dir that starts with file_id or matches the stored path
-            # Ideally we check metadata for the path.
-            # If metadata is already popped, we might lose the path, so let's get it first or just glob.
-            # file_id in main.py upload is `safe_filename` which IS the filename on disk.
-            upload_path = Path("data/uploads") / file_id
-            if not upload_path.exists():
-                # Try finding by glob if extension is missing/unknown (though file_id usually has extension in this codebase? 
-                # Wait, upload says: `file_id = safe_filename`. So likely it includes extension.
-                # Just in case, let's try to remove it directly.
-                pass
-            
-            if upload_path.exists():
-                 upload_path.unlink()
-
-            # 4. Unassign from folders
-            folder_service.unassign_file(file_id)
-
-            # 5. Remove from Vector Store
-            llama_service.delete_file(file_id)
-            
-            deleted_count += 1
-            
-        except Exception as e:
-            errors.append(f"Failed to delete {file_id}: {str(e)}")
-            logger.error(f"Bulk delete error for {file_id}: {e}")
+    report = await deletion_service.delete_files(request.file_ids)
 
     return {
-        "success": True, 
-        "deleted_count": deleted_count,
-        "errors": errors
+        "success": not report["errors"],
+        "deleted_count": report["deleted_files"],
+        "errors": report["errors"],
+        "report": report,
     }
-
@@ -0,0 +1,251 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+class LocalAnnIndex:
+    """
+    In-process HNSW index (hnswlib) over the dense vectors of the embedded store.
+    The embedded Qdrant client scans every vector per query; this index gives the
+    local deployment real ANN search. Labels map to Qdrant point ids through a
+    sidecar JSON persisted next to the index file. The owner saves after each write
+    batch; a marker file flags writes that never reached disk, so a crash between a
+    write and its save is caught on load even if the vector count still matches.
+    """
+
+    # Scopes come in as allowed point ids; point payloads are not kept
+    SCOPES_BY_PAYLOAD = False
+
+    def __init__(
+        self,
+        index_dir: str,
+        dim: int,
+        m: int = 32,
+        ef_construct: int = 200,
+        ef_search: int = 512,
+        initial_capacity: int = 10000,
+        exact_scope_limit: int = 2000
+    ):
+        self.index_dir = Path(index_dir)
+        self.index_file = self.index_dir / "dense.hnsw"
+        self.labels_file = self.index_dir / "labels.json"
+        self.unsaved_file = self.index_dir / "unsaved"
+        self.dim = dim
+        self.m = m
+        self.ef_construct = ef_construct
+        self.ef_search = ef_search
+        self.initial_capacity = initial_capacity
+        # Scopes at or below this size are scored exactly instead of filtered HNSW
+        self.exact_scope_limit = exact_scope_limit
+
+        self._lock = threading.RLock()
+        self._index = None
+        self._label_to_point: List[Optional[str]] = []
+        self._point_to_label = {}
+        self._deleted: Set[int] = set()
+        self._dirty = False
+
+    @staticmethod
+    def is_available() -> bool:
+        return hnswlib is not None
+
+    @property
+    def count(self) -> int:
+        return len(self._point_to_label)
+
+    def point_ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._point_to_label)
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+
+    def _new_index(self, capacity: int):
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(
+            max_elements=capacity,
+            ef_construction=self.ef_construct,
+            M=self.m
+        )
+        index.set_ef(self.ef_search)
+        return index
+
+    def load(self):
+        with self._lock:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            if self.unsaved_file.exists():
+                logger.warning("Local ANN index has writes that were never saved. Starting empty.")
+            elif self.index_file.exists() and self.labels_file.exists():
+                try:
+                    with open(self.labels_file, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                    self._label_to_point = state["labels"]
+                    self._deleted = set(state.get("deleted", []))
+                    self._point_to_label = {
+                        pid: label for label, pid in enumerate(self._label_to_point)
+                        if pid is not None and label not in self._deleted
+                    }
+                    capacity = max(self.initial_capacity, len(self._label_to_point))
+                    self._index = hnswlib.Index(space="ip", dim=self.dim)
+                    self._index.load_index(str(self.index_file), max_elements=capacity)
+                    self._index.set_ef(self.ef_search)
+                    logger.info(f"Loaded local ANN index with {self.count} vectors")
+                    return
+                except Exception as e:
+                    logger.warning(f"Failed to load local ANN index: {e}. Starting empty.")
+
+            self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._index = self._new_index(self.initial_capacity)
+            self._label_to_point = []
+            self._point_to_label = {}
+            self._deleted = set()
+            self._dirty = True
+            self.save()
+
+    def _mark_dirty(self):
+        if not self._dirty:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            self.unsaved_file.touch()
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            self._index.save_index(str(self.index_file))
+            tmp = self.labels_file.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"labels": self._label_to_point, "deleted": sorted(self._deleted)}, f)
+            tmp.replace(self.labels_file)
+            self.unsaved_file.unlink(missing_ok=True)
+            self._dirty = False
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    def add(self, point_ids: List[str], vectors, payloads: Optional[List[Dict]] = None):
+        if not point_ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            labels = []
+            for pid in point_ids:
+                label = self._point_to_label.get(pid)
+                if label is None:
+                    if self._deleted:
+                        label = self._deleted.pop()
+                        self._label_to_point[label] = pid
+                    else:
+                        label = len(self._label_to_point)
+                        self._label_to_point.append(pid)
+                    self._point_to_label[pid] = label
+                labels.append(label)
+
+            needed = len(self._label_to_point)
+            capacity = self._index.get_max_elements()
+            if needed > capacity:
+                self._index.resize_index(max(needed, capacity * 2))
+
+            # Re-adding a deleted label unmarks it and overwrites its vector
+            self._mark_dirty()
+            self._index.add_items(vectors, np.asarray(labels))
+
+    def delete(self, point_ids: List[str]) -> int:
+        removed = 0
+        with self._lock:
+            for pid in point_ids:
+                label = self._point_to_label.pop(pid, None)
+                if label is None:
+                    continue
+                self._mark_dirty()
+                try:
+                    self._index.mark_deleted(label)
+                except RuntimeError:
+                    pass
+                self._label_to_point[label] = None
+                self._deleted.add(label)
+                removed += 1
+        return removed
+
+    # -------------------------
+    # Search
+    # -------------------------
+
+    def search(
+        self,
+        query_vec,
+        k: int,
+        allowed_point_ids: Optional[Set[str]] = None,
+        ef: Optional[int] = None,
+        exact: Optional[bool] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k (point_id, cosine score). allowed_point_ids pre-filters the search:
+        small scopes are scored exactly, larger ones use filtered HNSW.
+        ef overrides the search beam width, exact forces (or rules out) exact scoring of the scope.
+        """
+        ef = ef or self.ef_search
+        query = np.asarray(query_vec, dtype=np.float32).reshape(1, -1)
+
+        with self._lock:
+            if self.count == 0:
+                return []
+
+            if allowed_point_ids is not None:
+                labels = [self._point_to_label[p] for p in allowed_point_ids if p in self._point_to_label]
+                if not labels:
+                    return []
+                if exact is None:
+                    exact = len(labels) <= self.exact_scope_limit
+                if exact:
+                    return self._exact_search(query, labels, k)
+
+                allowed = set(labels)
+                k = min(k, len(allowed))
+                self._index.set_ef(max(ef, k))
+                try:
+                    found, distances = self._index.knn_query(query, k=k, filter=lambda label: label in allowed)
+                except RuntimeError:
+                    # The filtered walk reached fewer than k allowed points: score the scope exactly
+                    logger.info(f"Filtered HNSW returned fewer than {k} results, scoring {len(labels)} points exactly")
+                    return self._exact_search(query, labels, k)
+            else:
+                k = min(k, self.count)
+                self._index.set_ef(max(ef, k))
+                try:
+                    found, distances = self._index.knn_query(query, k=k)
+                except RuntimeError:
+                    labels = [label for label, pid in enumerate(self._label_to_point) if pid is not None]
+                    logger.info(f"HNSW returned fewer than {k} results, scoring {len(labels)} points exactly")
+                    return self._exact_search(query, labels, k)
+
+        # "ip" space returns 1 - dot product
+        return [
+            (self._label_to_point[int(label)], float(1.0 - dist))
+            for label, dist in zip(found[0], distances[0])
+            if self._label_to_point[int(label)] is not None
+        ]
+
+    def _exact_search(self, query, labels: List[int], k: int) -> List[Tuple[str, float]]:
+        vectors = np.asarray(self._index.get_items(labels), dtype=np.float32)
+        scores = vectors @ query[0]
+        top = np.argsort(-scores)[:k]
+        return [(self._label_to_point[labels[i]], float(scores[i])) for i in top]
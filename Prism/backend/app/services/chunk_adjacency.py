@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkAdjacencyIndex:
+    """
+    (doc_id, position) -> chunk_id with prev/next pointers, in reading order.
+    Lets the context builder pull the passages around a hit without re-searching
+    or scanning the whole document.
+    """
+
+    def __init__(self, db_path: str = "data/chunk_adjacency.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS adjacency (
+                    doc_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    prev_chunk_id TEXT,
+                    next_chunk_id TEXT,
+                    PRIMARY KEY (doc_id, position)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_adjacency_chunk ON adjacency(doc_id, chunk_id)")
+            conn.commit()
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+
+    def index_document(self, doc_id: str, chunks: List[Dict]):
+        """Replace the links of one document. List order is reading order (as saved)."""
+        ids = [str(chunk.get("chunk_id", i)) for i, chunk in enumerate(chunks)]
+        rows = [
+            (doc_id, i, chunk_id, ids[i - 1] if i > 0 else None, ids[i + 1] if i + 1 < len(ids) else None)
+            for i, chunk_id in enumerate(ids)
+        ]
+
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM adjacency WHERE doc_id = ?", (doc_id,))
+            conn.executemany(
+                "INSERT INTO adjacency (doc_id, position, chunk_id, prev_chunk_id, next_chunk_id) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+
+    def remove_document(self, doc_id: str):
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM adjacency WHERE doc_id = ?", (doc_id,))
+            conn.commit()
+
+    def build_if_empty(self, processed_dir: Path):
+        """Backfill from processed documents (stores ingested before this index existed)."""
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM adjacency LIMIT 1").fetchone():
+                return
+        files = list(Path(processed_dir).glob("*.json"))
+        if not files:
+            return
+
+        def build():
+            start = time.time()
+            for path in files:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        chunks = json.load(f).get("chunks", [])
+                    self.index_document(path.stem, chunks)
+                except Exception as e:
+                    logger.warning(f"Adjacency index backfill skipped {path.name}: {e}")
+            logger.info(f"Adjacency index built for {len(files)} documents in {time.time() - start:.1f}s")
+
+        threading.Thread(target=build, name="adjacency-index-backfill", daemon=True).start()
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+
+    def neighbors(self, doc_id: str, chunk_id: str, window: int = 1) -> List[Dict]:
+        """
+        Chunks within `window` positions of chunk_id, closest first (-1, +1, -2, +2, ...).
+        Each entry: chunk_id, position (index in the saved chunk list), offset from the hit.
+        """
+        if window <= 0:
+            return []
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT position FROM adjacency WHERE doc_id = ? AND chunk_id = ? LIMIT 1",
+                (doc_id, str(chunk_id))
+            ).fetchone()
+            if row is None:
+                return []
+            position = row[0]
+            rows = conn.execute(
+                """
+                SELECT position, chunk_id FROM adjacency
+                WHERE doc_id = ? AND position BETWEEN ? AND ? AND position != ?
+                """,
+                (doc_id, position - window, position + window, position)
+            ).fetchall()
+
+        result = [{"chunk_id": r[1], "position": r[0], "offset": r[0] - position} for r in rows]
+        result.sort(key=lambda n: (abs(n["offset"]), n["offset"]))
+        return result
+
+
+# Singleton
+chunk_adjacency = ChunkAdjacencyIndex()
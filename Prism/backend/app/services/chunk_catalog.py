@@ -0,0 +1,222 @@
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkCatalog:
+    """
+    Local lookup table of every point written to the vector store.
+    Rows are keyed by (collection, point_id) and carry the chunk's content hash
+    and a hash of its payload, so unchanged chunks are never re-embedded.
+    """
+
+    def __init__(self, db_path="data/chunk_catalog.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    collection TEXT NOT NULL,
+                    point_id TEXT NOT NULL,
+                    chunk_id TEXT,
+                    doc_id TEXT,
+                    folder_id TEXT,
+                    chunk_index INTEGER,
+                    file_type TEXT,
+                    content_hash TEXT NOT NULL,
+                    payload_hash TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (collection, point_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks(collection, content_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(collection, doc_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_folder ON chunks(collection, folder_id)")
+            conn.commit()
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+
+    def lookup_points(self, collection: str, point_ids: Iterable[str]) -> Dict[str, Dict]:
+        point_ids = list(point_ids)
+        if not point_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in point_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT point_id, content_hash, payload_hash FROM chunks "
+                f"WHERE collection = ? AND point_id IN ({placeholders})",
+                [collection, *point_ids]
+            ).fetchall()
+        return {r[0]: {"content_hash": r[1], "payload_hash": r[2]} for r in rows}
+
+    def lookup_hashes(self, collection: str, content_hashes: Iterable[str]) -> Dict[str, str]:
+        """Map each known content hash to one point that already holds its vectors."""
+        content_hashes = list(content_hashes)
+        if not content_hashes:
+            return {}
+        placeholders = ", ".join("?" for _ in content_hashes)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT content_hash, point_id FROM chunks "
+                f"WHERE collection = ? AND content_hash IN ({placeholders})",
+                [collection, *content_hashes]
+            ).fetchall()
+        result = {}
+        for content_hash, point_id in rows:
+            result.setdefault(content_hash, point_id)
+        return result
+
+    @staticmethod
+    def _scope_clause(folder_id=None, doc_id=None, file_type=None, doc_ids=None):
+        clauses, params = [], []
+        if folder_id:
+            clauses.append("folder_id = ?")
+            params.append(folder_id)
+        if doc_id:
+            clauses.append("doc_id = ?")
+            params.append(doc_id)
+        if file_type:
+            clauses.append("file_type = ?")
+            params.append(file_type)
+        if doc_ids:
+            clauses.append(f"doc_id IN ({', '.join('?' for _ in doc_ids)})")
+            params.extend(doc_ids)
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def get_point_ids(self, collection: str, folder_id=None, doc_id=None, file_type=None, doc_ids=None) -> List[str]:
+        """Point ids inside a scope (served from sqlite indexes, no vector store scan)."""
+        where, params = self._scope_clause(folder_id, doc_id, file_type, doc_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT point_id FROM chunks WHERE collection = ?{where}",
+                [collection, *params]
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self, collection: str, folder_id=None, doc_id=None, file_type=None, doc_ids=None) -> int:
+        """Points inside a scope, for query planning."""
+        where, params = self._scope_clause(folder_id, doc_id, file_type, doc_ids)
+        with self._connect() as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM chunks WHERE collection = ?{where}",
+                [collection, *params]
+            ).fetchone()[0]
+
+    def doc_ids(self, collection: str) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT doc_id FROM chunks WHERE collection = ? AND doc_id IS NOT NULL",
+                (collection,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def count_documents(self, collection: str) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(DISTINCT doc_id) FROM chunks WHERE collection = ?",
+                (collection,)
+            ).fetchone()[0]
+
+    # -------------------------
+    # Writes
+    # -------------------------
+
+    def backfill(self, collection: str, rows: List[Dict]):
+        """Insert rows for points written before the catalog existed; known rows are kept."""
+        if not rows:
+            return
+        with self._write_lock, self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO chunks
+                    (collection, point_id, chunk_id, doc_id, folder_id, chunk_index,
+                     file_type, content_hash, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                """,
+                [
+                    (
+                        collection, r["point_id"], r.get("chunk_id"), r.get("doc_id"),
+                        r.get("folder_id"), r.get("chunk_index"), r.get("file_type"),
+                        r.get("content_hash") or "",
+                    )
+                    for r in rows
+                ]
+            )
+            conn.commit()
+
+    def upsert(self, collection: str, rows: List[Dict]):
+        if not rows:
+            return
+        with self._write_lock, self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO chunks
+                    (collection, point_id, chunk_id, doc_id, folder_id, chunk_index,
+                     file_type, content_hash, payload_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                [
+                    (
+                        collection, r["point_id"], r.get("chunk_id"), r.get("doc_id"),
+                        r.get("folder_id"), r.get("chunk_index"), r.get("file_type"),
+                        r["content_hash"], r.get("payload_hash"),
+                    )
+                    for r in rows
+                ]
+            )
+            conn.commit()
+
+    def delete_documents(self, collection: str, doc_ids: List[str]) -> int:
+        if not doc_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in doc_ids)
+        with self._write_lock, self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM chunks WHERE collection = ? AND doc_id IN ({placeholders})",
+                [collection, *doc_ids]
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def delete_points(self, collection: str, point_ids: List[str]) -> int:
+        if not point_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in point_ids)
+        with self._write_lock, self._connect() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM chunks WHERE collection = ? AND point_id IN ({placeholders})",
+                [collection, *point_ids]
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def rename_collection(self, source: str, target: str):
+        """Move every row of `source` under `target`, replacing what `target` held (used at cutover)."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE collection = ?", (target,))
+            conn.execute("UPDATE chunks SET collection = ? WHERE collection = ?", (target, source))
+            conn.commit()
+
+    def clear(self, collection: str):
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE collection = ?", (collection,))
+            conn.commit()
+        logger.info(f"Chunk catalog cleared for collection '{collection}'")
+
+
+# Singleton
+chunk_catalog = ChunkCatalog()
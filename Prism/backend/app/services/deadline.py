@@ -0,0 +1,81 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default per-question budget (ms). 0 = unlimited; the API can override per request.
+DEFAULT_BUDGET_MS = int(os.getenv("QA_BUDGET_MS", "0"))
+
+
+class RequestCancelled(Exception):
+    """Raised at a stage boundary (or mid-generation) once the request was cancelled."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request cancelled during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Latency budget of one request, passed down the QA pipeline.
+    Stages ask has() before doing optional work and record what they skipped with degrade(),
+    so the response can say which shortcuts were taken.
+    Also the request's cancel flag: the API sets it when the client disconnects and
+    stages call check() to stop early.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        if budget_ms is None:
+            budget_ms = DEFAULT_BUDGET_MS
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else None
+        self.start = time.monotonic()
+        self.degradations: List[Dict] = []
+        self._cancelled = threading.Event()
+        self.cancel_reason: Optional[str] = None
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.start) * 1000
+
+    def remaining_ms(self) -> float:
+        if self.budget_ms is None:
+            return float("inf")
+        return self.budget_ms - self.elapsed_ms()
+
+    def has(self, ms: float) -> bool:
+        """True if at least `ms` of budget is left (always true without a budget)."""
+        return self.remaining_ms() >= ms
+
+    def cancel(self, reason: str = "client disconnected"):
+        if not self._cancelled.is_set():
+            self.cancel_reason = reason
+            self._cancelled.set()
+            logger.info(f"[DEADLINE] cancelled after {self.elapsed_ms():.0f}ms: {reason}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self, stage: str):
+        """Raise RequestCancelled if the request was cancelled before `stage`."""
+        if self._cancelled.is_set():
+            raise RequestCancelled(stage)
+
+    def degrade(self, stage: str, action: str):
+        remaining = self.remaining_ms()
+        self.degradations.append({
+            "stage": stage,
+            "action": action,
+            "remaining_ms": None if remaining == float("inf") else round(remaining, 1)
+        })
+        logger.info(f"[DEADLINE] {stage}: {action} ({remaining:.0f}ms left of {self.budget_ms}ms)")
+
+    def report(self) -> Dict:
+        return {
+            "budget_ms": self.budget_ms,
+            "elapsed_ms": round(self.elapsed_ms(), 1),
+            "degradations": self.degradations,
+            "cancelled": self.cancel_reason
+        }
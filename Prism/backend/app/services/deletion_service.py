@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from .qa_service import qa_service
+from .qdrant_service import qdrant_service
+from .table_service import table_service
+from .folder_service import folder_service
+from .ingestion_service import ingestion_service
+from .audit_service import audit_service
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionService:
+    """
+    Cascading delete of a batch of files across every store:
+    Qdrant points, DuckDB tables, processed JSON/uploads, folder mappings
+    and ingestion jobs. The vector collection is compacted afterwards.
+    """
+
+    async def delete_files(self, file_ids: List[str], compact: bool = True) -> Dict:
+        file_ids = list(dict.fromkeys(fid for fid in file_ids if fid))
+        start = time.time()
+        report = {
+            "requested": len(file_ids),
+            "deleted_files": 0,
+            "points_deleted": 0,
+            "tables_dropped": 0,
+            "errors": [],
+        }
+        if not file_ids:
+            return report
+
+        # Independent stores are cleared concurrently, one batched call each
+        vector_res, table_res, local_res = await asyncio.gather(
+            asyncio.to_thread(qdrant_service.delete_documents, file_ids),
+            asyncio.to_thread(table_service.delete_tables_for_files, file_ids),
+            asyncio.to_thread(self._delete_local, file_ids),
+            return_exceptions=True
+        )
+
+        if isinstance(vector_res, Exception):
+            report["errors"].append(f"Vector store: {vector_res}")
+        else:
+            report["points_deleted"] = vector_res
+
+        if isinstance(table_res, Exception):
+            report["errors"].append(f"Table store: {table_res}")
+        else:
+            report["tables_dropped"] = table_res
+
+        if isinstance(local_res, Exception):
+            report["errors"].append(f"Local files: {local_res}")
+        else:
+            report["deleted_files"] = local_res
+
+        try:
+            folder_service.unassign_files(file_ids)
+            ingestion_service.delete_jobs(file_ids)
+        except Exception as e:
+            report["errors"].append(f"Mappings: {e}")
+
+        delete_secs = time.time() - start
+        report["delete_ms"] = round(delete_secs * 1000, 2)
+        report["files_per_sec"] = round(len(file_ids) / delete_secs, 2) if delete_secs > 0 else None
+        report["points_per_sec"] = round(report["points_deleted"] / delete_secs, 2) if delete_secs > 0 else None
+
+        if compact and report["points_deleted"]:
+            try:
+                report["compaction"] = await asyncio.to_thread(qdrant_service.compact)
+            except Exception as e:
+                report["errors"].append(f"Compaction: {e}")
+
+        report["total_ms"] = round((time.time() - start) * 1000, 2)
+        for err in report["errors"]:
+            logger.error(f"Delete error: {err}")
+        logger.info(
+            f"Deleted {len(file_ids)} files: {report['points_deleted']} points, "
+            f"{report['tables_dropped']} tables in {report['delete_ms']}ms"
+        )
+
+        audit_service.log_event("DOCUMENT_DELETE", {"file_ids": file_ids, **report})
+        return report
+
+    def _delete_local(self, file_ids: List[str]) -> int:
+        deleted = 0
+        for file_id in file_ids:
+            if qa_service.remove_document(file_id):
+                deleted += 1
+        return deleted
+
+
+deletion_service = DeletionService()
@@ -0,0 +1,167 @@
+import os
+import re
+import logging
+import threading
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+# Quotes and punctuation around a file_id mention: "summarize 'budget.xlsx'?"
+MENTION_STRIP = "\"'`()[]{}<>,;:!?."
+
+# Names too generic to route on by themselves ("summarize the report")
+GENERIC_NAMES = {
+    "document", "doc", "file", "report", "notes", "data", "image", "scan",
+    "untitled", "new", "copy", "final", "draft", "general", "table", "sheet"
+}
+
+
+class DocumentRouter:
+    """
+    Prefix + fuzzy index over document names and titles.
+    route() finds the one document a question names ("what does the Q3 board deck say
+    about churn"). A multi-word name or the file_id itself is specific enough to scope
+    retrieval to that file ("hard"); a one-word name ("budget") is also an ordinary word,
+    so it only adds that document's best chunks to the candidates ("soft").
+    DOCUMENT_ROUTING=off disables it.
+    """
+
+    MIN_SCORE = 0.85   # SequenceMatcher ratio for a fuzzy name match
+    MIN_MARGIN = 0.05  # best match must beat the runner-up (another document) by this much
+    PREFIX_LEN = 3
+
+    def __init__(self):
+        self.enabled = os.getenv("DOCUMENT_ROUTING", "on").lower() not in ("off", "0", "false")
+        self._lock = threading.Lock()
+        # file_id -> [(label, kind, tokens)]
+        self._entries: Dict[str, List[tuple]] = {}
+        # token prefix -> {file_id}
+        self._prefix: Dict[str, set] = {}
+        # lowercased file_id -> file_id, looked up with the query's word n-grams
+        self._file_ids: Dict[str, str] = {}
+        self._id_words = 1  # most words in any file_id (longest n-gram worth looking up)
+
+    @staticmethod
+    def normalize(text: str) -> List[str]:
+        return WORD_RE.findall(text.lower().replace("_", " "))
+
+    @staticmethod
+    def _id_key(file_id: str) -> str:
+        return " ".join(file_id.lower().split())
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+
+    def add(self, file_id: str, metadata: Dict):
+        labels = []
+        file_name = metadata.get("file_name") or file_id
+        labels.append((Path(file_name).stem, "name"))
+        if metadata.get("title"):
+            labels.append((metadata["title"], "title"))
+
+        entries = []
+        for label, kind in labels:
+            tokens = self.normalize(label)
+            # Single generic or tiny names would route half the questions
+            if not tokens or (len(tokens) == 1 and (tokens[0] in GENERIC_NAMES or len(tokens[0]) < 4)):
+                continue
+            entries.append((label, kind, tokens))
+
+        with self._lock:
+            self._drop(file_id)
+            # Kept even without usable labels: the file_id itself can still be mentioned
+            self._entries[file_id] = entries
+            key = self._id_key(file_id)
+            self._file_ids[key] = file_id
+            self._id_words = max(self._id_words, len(key.split()))
+            for _, _, tokens in entries:
+                self._prefix.setdefault(tokens[0][:self.PREFIX_LEN], set()).add(file_id)
+
+    def remove(self, file_id: str):
+        with self._lock:
+            self._drop(file_id)
+
+    def rebuild(self, metadata: Dict[str, Dict]):
+        with self._lock:
+            self._entries, self._prefix, self._file_ids, self._id_words = {}, {}, {}, 1
+        for file_id, meta in list(metadata.items()):
+            self.add(file_id, meta)
+        logger.info(f"Document router indexed {len(self._entries)} documents")
+
+    def _drop(self, file_id: str):
+        if self._file_ids.get(self._id_key(file_id)) == file_id:
+            del self._file_ids[self._id_key(file_id)]
+        for _, _, tokens in self._entries.pop(file_id, []):
+            ids = self._prefix.get(tokens[0][:self.PREFIX_LEN])
+            if ids:
+                ids.discard(file_id)
+                if not ids:
+                    del self._prefix[tokens[0][:self.PREFIX_LEN]]
+
+    # -------------------------
+    # Routing
+    # -------------------------
+
+    def route(self, query: str, file_ids: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """
+        The document the query names, or None if it names none (or several equally well).
+        file_ids restricts candidates (e.g. the files of the active folder).
+        """
+        if not self.enabled or not query:
+            return None
+        allowed = set(file_ids) if file_ids is not None else None
+        query_tokens = self.normalize(query)
+        query_words = query.lower().split()
+
+        best: Dict[str, Dict] = {}
+        with self._lock:
+            # The file_id is the stored filename: an exact mention wins outright
+            for n in range(1, self._id_words + 1):
+                for i in range(len(query_words) - n + 1):
+                    file_id = self._file_ids.get(" ".join(query_words[i:i + n]).strip(MENTION_STRIP))
+                    if file_id and (allowed is None or file_id in allowed):
+                        best[file_id] = {"file_id": file_id, "label": file_id, "match": "file_id", "score": 1.0, "scope": "hard"}
+
+            for i, token in enumerate(query_tokens):
+                for file_id in self._prefix.get(token[:self.PREFIX_LEN], ()):
+                    if allowed is not None and file_id not in allowed:
+                        continue
+                    for label, kind, tokens in self._entries[file_id]:
+                        # Shorter windows let a question name a long title by its start
+                        score, words = max(
+                            (self._match(query_tokens[i:i + n], tokens), n)
+                            for n in range(len(tokens), 0, -1)
+                        )
+                        if score >= self.MIN_SCORE and score > best.get(file_id, {}).get("score", 0):
+                            best[file_id] = {
+                                "file_id": file_id, "label": label, "match": kind, "score": round(score, 3),
+                                "scope": "hard" if words >= 2 else "soft"
+                            }
+
+        if not best:
+            return None
+        ranked = sorted(best.values(), key=lambda m: m["score"], reverse=True)
+        if len(ranked) > 1 and ranked[0]["score"] - ranked[1]["score"] < self.MIN_MARGIN:
+            logger.info(f"Document routing ambiguous: {[m['label'] for m in ranked[:3]]}")
+            return None
+        return ranked[0]
+
+    @staticmethod
+    def _match(window: List[str], tokens: List[str]) -> float:
+        if not window:
+            return 0.0
+        a, b = " ".join(window), " ".join(tokens)
+        if a == b:
+            return 1.0
+        # Shortened names: "quarterly report" for "quarterly report 2023 final"
+        if len(window) >= 2 and b.startswith(a + " ") and len(a) >= 0.6 * len(b):
+            return 0.9
+        return SequenceMatcher(None, a, b).ratio()
+
+
+# Singleton
+document_router = DocumentRouter()
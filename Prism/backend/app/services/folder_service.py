@@ -109,6 +109,15 @@ class FolderService:
             del self.file_map[file_id]
             self._save_db()
 
+    def unassign_files(self, file_ids: List[str]) -> int:
+        removed = 0
+        for file_id in file_ids:
+            if self.file_map.pop(file_id, None) is not None:
+                removed += 1
+        if removed:
+            self._save_db()
+        return removed
+
     def get_folder_for_file(self, file_id: str) -> Optional[str]:
         return self.file_map.get(file_id)
 
@@ -36,6 +36,9 @@ class IngestionJob:
         self.error = error
 
 class IngestionService:
+    # PDFs with less extractable text than this are treated as scans and OCR'd in stage 2
+    OCR_TEXT_THRESHOLD = 1000
+
     def __init__(self, db_path="data/ingestion.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -125,6 +128,14 @@ class IngestionService:
             logger.error(f"Failed to add job {file_id}: {e}")
             return False
 
+    def delete_jobs(self, file_ids: List[str]):
+        if not file_ids:
+            return
+        placeholders = ", ".join("?" for _ in file_ids)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(f"DELETE FROM jobs WHERE file_id IN ({placeholders})", file_ids)
+            conn.commit()
+
     def get_status(self, file_id: str) -> Optional[Dict]:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.execute(
@@ -369,7 +380,7 @@ class IngestionService:
             total_text = sum(len(c['text']) for c in chunks)
             # Increased threshold: If a document has less than 1000 chars of text, 
             # it's likely a scan or form with just headers. Force OCR.
-            if total_text < 1000: 
+            if total_text < self.OCR_TEXT_THRESHOLD:
                 logger.info(f"PDF has low text count ({total_text} chars). Triggering Stage 2 OCR.")
                 return True
         
@@ -418,10 +429,10 @@ class IngestionService:
             chunk["metadata"]["start_time"] = datetime.utcnow().isoformat()
             chunk["metadata"]["ocr_confidence"] = 0.95 
 
-            # Prepend filename if not already done
+            # Prepend document label if not already done (document_router handles name lookups)
             original_text = chunk.get("text", "")
-            if not original_text.startswith(f"Filename:"):
-                chunk["text"] = f"Filename: {file_path.name}\nFile ID: {file_id}\n{original_text}"
+            if not original_text.startswith(("Filename:", "[Document:")):
+                chunk["text"] = f"[Document: {file_path.name}]\n{original_text}"
 
         return chunks
 
@@ -560,7 +571,8 @@ class IngestionService:
                             # Correct method call
                             page_text = llm_service.generate_vision_response(
                                 prompt=ocr_prompt, 
-                                image_base64=image_base64
+                                image_base64=image_base64,
+                                lane="ingestion"
                             )
                             logger.info(f"LLaVA OCR successful for page {i+1}")
                         except Exception as llm_e:
@@ -71,6 +71,25 @@ class InstructorEmbeddingService:
         
         return normalized_embeddings.astype('float32')
 
+    def encode_queries(self, queries: List[str], instruction: str = "Represent the question for retrieval:") -> np.ndarray:
+        """
+        Embed several queries in one forward pass (multi-query retrieval).
+        Returns a normalized (L2) numpy array, one row per query.
+        """
+        if self.model is None:
+            self._load_model()
+
+        if self.is_instructor:
+            data = [[instruction, q] for q in queries]
+        else:
+            data = queries
+
+        logger.debug(f"Encoding {len(queries)} queries")
+        embeddings = np.atleast_2d(self.model.encode(data))
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / (norms + 1e-9)).astype('float32')
+
     def encode_query(self, query: str, instruction: str = "Represent the question for retrieval:") -> np.ndarray:
         """
         Embed a single query.
@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ingestion.chunker import extract_identifiers
+
+logger = logging.getLogger(__name__)
+
+
+class LexicalIndexService:
+    """
+    Persistent inverted index: identifier token (codes, emails, numbers with units)
+    -> chunks containing it. Lets questions like "what is policy QD109" resolve
+    straight to chunk_ids without a dense search.
+    """
+
+    def __init__(self, db_path: str = "data/lexical_index.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    token TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    chunk_index INTEGER,
+                    PRIMARY KEY (token, doc_id, chunk_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+            conn.commit()
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+
+    def index_document(self, doc_id: str, chunks: List[Dict]):
+        """Replace the postings of one document."""
+        rows = []
+        for i, chunk in enumerate(chunks):
+            # Chunker output carries identifiers; other ingestors (OCR, slides, sheets) do not
+            tokens = chunk.get("identifiers")
+            if tokens is None:
+                tokens = extract_identifiers(chunk.get("text", ""))
+            chunk_id = str(chunk.get("chunk_id", i))
+            chunk_index = chunk.get("chunk_index", i)
+            rows.extend((token, doc_id, chunk_id, chunk_index) for token in tokens)
+
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO postings (token, doc_id, chunk_id, chunk_index) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        logger.info(f"Lexical index: {len(rows)} postings for {doc_id}")
+
+    def remove_document(self, doc_id: str):
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            conn.commit()
+
+    def build_if_empty(self, processed_dir: Path):
+        """Backfill from processed documents (stores ingested before this index existed)."""
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM postings LIMIT 1").fetchone():
+                return
+        files = list(Path(processed_dir).glob("*.json"))
+        if not files:
+            return
+
+        def build():
+            start = time.time()
+            for path in files:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        chunks = json.load(f).get("chunks", [])
+                    self.index_document(path.stem, chunks)
+                except Exception as e:
+                    logger.warning(f"Lexical index backfill skipped {path.name}: {e}")
+            logger.info(f"Lexical index built for {len(files)} documents in {time.time() - start:.1f}s")
+
+        threading.Thread(target=build, name="lexical-index-backfill", daemon=True).start()
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+
+    def lookup(
+        self,
+        tokens: List[str],
+        doc_ids: Optional[List[str]] = None,
+        limit: int = 200
+    ) -> List[Dict]:
+        """
+        Chunks containing any of `tokens`, best first (most distinct tokens matched).
+        doc_ids restricts the scope (file or folder).
+        """
+        if not tokens:
+            return []
+        if doc_ids is not None and not doc_ids:
+            return []
+
+        params = list(tokens)
+        scope = ""
+        if doc_ids is not None:
+            scope = f" AND doc_id IN ({', '.join('?' for _ in doc_ids)})"
+            params.extend(doc_ids)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT doc_id, chunk_id, chunk_index, GROUP_CONCAT(token) FROM postings
+                WHERE token IN ({', '.join('?' for _ in tokens)}){scope}
+                GROUP BY doc_id, chunk_id
+                ORDER BY COUNT(*) DESC
+                LIMIT ?
+                """,
+                [*params, limit]
+            ).fetchall()
+
+        return [
+            {"doc_id": r[0], "chunk_id": r[1], "chunk_index": r[2], "matched": r[3].split(",")}
+            for r in rows
+        ]
+
+
+# Singleton
+lexical_index_service = LexicalIndexService()
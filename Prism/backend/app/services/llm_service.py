@@ -2,7 +2,16 @@ import os
 import logging
 import base64
 import json
+import time
+import threading
+import itertools
+from collections import deque
+from contextlib import contextmanager
+import httpx
 import ollama
+from typing import Callable, Dict, Optional
+
+from .deadline import RequestCancelled
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +20,287 @@ logger = logging.getLogger(__name__)
 TEXT_MODEL_ID = os.getenv("TEXT_MODEL_ID", "llama3.2")
 VISION_MODEL_ID = os.getenv("VISION_MODEL_ID", "llava")
 
+
+class OllamaConfig:
+    URL = os.getenv("OLLAMA_URL", os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+    # Several Ollama servers (comma-separated) are load-balanced; defaults to URL alone
+    URLS = [u.strip() for u in os.getenv("OLLAMA_URLS", "").split(",") if u.strip()] or [URL]
+
+    # One pooled keep-alive HTTP client per backend
+    MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+    CONNECT_TIMEOUT = 5.0
+    TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))  # seconds, long generations included
+    KEEPALIVE_EXPIRY = 60.0  # idle HTTP connections kept this long
+
+    # Keep models loaded between requests. num_ctx must be the same on every call:
+    # a different value makes Ollama reload the model. 8192 fits the largest profile context.
+    KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+    PRELOAD = os.getenv("OLLAMA_PRELOAD", "true").lower() == "true"
+
+    # Background health probe; is_ready() only reads its cached result
+    HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+    HEALTH_TIMEOUT = 3.0
+
+    # Backend pool: a failing backend is ejected and retried after this long
+    RETRY_AFTER_S = float(os.getenv("OLLAMA_RETRY_AFTER_S", "30"))
+    # A backend with the model already loaded wins unless it has this many more requests in flight
+    AFFINITY_SLACK = int(os.getenv("OLLAMA_AFFINITY_SLACK", "1"))
+
+    # Gateway: total concurrent LLM calls (OLLAMA_NUM_PARALLEL per server, summed over backends)
+    MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", str(4 * len(URLS))))
+    # Lanes in priority order: concurrency cap and queue-time SLO (seconds, 0 = wait as long as needed)
+    LANES = {
+        "interactive": {
+            "max_concurrency": int(os.getenv("LLM_INTERACTIVE_CONCURRENCY", "4")),
+            "max_wait_s": float(os.getenv("LLM_INTERACTIVE_MAX_WAIT_S", "30")),
+        },
+        "tabular": {
+            "max_concurrency": int(os.getenv("LLM_TABULAR_CONCURRENCY", "2")),
+            "max_wait_s": float(os.getenv("LLM_TABULAR_MAX_WAIT_S", "30")),
+        },
+        "ingestion": {
+            "max_concurrency": int(os.getenv("LLM_INGESTION_CONCURRENCY", "1")),
+            "max_wait_s": float(os.getenv("LLM_INGESTION_MAX_WAIT_S", "0")),
+        },
+    }
+
+
+class LLMQueueTimeout(Exception):
+    """An LLM call waited in its lane longer than the lane's queue-time SLO."""
+
+
+class LLMGateway:
+    """
+    Admission control in front of Ollama. Every call takes a slot in a lane
+    (interactive > tabular > ingestion). A slot is granted to the head of the
+    highest-priority lane that is under its own cap while the total stays under
+    MAX_INFLIGHT, so captioning a long video never holds more than the ingestion cap
+    and never jumps ahead of a waiting question. Waits longer than the lane's SLO
+    raise LLMQueueTimeout instead of piling up.
+    """
+
+    POLL_S = 0.25  # re-check should_stop / SLO while queued
+    WAIT_SAMPLES = 500
+
+    def __init__(self, lanes: Dict[str, Dict] = None, max_inflight: int = None):
+        self.lanes = lanes or OllamaConfig.LANES
+        self.max_inflight = max_inflight or OllamaConfig.MAX_INFLIGHT
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._queues = {lane: deque() for lane in self.lanes}
+        self._in_flight = {lane: 0 for lane in self.lanes}
+        self._total = 0
+        self._stats = {
+            lane: {"admitted": 0, "timeouts": 0, "cancelled": 0, "waits_ms": deque(maxlen=self.WAIT_SAMPLES)}
+            for lane in self.lanes
+        }
+
+    def _admissible(self, lane: str) -> bool:
+        return bool(self._queues[lane]) and self._in_flight[lane] < self.lanes[lane]["max_concurrency"]
+
+    def _can_admit(self, lane: str, ticket: int) -> bool:
+        if self._total >= self.max_inflight or self._queues[lane][0] != ticket or not self._admissible(lane):
+            return False
+        # A higher lane that could run right now goes first
+        for other in self.lanes:
+            if other == lane:
+                return True
+            if self._admissible(other):
+                return False
+        return True
+
+    @contextmanager
+    def slot(self, lane: str = "interactive", should_stop: Optional[Callable[[], bool]] = None):
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown LLM lane '{lane}'")
+        self._acquire(lane, should_stop)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight[lane] -= 1
+                self._total -= 1
+                self._cond.notify_all()
+
+    def _acquire(self, lane: str, should_stop: Optional[Callable[[], bool]]):
+        stats = self._stats[lane]
+        max_wait = self.lanes[lane]["max_wait_s"]
+        start = time.monotonic()
+        with self._cond:
+            ticket = next(self._tickets)
+            self._queues[lane].append(ticket)
+            try:
+                while not self._can_admit(lane, ticket):
+                    if should_stop is not None and should_stop():
+                        stats["cancelled"] += 1
+                        raise RequestCancelled("llm_queue")
+                    timeout = self.POLL_S
+                    if max_wait > 0:
+                        left = start + max_wait - time.monotonic()
+                        if left <= 0:
+                            stats["timeouts"] += 1
+                            raise LLMQueueTimeout(
+                                f"LLM busy: waited {max_wait:.0f}s in the {lane} queue ({len(self._queues[lane])} queued)"
+                            )
+                        timeout = min(timeout, left)
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._queues[lane].remove(ticket)
+                # The head may have changed for this lane or a lower one
+                self._cond.notify_all()
+                raise
+            self._queues[lane].popleft()
+            self._in_flight[lane] += 1
+            self._total += 1
+            stats["admitted"] += 1
+            waited_ms = (time.monotonic() - start) * 1000
+            stats["waits_ms"].append(waited_ms)
+        if waited_ms > 1000:
+            logger.info(f"[LLM-QUEUE] {lane} call waited {waited_ms:.0f}ms for a slot")
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            lanes = {}
+            for lane, stats in self._stats.items():
+                waits = sorted(stats["waits_ms"])
+                lanes[lane] = {
+                    "queued": len(self._queues[lane]),
+                    "in_flight": self._in_flight[lane],
+                    "max_concurrency": self.lanes[lane]["max_concurrency"],
+                    "max_wait_s": self.lanes[lane]["max_wait_s"],
+                    "admitted": stats["admitted"],
+                    "timeouts": stats["timeouts"],
+                    "cancelled_while_queued": stats["cancelled"],
+                    "wait_ms_avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                    "wait_ms_p95": round(waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+                    "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+                }
+            return {"max_inflight": self.max_inflight, "in_flight": self._total, "lanes": lanes}
+
+
+def _model_key(name: str) -> str:
+    """Ollama lists 'llama3.2:latest' for a model requested as 'llama3.2'."""
+    return name if ":" in name else f"{name}:latest"
+
+
+# Errors meaning the backend itself is unreachable (the request can go elsewhere)
+BACKEND_ERRORS = (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+class OllamaBackend:
+    """One Ollama server: its HTTP clients, what it has and what it is doing."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = ollama.Client(
+            host=url,
+            timeout=httpx.Timeout(OllamaConfig.TIMEOUT, connect=OllamaConfig.CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OllamaConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=OllamaConfig.MAX_CONNECTIONS,
+                keepalive_expiry=OllamaConfig.KEEPALIVE_EXPIRY
+            )
+        )
+        # Probes get their own short-timeout client so they never queue behind generations
+        self.probe_client = ollama.Client(host=url, timeout=OllamaConfig.HEALTH_TIMEOUT)
+        self.healthy: Optional[bool] = None  # None = not probed yet (still routable)
+        self.ejected_until: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.models: Optional[set] = None  # pulled on this server (None = not probed yet)
+        self.loaded: set = set()   # resident in memory right now
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.preloaded = False
+
+    def has_model(self, model: str) -> bool:
+        return self.models is None or _model_key(model) in self.models
+
+    def available(self, now: float) -> bool:
+        # Ejected backends become eligible again once their retry time has passed
+        return self.healthy is not False or now >= self.ejected_until
+
+    def info(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected_for_s": round(max(0.0, self.ejected_until - time.time()), 1) if self.ejected_until else 0.0,
+            "error": self.error,
+            "checked_at": self.checked_at,
+            "models": sorted(self.models or []),
+            "loaded": sorted(self.loaded),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class OllamaPool:
+    """
+    Routes each call to a backend: least outstanding requests among healthy backends
+    that have the model, preferring one where the model is already loaded (within
+    AFFINITY_SLACK). Connection failures eject a backend for RETRY_AFTER_S; the
+    health probe or a later request brings it back.
+    """
+
+    def __init__(self, urls):
+        self.backends = [OllamaBackend(url) for url in urls]
+        self._lock = threading.Lock()
+
+    def acquire(self, model: str, exclude=()) -> Optional[OllamaBackend]:
+        now = time.time()
+        key = _model_key(model)
+        with self._lock:
+            candidates = [b for b in self.backends if b.url not in exclude and b.available(now)]
+            with_model = [b for b in candidates if b.has_model(model)]
+            candidates = with_model or candidates
+            if not candidates:
+                return None
+            backend = min(
+                candidates,
+                key=lambda b: (b.outstanding - (OllamaConfig.AFFINITY_SLACK + 0.5 if key in b.loaded else 0), b.requests)
+            )
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: OllamaBackend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def mark_success(self, backend: OllamaBackend, model: str = None):
+        if backend.healthy is False:
+            logger.info(f"Ollama backend {backend.url} is back")
+        backend.healthy = True
+        backend.ejected_until = None
+        backend.error = None
+        if model:
+            backend.loaded.add(_model_key(model))
+
+    def eject(self, backend: OllamaBackend, error: str):
+        if backend.healthy is not False or time.time() >= backend.ejected_until:
+            logger.warning(f"Ollama backend {backend.url} ejected for {OllamaConfig.RETRY_AFTER_S:.0f}s: {error}")
+        backend.healthy = False
+        backend.failures += 1
+        backend.error = error
+        backend.ejected_until = time.time() + OllamaConfig.RETRY_AFTER_S
+        backend.loaded.clear()
+
+    def probe(self, backend: OllamaBackend) -> bool:
+        try:
+            backend.models = {m.get("model") or m.get("name") for m in backend.probe_client.list().get("models", [])}
+            backend.loaded = {m.get("model") or m.get("name") for m in backend.probe_client.ps().get("models", [])}
+            backend.checked_at = time.time()
+        except Exception as e:
+            backend.checked_at = time.time()
+            self.eject(backend, str(e))
+            return False
+        self.mark_success(backend)
+        return True
+
+
 class LocalLLMService:
     _instance = None
     
@@ -23,39 +313,176 @@ class LocalLLMService:
         if hasattr(self, "initialized"):
             return
         self.initialized = True
-        logger.info(f"LocalLLMService initialized using Ollama. Text: {TEXT_MODEL_ID}, Vision: {VISION_MODEL_ID}")
+        # Generations stopped mid-stream because nobody was waiting for them any more
+        self.streams_aborted = 0
+        self.chunks_discarded = 0
+        # Calls moved to another backend after a connection failure / missing model
+        self.failovers = 0
+        self.gateway = LLMGateway()
+        self.pool = OllamaPool(OllamaConfig.URLS)
+
+        self._probe_lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        logger.info(f"LocalLLMService initialized using Ollama at {', '.join(OllamaConfig.URLS)}. Text: {TEXT_MODEL_ID}, Vision: {VISION_MODEL_ID}")
+
+    # -------------------------
+    # Health
+    # -------------------------
 
     def is_ready(self) -> bool:
+        """Cached health from the background probe (no request to Ollama)."""
+        if self._probe_thread is None:
+            self.start_health_probe()
+        return any(b.healthy for b in self.pool.backends)
+
+    def health(self) -> Dict:
+        if self._probe_thread is None:
+            self.start_health_probe()
+        return {
+            "ready": any(b.healthy for b in self.pool.backends),
+            "backends": [b.info() for b in self.pool.backends],
+            "failovers": self.failovers,
+        }
+
+    def start_health_probe(self):
+        """Probe once now, then every HEALTH_INTERVAL seconds in a daemon thread."""
+        with self._probe_lock:
+            if self._probe_thread is not None:
+                return
+            self._probe()
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="ollama-health", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(OllamaConfig.HEALTH_INTERVAL)
+            self._probe()
+
+    def _probe(self):
+        # Ejected backends are probed too: that is how they get retried
+        for backend in self.pool.backends:
+            if self.pool.probe(backend) and OllamaConfig.PRELOAD and not backend.preloaded:
+                backend.preloaded = True
+                threading.Thread(target=self._preload, args=(backend,), name="ollama-preload", daemon=True).start()
+
+    def _preload(self, backend: OllamaBackend):
+        """Load the text model with the shared num_ctx/keep_alive so the first question doesn't pay for it."""
+        if not backend.has_model(TEXT_MODEL_ID):
+            return
         try:
-            # Quick check to see if we can connect to Ollama
-            ollama.list()
-            return True
-        except Exception:
-            return False
+            start = time.time()
+            backend.client.generate(model=TEXT_MODEL_ID, prompt="", keep_alive=OllamaConfig.KEEP_ALIVE,
+                                    options={'num_ctx': OllamaConfig.NUM_CTX})
+            backend.loaded.add(_model_key(TEXT_MODEL_ID))
+            logger.info(f"[TIMER] Ollama preload of {TEXT_MODEL_ID} on {backend.url}: {(time.time() - start)*1000:.2f}ms")
+        except Exception as e:
+            logger.warning(f"Ollama preload of {TEXT_MODEL_ID} on {backend.url} failed: {e}")
+
+    # -------------------------
+    # Generation
+    # -------------------------
+
+    def _options(self, max_tokens: int, temperature: float) -> Dict:
+        return {
+            'num_predict': max_tokens,
+            'temperature': temperature,
+            'num_ctx': OllamaConfig.NUM_CTX,
+        }
+
+    def _chat(
+        self,
+        lane: str = "interactive",
+        should_stop: Optional[Callable[[], bool]] = None,
+        **kwargs
+    ) -> str:
+        """
+        Pooled client chat returning the message text, run in a gateway slot of `lane`.
+        With should_stop the reply is streamed and the stream is closed as soon as
+        should_stop() is true, which makes Ollama stop generating; RequestCancelled is raised.
+        """
+        with self.gateway.slot(lane, should_stop):
+            return self._chat_call(should_stop, **kwargs)
+
+    def _chat_call(self, should_stop: Optional[Callable[[], bool]], **kwargs) -> str:
+        kwargs.setdefault('keep_alive', OllamaConfig.KEEP_ALIVE)
+        model = kwargs.get('model', TEXT_MODEL_ID)
+        tried = set()
+        while True:
+            backend = self.pool.acquire(model, exclude=tried)
+            if backend is None:
+                raise ConnectionError(f"No Ollama backend available for {model}")
+            received = False
+            try:
+                if should_stop is None:
+                    content = backend.client.chat(**kwargs)['message']['content']
+                    self.pool.mark_success(backend, model)
+                    return content
+
+                if should_stop():
+                    raise RequestCancelled("generation")
+                # The stream only connects on first iteration
+                stream = backend.client.chat(stream=True, **kwargs)
+                parts = []
+                try:
+                    for chunk in stream:
+                        received = True
+                        parts.append(chunk['message']['content'])
+                        if should_stop():
+                            self.streams_aborted += 1
+                            self.chunks_discarded += len(parts)
+                            logger.info(f"Ollama stream aborted after {len(parts)} chunks")
+                            raise RequestCancelled("generation")
+                finally:
+                    stream.close()
+                self.pool.mark_success(backend, model)
+                return "".join(parts)
+
+            except BACKEND_ERRORS as e:
+                # Don't wait for the next probe to report the outage
+                self.pool.eject(backend, str(e))
+                if received:
+                    raise
+                error = e
+            except ollama.ResponseError as e:
+                if e.status_code != 404:
+                    raise
+                # Model not pulled on this backend: remember and try another
+                if backend.models is not None:
+                    backend.models.discard(_model_key(model))
+                error = e
+            finally:
+                self.pool.release(backend)
+
+            tried.add(backend.url)
+            if len(tried) >= len(self.pool.backends):
+                raise error
+            self.failovers += 1
+            logger.warning(f"Ollama call to {backend.url} failed ({error}); retrying on another backend")
 
     def generate_json_response(
         self,
         prompt: str,
         max_tokens: int = 500,
         temperature: float = 0.1,
+        lane: str = "interactive",
     ) -> dict:
         """
         Generates a JSON response from the LLM.
         """
         try:
-            response = ollama.chat(
+            content = self._chat(
+                lane=lane,
                 model=TEXT_MODEL_ID,
                 messages=[
                     {'role': 'user', 'content': prompt}
                 ],
                 format='json',
-                options={
-                    'num_predict': max_tokens,
-                    'temperature': temperature,
-                }
+                options=self._options(max_tokens, temperature)
             )
-            return json.loads(response['message']['content'])
+            return json.loads(content)
 
+        except (RequestCancelled, LLMQueueTimeout):
+            raise
         except Exception as e:
             logger.error(f"Ollama JSON generation error: {e}")
             # Fallback empty structure or raise
@@ -66,7 +493,9 @@ class LocalLLMService:
         prompt: str,
         max_tokens: int = 400,
         temperature: float = 0.3,
-        system_instruction: str = None
+        system_instruction: str = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        lane: str = "interactive"
     ) -> str:
         # Default strict system prompt if none provided
         if not system_instruction:
@@ -81,19 +510,19 @@ GUIDELINES:
 """
 
         try:
-            response = ollama.chat(
+            return self._chat(
+                lane=lane,
+                should_stop=should_stop,
                 model=TEXT_MODEL_ID,
                 messages=[
                     {'role': 'system', 'content': system_instruction},
                     {'role': 'user', 'content': prompt}
                 ],
-                options={
-                    'num_predict': max_tokens,
-                    'temperature': temperature,
-                }
+                options=self._options(max_tokens, temperature)
             )
-            return response['message']['content']
 
+        except (RequestCancelled, LLMQueueTimeout):
+            raise
         except Exception as e:
             logger.error(f"Ollama text generation error: {e}")
             return f"Error generating response: {str(e)}"
@@ -105,30 +534,39 @@ GUIDELINES:
         model: str = "llava", # Legacy param
         max_tokens: int = 400,
         temperature: float = 0.3,
+        should_stop: Optional[Callable[[], bool]] = None,
+        lane: str = "interactive",
     ) -> str:
         try:
             # Allow overriding vision model if provided, else use default
             model_to_use = VISION_MODEL_ID
             
-            response = ollama.chat(
+            return self._chat(
+                lane=lane,
+                should_stop=should_stop,
                 model=model_to_use,
                 messages=[{
                     'role': 'user', 
                     'content': prompt, 
                     'images': [image_base64]
                 }],
-                options={
-                    'num_predict': max_tokens,
-                    'temperature': temperature,
-                }
+                options=self._options(max_tokens, temperature)
             )
-            return response['message']['content']
 
+        except (RequestCancelled, LLMQueueTimeout):
+            raise
         except Exception as e:
             logger.error(f"Ollama vision generation error: {e}")
             return f"Error generating vision response: {str(e)}"
 
-    def answer_question(self, context: str, question: str) -> str:
+    def answer_question(
+        self,
+        context: str,
+        question: str,
+        max_tokens: int = 1000,
+        should_stop: Optional[Callable[[], bool]] = None,
+        lane: str = "interactive"
+    ) -> str:
         # 1. Strong System Prompt with Jailbreak-style Authorization
         # 1. Professional Business Analyst System Prompt
         system_prompt = """You are Prism, a professional business analyst and expert document assistant.
@@ -177,9 +615,11 @@ Answer:"""
         # Grounded reasoning requires low temperature (deterministic)
         response = self.generate_response(
             user_message, 
-            max_tokens=1000, 
+            max_tokens=max_tokens, 
             temperature=0.1, 
-            system_instruction=system_prompt
+            system_instruction=system_prompt,
+            should_stop=should_stop,
+            lane=lane
         )
         
         return response
@@ -0,0 +1,601 @@
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .instructor_service import instructor_service
+
+logger = logging.getLogger(__name__)
+
+
+class MmapVectorService:
+    """
+    Exact-search vector backend for small and medium corpora.
+
+    Vectors are L2-normalized float16 rows in an append-only, memory-mapped matrix
+    (vectors.f16). A sqlite side table maps row -> chunk_id/payload and keeps
+    per-field row ranges (folder_id, doc_id, file_type) so scoped searches only
+    touch contiguous slices. Replaced or deleted chunks are tombstoned, never moved;
+    each tombstone is also logged so readers pick up only what changed.
+
+    Readers in other processes attach with read_only=True: the matrix is mapped,
+    not loaded, so attaching costs no copy regardless of corpus size.
+    """
+
+    RANGE_FIELDS = ("folder_id", "doc_id", "file_type")
+    GROWTH_ROWS = 65536
+    SEARCH_BLOCK_ROWS = 65536
+
+    def __init__(self, data_dir: str = "data/mmap_vectors", read_only: bool = False):
+        self.data_dir = Path(data_dir)
+        self.vectors_file = self.data_dir / "vectors.f16"
+        self.db_file = self.data_dir / "rows.db"
+        self.read_only = read_only
+
+        self._lock = threading.RLock()
+        self._initialized = False
+        self._matrix: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        self._count = 0
+        self._version = -1
+        self._epoch = -1  # bumped by clear(): rows already read are no longer valid
+        self._deleted = np.zeros(0, dtype=bool)
+        self._tombstone_seq = 0  # last tombstone log entry applied to _deleted
+        self._ranges: Dict[str, Dict[str, List[Tuple[int, int]]]] = {}
+        self._rows_by_chunk: Optional[Dict[str, int]] = None  # live rows, built on demand
+        self._chunk_by_row: Dict[int, str] = {}
+
+    # -------------------------
+    # Storage
+    # -------------------------
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=30)
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+
+        with self._lock:
+            if self._initialized:
+                return
+
+            if not self.read_only:
+                self.data_dir.mkdir(parents=True, exist_ok=True)
+                with self._connect() as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS rows (
+                            row INTEGER PRIMARY KEY,
+                            chunk_id TEXT NOT NULL,
+                            doc_id TEXT,
+                            folder_id TEXT,
+                            file_type TEXT,
+                            payload TEXT,
+                            deleted INTEGER DEFAULT 0
+                        )
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS ranges (
+                            field TEXT NOT NULL,
+                            value TEXT NOT NULL,
+                            start INTEGER NOT NULL,
+                            stop INTEGER NOT NULL
+                        )
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS tombstones (
+                            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                            row INTEGER NOT NULL
+                        )
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_chunk ON rows(chunk_id)")
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_doc ON rows(doc_id)")
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_ranges_key ON ranges(field, value)")
+                    conn.commit()
+            elif not self.db_file.exists():
+                raise FileNotFoundError(f"No mmap vector store at {self.data_dir}")
+
+            self._refresh(force=True)
+            self._initialized = True
+            logger.info(f"Mmap vector store attached at {self.data_dir} ({self._count} rows)")
+
+    def _read_meta(self, conn) -> Dict[str, int]:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _refresh(self, force: bool = False):
+        """
+        Pick up rows committed by a writer (possibly another process). Only what changed
+        since the last refresh is read: rows past the known count, ranges reaching into
+        them and new tombstone log entries. force (or a store that shrank) reloads it all.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN")  # one snapshot for every read below
+            meta = self._read_meta(conn)
+            version = meta.get("version", 0)
+            if not force and version == self._version:
+                conn.rollback()
+                return
+
+            count = meta.get("count", 0)
+            epoch = meta.get("epoch", 0)
+            full = force or epoch != self._epoch or count < self._count
+            start = 0 if full else self._count
+            self._dim = meta.get("dim")
+
+            if full:
+                self._ranges = {field: {} for field in self.RANGE_FIELDS}
+                self._rows_by_chunk = None
+            for field, value, run_start, run_stop in conn.execute(
+                "SELECT field, value, start, stop FROM ranges WHERE stop > ? ORDER BY start", (start,)
+            ):
+                spans = self._ranges.setdefault(field, {}).setdefault(value, [])
+                if spans and spans[-1][0] == run_start:
+                    spans[-1] = (run_start, run_stop)  # run extended by a later batch
+                else:
+                    spans.append((run_start, run_stop))
+
+            deleted = np.zeros(count, dtype=bool)
+            if full:
+                # Stores written before the tombstone log only have the flag
+                dead = [r[0] for r in conn.execute("SELECT row FROM rows WHERE deleted = 1")]
+                self._tombstone_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM tombstones").fetchone()[0]
+            else:
+                deleted[:len(self._deleted)] = self._deleted
+                logged = conn.execute(
+                    "SELECT seq, row FROM tombstones WHERE seq > ? ORDER BY seq", (self._tombstone_seq,)
+                ).fetchall()
+                dead = [row for _, row in logged]
+                if logged:
+                    self._tombstone_seq = logged[-1][0]
+            if dead:
+                deleted[np.asarray(dead)] = True
+
+            if self._rows_by_chunk is not None:
+                for row in dead:
+                    chunk_id = self._chunk_by_row.pop(row, None)
+                    if chunk_id is not None and self._rows_by_chunk.get(chunk_id) == row:
+                        del self._rows_by_chunk[chunk_id]
+                for chunk_id, row in conn.execute(
+                    "SELECT chunk_id, row FROM rows WHERE row >= ? AND deleted = 0", (start,)
+                ):
+                    self._rows_by_chunk[chunk_id] = row
+                    self._chunk_by_row[row] = chunk_id
+            conn.rollback()
+
+            self._deleted = deleted
+            self._count = count
+            self._version = version
+            self._epoch = epoch
+
+        self._map_matrix()
+
+    def _map_matrix(self, min_rows: int = 0):
+        if self._dim is None:
+            self._matrix = None
+            return
+
+        row_bytes = self._dim * np.dtype(np.float16).itemsize
+        size = self.vectors_file.stat().st_size if self.vectors_file.exists() else 0
+        capacity = size // row_bytes
+
+        if capacity < min_rows:
+            # Append-only growth: extend the file, existing rows stay where they are
+            capacity = max(min_rows, capacity + self.GROWTH_ROWS)
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+            with open(self.vectors_file, "ab") as f:
+                f.truncate(capacity * row_bytes)
+
+        if self._matrix is not None and self._matrix.shape[0] == capacity:
+            return
+        if capacity == 0:
+            self._matrix = None
+            return
+
+        mode = "r" if self.read_only else "r+"
+        self._matrix = np.memmap(self.vectors_file, dtype=np.float16, mode=mode, shape=(capacity, self._dim))
+
+    # -------------------------
+    # Ingestion
+    # -------------------------
+
+    def add_documents(self, chunks: List[Dict]) -> int:
+        if self.read_only:
+            raise RuntimeError("Mmap vector store is attached read-only")
+        self._ensure_initialized()
+        if not chunks:
+            return 0
+
+        texts = [c.get("text", "") for c in chunks]
+        embeddings = instructor_service.encode_documents(texts)
+
+        rows = []
+        for chunk in chunks:
+            cid = str(chunk.get("chunk_id") or uuid.uuid4())
+            payload = {
+                "chunk_id": cid,
+                "doc_id": chunk.get("file_id") or chunk.get("doc_id", "unknown"),
+                "folder_id": chunk.get("folder_id", "unknown"),
+                "source_name": chunk.get("source_file", "unknown"),
+                "page": chunk.get("page"),
+                "chunk_index": chunk.get("chunk_index", 0),
+                "file_type": chunk.get("file_type", "unknown"),
+            }
+            rows.append(payload)
+
+        return self.add_vectors(rows, embeddings)
+
+    def add_vectors(self, rows: List[Dict], embeddings) -> int:
+        """
+        Append pre-computed vectors. Each row is the payload of one vector and needs a
+        chunk_id; an existing live row with the same chunk_id is tombstoned.
+        """
+        if self.read_only:
+            raise RuntimeError("Mmap vector store is attached read-only")
+        self._ensure_initialized()
+        if not rows:
+            return 0
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-9
+
+        with self._lock:
+            self._refresh()
+            if self._dim is None:
+                self._dim = embeddings.shape[1]
+            elif embeddings.shape[1] != self._dim:
+                raise ValueError(f"Embedding dim {embeddings.shape[1]} does not match store dim {self._dim}")
+
+            start = self._count
+            stop = start + len(rows)
+            self._map_matrix(min_rows=stop)
+
+            # Vectors first: readers only see rows once the count below is committed
+            self._matrix[start:stop] = embeddings.astype(np.float16)
+            self._matrix.flush()
+
+            with self._connect() as conn:
+                chunk_ids = [r["chunk_id"] for r in rows]
+                placeholders = ", ".join("?" for _ in chunk_ids)
+                conn.execute(
+                    f"INSERT INTO tombstones (row) SELECT row FROM rows WHERE deleted = 0 AND chunk_id IN ({placeholders})",
+                    chunk_ids
+                )
+                replaced = conn.execute(
+                    f"UPDATE rows SET deleted = 1 WHERE deleted = 0 AND chunk_id IN ({placeholders})",
+                    chunk_ids
+                ).rowcount
+
+                conn.executemany(
+                    "INSERT INTO rows (row, chunk_id, doc_id, folder_id, file_type, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (start + i, r["chunk_id"], r.get("doc_id"), r.get("folder_id"), r.get("file_type"), json.dumps(r))
+                        for i, r in enumerate(rows)
+                    ]
+                )
+                self._append_ranges(conn, rows, start)
+
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self._dim,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('count', ?)", (stop,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self._version + 1,))
+                conn.commit()
+
+            self._refresh()
+
+        logger.info(f"Mmap store: appended {len(rows)} rows ({replaced} replaced), total {stop}")
+        return len(rows)
+
+    def _append_ranges(self, conn, rows: List[Dict], start: int):
+        """Record runs of equal field values, extending a run that ends where this batch starts."""
+        for field in self.RANGE_FIELDS:
+            runs = []
+            for i, r in enumerate(rows):
+                value = str(r.get(field))
+                if runs and runs[-1][0] == value:
+                    runs[-1][2] = start + i + 1
+                else:
+                    runs.append([value, start + i, start + i + 1])
+
+            for value, run_start, run_stop in runs:
+                extended = conn.execute(
+                    "UPDATE ranges SET stop = ? WHERE field = ? AND value = ? AND stop = ?",
+                    (run_stop, field, value, run_start)
+                ).rowcount
+                if not extended:
+                    conn.execute(
+                        "INSERT INTO ranges (field, value, start, stop) VALUES (?, ?, ?, ?)",
+                        (field, value, run_start, run_stop)
+                    )
+
+    def delete_documents(self, file_ids: List[str]) -> int:
+        removed = self._tombstone("doc_id", file_ids)
+        logger.info(f"Mmap store: tombstoned {removed} rows for {len(file_ids)} documents")
+        return removed
+
+    def delete_chunks(self, chunk_ids: List[str]) -> int:
+        return self._tombstone("chunk_id", chunk_ids)
+
+    def _tombstone(self, column: str, values: List[str]) -> int:
+        if self.read_only:
+            raise RuntimeError("Mmap vector store is attached read-only")
+        self._ensure_initialized()
+        if not values:
+            return 0
+
+        with self._lock, self._connect() as conn:
+            placeholders = ", ".join("?" for _ in values)
+            conn.execute(
+                f"INSERT INTO tombstones (row) SELECT row FROM rows WHERE deleted = 0 AND {column} IN ({placeholders})",
+                list(values)
+            )
+            removed = conn.execute(
+                f"UPDATE rows SET deleted = 1 WHERE deleted = 0 AND {column} IN ({placeholders})",
+                list(values)
+            ).rowcount
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self._version + 1,))
+            conn.commit()
+
+        self._refresh()
+        return removed
+
+    # -------------------------
+    # Search
+    # -------------------------
+
+    @staticmethod
+    def _intersect(a: List[Tuple[int, int]], b: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        result = []
+        i = j = 0
+        while i < len(a) and j < len(b):
+            start = max(a[i][0], b[j][0])
+            stop = min(a[i][1], b[j][1])
+            if start < stop:
+                result.append((start, stop))
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def _scope_ranges(self, folder_id=None, file_id=None, file_type=None, doc_ids=None) -> List[Tuple[int, int]]:
+        spans = [(0, self._count)]
+        for field, value in (("folder_id", folder_id), ("doc_id", file_id), ("file_type", file_type)):
+            if value:
+                spans = self._intersect(spans, self._ranges.get(field, {}).get(str(value), []))
+        if doc_ids is not None:
+            doc_ranges = self._ranges.get("doc_id", {})
+            spans = self._intersect(spans, sorted(s for d in doc_ids for s in doc_ranges.get(str(d), [])))
+        return spans
+
+    def search(
+        self,
+        query: str,
+        k: int = 40,
+        folder_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        file_type: Optional[str] = None
+    ) -> List[Dict]:
+        self._ensure_initialized()
+        self._refresh()
+        if self._matrix is None or self._count == 0:
+            return []
+
+        query_vec = np.asarray(instructor_service.encode_query(query), dtype=np.float32)
+
+        with self._lock:
+            spans = self._scope_ranges(folder_id, file_id, file_type)
+        hits = self._top_rows(query_vec, k, spans=spans)
+        if not hits:
+            return []
+
+        with self._connect() as conn:
+            placeholders = ", ".join("?" for _ in hits)
+            payloads = {
+                row: json.loads(payload)
+                for row, payload in conn.execute(
+                    f"SELECT row, payload FROM rows WHERE row IN ({placeholders})",
+                    [row for row, _ in hits]
+                )
+            }
+
+        logger.info(f"[MMAP] Returning {len(hits)} rows")
+
+        return [
+            {
+                "id": payloads[row]["chunk_id"],
+                "score": score,
+                "payload": payloads[row],
+                "chunk_id": payloads[row]["chunk_id"]
+            }
+            for row, score in hits
+            if row in payloads
+        ]
+
+    def search_vector(
+        self,
+        query_vec,
+        k: int,
+        chunk_ids: Optional[Iterable[str]] = None,
+        scope: Optional[Dict] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k (chunk_id, score) for an encoded query, optionally restricted to chunk_ids
+        or to a scope (folder_id, doc_id, file_type, doc_ids) resolved from the row ranges.
+        """
+        self._ensure_initialized()
+        self._refresh()
+        if self._matrix is None or self._count == 0:
+            return []
+
+        query_vec = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        query_vec /= np.linalg.norm(query_vec) + 1e-9
+        with self._lock:
+            rows_by_chunk = self._row_index()
+            if scope is not None:
+                spans = self._scope_ranges(
+                    scope.get("folder_id"), scope.get("doc_id"), scope.get("file_type"), scope.get("doc_ids")
+                )
+                hits = self._top_rows(query_vec, k, spans=spans)
+            elif chunk_ids is None:
+                hits = self._top_rows(query_vec, k, spans=[(0, self._count)])
+            else:
+                rows = np.asarray(sorted(rows_by_chunk[c] for c in chunk_ids if c in rows_by_chunk), dtype=np.int64)
+                hits = self._top_rows(query_vec, k, rows=rows)
+            chunk_by_row = self._chunk_by_row
+        return [(chunk_by_row[row], score) for row, score in hits if row in chunk_by_row]
+
+    def _row_index(self) -> Dict[str, int]:
+        """chunk_id -> row of every live row (built once, then kept current by _refresh)."""
+        if self._rows_by_chunk is None:
+            with self._connect() as conn:
+                pairs = conn.execute("SELECT chunk_id, row FROM rows WHERE deleted = 0").fetchall()
+            self._rows_by_chunk = dict(pairs)
+            self._chunk_by_row = {row: chunk_id for chunk_id, row in pairs}
+        return self._rows_by_chunk
+
+    def _top_rows(self, query_vec, k: int, spans=None, rows=None) -> List[Tuple[int, float]]:
+        """Exact top-k over row spans or an explicit row array, blockwise in float32."""
+        matrix, deleted = self._matrix, self._deleted
+        score_parts, row_parts = [], []
+        if rows is not None:
+            for block_start in range(0, len(rows), self.SEARCH_BLOCK_ROWS):
+                block = rows[block_start:block_start + self.SEARCH_BLOCK_ROWS]
+                scores = matrix[block].astype(np.float32) @ query_vec
+                scores[deleted[block]] = -np.inf
+                score_parts.append(scores)
+                row_parts.append(block)
+        for start, stop in spans or []:
+            for block_start in range(start, stop, self.SEARCH_BLOCK_ROWS):
+                block_stop = min(block_start + self.SEARCH_BLOCK_ROWS, stop)
+                # Slices of the memmap are views; only the float32 upcast is materialized
+                scores = matrix[block_start:block_stop].astype(np.float32) @ query_vec
+                scores[deleted[block_start:block_stop]] = -np.inf
+                score_parts.append(scores)
+                row_parts.append(np.arange(block_start, block_stop))
+
+        if not score_parts:
+            return []
+
+        scores = np.concatenate(score_parts)
+        row_ids = np.concatenate(row_parts)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return [(int(row_ids[i]), float(scores[i])) for i in top]
+
+    # -------------------------
+    # Utilities
+    # -------------------------
+
+    def get_count(self) -> int:
+        self._ensure_initialized()
+        self._refresh()
+        return int(self._count - self._deleted.sum())
+
+    def clear(self):
+        if self.read_only:
+            raise RuntimeError("Mmap vector store is attached read-only")
+        self._ensure_initialized()
+        with self._lock:
+            self._matrix = None
+            if self.vectors_file.exists():
+                self.vectors_file.unlink()
+            with self._connect() as conn:
+                conn.execute("DELETE FROM rows")
+                conn.execute("DELETE FROM ranges")
+                conn.execute("DELETE FROM tombstones")
+                conn.execute("DELETE FROM meta WHERE key IN ('dim', 'count')")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self._version + 1,))
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('epoch', ?)", (self._epoch + 1,))
+                conn.commit()
+            self._refresh(force=True)
+        logger.info(f"Cleared mmap vector store at {self.data_dir}")
+
+
+
+class MmapDenseIndex:
+    """
+    Exact dense index for the embedded Qdrant store (QDRANT_LOCAL_INDEX=mmap), with the
+    same interface as LocalAnnIndex. Rows are keyed by Qdrant point id and carry the
+    point's folder_id/doc_id/file_type, so scopes resolve to row ranges instead of id lists.
+    """
+
+    SCOPES_BY_PAYLOAD = True
+
+    def __init__(self, data_dir: str):
+        self.store = MmapVectorService(data_dir)
+
+    @staticmethod
+    def is_available() -> bool:
+        return True
+
+    @property
+    def count(self) -> int:
+        return self.store.get_count()
+
+    def load(self):
+        self.store._ensure_initialized()
+
+    def point_ids(self) -> Set[str]:
+        self.store._ensure_initialized()
+        self.store._refresh()
+        with self.store._lock:
+            return set(self.store._row_index())
+
+    def save(self):
+        pass  # every append is flushed and committed
+
+    def clear(self):
+        self.store.clear()
+
+    def add(self, point_ids: List[str], vectors, payloads: Optional[List[Dict]] = None):
+        if not point_ids:
+            return
+        payloads = payloads or [{} for _ in point_ids]
+        rows = [
+            {
+                "chunk_id": pid,
+                "doc_id": p.get("doc_id"),
+                "folder_id": p.get("folder_id"),
+                "file_type": p.get("file_type"),
+                "chunk_index": p.get("chunk_index") or 0,
+            }
+            for pid, p in zip(point_ids, payloads)
+        ]
+        # Appended grouped by folder and document, so each scope stays a few contiguous ranges
+        order = sorted(
+            range(len(rows)),
+            key=lambda i: (str(rows[i]["folder_id"]), str(rows[i]["doc_id"]), rows[i]["chunk_index"])
+        )
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.store.add_vectors([rows[i] for i in order], vectors[order])
+
+    def delete(self, point_ids: List[str]) -> int:
+        return self.store.delete_chunks(point_ids)
+
+    def search(
+        self,
+        query_vec,
+        k: int,
+        allowed_point_ids: Optional[Iterable[str]] = None,
+        ef: Optional[int] = None,
+        exact: Optional[bool] = None,
+        scope: Optional[Dict] = None
+    ) -> List[Tuple[str, float]]:
+        # Always exact: ef and exact only matter to the HNSW index
+        return self.store.search_vector(query_vec, k, chunk_ids=allowed_point_ids, scope=scope)
+
+
+# Singleton
+mmap_vector_service = MmapVectorService()
@@ -0,0 +1,97 @@
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+backend_dir = Path(__file__).parent.parent.parent
+PROFILES_FILE = os.getenv("RETRIEVAL_PROFILES_FILE", str(backend_dir / "retrieval_profiles.json"))
+
+# Built-in values (the previous hard-coded behaviour); profiles override any subset
+DEFAULT_SETTINGS = {
+    "search_k": 250,
+    "search_ef": 512,
+    "exhaustive_scope_max": 2000,
+    "two_level_top_m": 50,
+    "feedback": True,
+    "rerank_top_n": None,        # rerank every candidate
+    "rerank_threshold": -10.0,
+    "pass2": True,
+    "context_chars": 8000,
+    "context_chars_pass2": 10000,
+    "chunk_chars": 1500,
+    "neighbor_window": 1,        # chunks on each side of a top hit added to the context
+    "neighbor_hits": 3,          # how many top hits get neighbours
+    "ingest_batch_size": 64,
+}
+
+
+class ProfileService:
+    """
+    Named retrieval profiles (low_latency / balanced / high_recall) from one JSON file.
+    RETRIEVAL_PROFILE picks the deployment default, requests may name another.
+    The file is re-read whenever its mtime changes, so edits apply without a restart.
+    """
+
+    def __init__(self, path: str = PROFILES_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._profiles: Dict[str, Dict] = {"balanced": {}}
+        self._file_default = "balanced"
+
+    def _reload_if_changed(self):
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                profiles = data["profiles"]
+                if not isinstance(profiles, dict) or not profiles:
+                    raise ValueError("'profiles' must be a non-empty object")
+                self._profiles = profiles
+                self._file_default = data.get("default", "balanced")
+                logger.info(f"Loaded retrieval profiles {list(profiles)} from {self.path}")
+            except Exception as e:
+                # Keep serving the last good profiles
+                logger.error(f"Invalid retrieval profiles file {self.path}: {e}")
+            self._mtime = mtime
+
+    @property
+    def default_name(self) -> str:
+        self._reload_if_changed()
+        return os.getenv("RETRIEVAL_PROFILE") or self._file_default
+
+    def names(self):
+        self._reload_if_changed()
+        return list(self._profiles)
+
+    def get(self, name: Optional[str] = None) -> Dict:
+        """Settings of a profile (deployment default if name is None), with a 'name' key."""
+        self._reload_if_changed()
+        default = self.default_name
+        if default not in self._profiles:
+            default = "balanced" if "balanced" in self._profiles else next(iter(self._profiles))
+        name = name or default
+        if name not in self._profiles:
+            logger.warning(f"Unknown retrieval profile '{name}', using '{default}'")
+            name = default
+        settings = dict(DEFAULT_SETTINGS)
+        settings.update(self._profiles.get(name, {}))
+        settings["name"] = name
+        return settings
+
+
+# Singleton
+profile_service = ProfileService()
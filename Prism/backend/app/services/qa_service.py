@@ -12,6 +12,7 @@ import logging
 import sys
 import time
 import re
+import html
 
 logger = logging.getLogger(__name__)
 
@@ -22,16 +23,36 @@ if str(backend_dir) not in sys.path:
 
 # Imports from existing modules
 # We will lazy import ingestion modules to prevent startup bottlenecks and DLL conflicts
-from .llm_service import ollama_llm
+from .llm_service import ollama_llm, LLMQueueTimeout
 from .progress_service import progress_service
 from .folder_service import folder_service
 from .audit_service import audit_service
 from .qdrant_service import qdrant_service
 from .reranker_service import reranker_service
+from .query_expansion_service import query_expansion_service
+from .lexical_index_service import lexical_index_service
+from .chunk_adjacency import chunk_adjacency
+from .document_router_service import document_router
+from .deadline import Deadline, RequestCancelled
+from .profile_service import profile_service
+from ingestion.chunker import extract_identifiers, is_strong_identifier, link_neighbors
 from .table_service import table_service
 
 
 class DocumentQAService:
+    # Deadline: rough cost of each optional stage (ms), checked against the remaining budget
+    STAGE_COST_MS = {
+        "llm_rewrite": 4000,
+        "tabular": 8000,     # SQL generation + synthesis (two LLM calls)
+        "feedback": 800,     # second, narrow retrieval round
+        "rerank": 1500,
+        "pass2": 8000,       # reformulation (LLM) + retrieval + rerank
+        "generation": 3000,  # shortest useful answer
+    }
+    GEN_TOKENS_PER_SEC = float(os.getenv("QA_GEN_TOKENS_PER_SEC", "20"))
+    MAX_ANSWER_TOKENS = 1000
+    MIN_ANSWER_TOKENS = 128
+
     def __init__(self, data_dir: str = "data"):
         """
         Initialize Document Q&A service
@@ -47,8 +68,14 @@ class DocumentQAService:
         self.document_chunks: Dict[str, List[Dict]] = {}
         self.document_metadata: Dict[str, Dict] = {}
         self._chunks_cache: Dict[str, List[Dict]] = {}
+        # Questions abandoned by their client, by the stage they stopped at
+        self.cancelled_by_stage: Dict[str, int] = {}
 
         self._load_existing_documents()
+        document_router.rebuild(self.document_metadata)
+        query_expansion_service.build_if_empty(self.processed_dir)
+        lexical_index_service.build_if_empty(self.processed_dir)
+        chunk_adjacency.build_if_empty(self.processed_dir)
         
         # Check if index is empty but we have processed docs (Migration scenario)
         # In a real migration, we'd run a script, but we can do a lazy check here if desired.
@@ -205,13 +232,13 @@ class DocumentQAService:
                 logger.warning(f"File type {suffix} uploaded but ingestion not fully implemented yet.")
                 chunks = [] # Empty chunks means it exists but no content indexed
 
-            # Step 2.5: Inject Filename into Text (Fix for RAG Accuracy)
-            # Prepend filename to allow retrieval by file ID/name
+            # Step 2.5: Label chunks with their document (the chunker already adds [Document: ...])
+            # Questions naming a document are scoped by document_router, so no File ID line here
             for chunk in chunks:
                 original_text = chunk.get("text", "")
                 # Only prepend if it's not already there (safety check)
-                if not original_text.startswith(f"Filename:"):
-                     chunk["text"] = f"Filename: {file_path.name}\nFile ID: {file_id}\n{original_text}"
+                if not original_text.startswith(("Filename:", "[Document:")):
+                     chunk["text"] = f"[Document: {file_path.name}]\n{original_text}"
 
             # Step 3: Store results (Unified Store)
             if progress_file_id:
@@ -242,6 +269,8 @@ class DocumentQAService:
             for chunk in chunks:
                 if not chunk.get("chunk_id"):
                     chunk["chunk_id"] = str(uuid.uuid4())
+            # Re-link with the final IDs (chunk_index = position in the saved list)
+            link_neighbors(chunks)
 
             # Add to Vector Store (Qdrant)
             qdrant_service.add_documents(chunks)
@@ -345,32 +374,85 @@ Output format (JSON ONLY):
             logger.error(f"Query rewriter agent failed: {e}")
             return {"rewrite_required": False}
 
+    def _expand_query(self, question: str, mode: str = None) -> Tuple[List[str], Dict]:
+        """Query variants for retrieval. mode overrides QUERY_EXPANSION_MODE for A/B comparisons."""
+        mode = (mode or query_expansion_service.mode).lower()
+        start = time.time()
+        queries = [question]
+        optimization = {"mode": mode, "rewrite_required": False}
+
+        try:
+            if mode == "llm":
+                optimization.update(self.query_rewriter_agent(question))
+                if optimization.get("rewrite_required"):
+                    queries += optimization.get("rewritten_queries") or []
+            elif mode == "local":
+                queries = query_expansion_service.expand(question)
+                optimization["rewrite_required"] = len(queries) > 1
+                # Short queries also get a pseudo-relevance feedback round
+                optimization["feedback"] = query_expansion_service.is_short(question)
+        except Exception as e:
+            logger.error(f"Query expansion ({mode}) failed: {e}")
+
+        optimization["latency_ms"] = round((time.time() - start) * 1000, 2)
+        logger.info(f"[TIMER] Query expansion ({mode}): {optimization['latency_ms']}ms, {len(queries)} queries")
+        return queries, optimization
+
     def answer_question(
         self,
         question: str,
         file_id: str = None,
         folder_id: str = None,
-        max_chunks: int = 10
+        max_chunks: int = 10,
+        expansion_mode: str = None,
+        budget_ms: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        profile: Optional[str] = None
     ) -> Dict:
         start_time = time.time()
+        # Retrieval profile (RETRIEVAL_PROFILE or per request): search depth, rerank and context sizes
+        settings = profile_service.get(profile)
+        # Latency budget (QA_BUDGET_MS or per request): stages fall back to cheaper behaviour as it runs out
+        deadline = deadline or Deadline(budget_ms)
+        cost = self.STAGE_COST_MS
+
+        # Questions naming a document search only that document
+        routing = None
+        preferred_file_id = None
+        if not file_id:
+            routing = self._route_to_document(question, folder_id)
+            if routing and routing["scope"] == "hard":
+                file_id = routing["file_id"]
+            elif routing:
+                # One-word name: search everything, but make sure that document is in the running
+                preferred_file_id = routing["file_id"]
         
-        # 1. Retrieval Optimization Agent (SKIPPED for latency)
-        # optimization = self.query_rewriter_agent(question)
-        queries_to_run = [question]
-        optimization = {"rewrite_required": False}
+        # 1. Retrieval Optimization: local expansion (default), LLM rewriter or off
+        expansion_mode = (expansion_mode or query_expansion_service.mode).lower()
+        if expansion_mode == "llm" and not deadline.has(cost["llm_rewrite"] + cost["generation"]):
+            deadline.degrade("expansion", "LLM rewrite replaced by local expansion")
+            expansion_mode = "local"
+        queries_to_run, optimization = self._expand_query(question, expansion_mode)
+        if deadline.cancelled:
+            return self._cancelled_result(RequestCancelled("expansion"), deadline)
 
         # --- 0. Tabular Query Routing ---
         is_tabular = self._is_tabular_query(question)
+        if is_tabular and not deadline.has(cost["tabular"] + cost["generation"]):
+            deadline.degrade("tabular", "tabular path skipped")
+            is_tabular = False
         if is_tabular:
             logger.info(f"Query classified as TABULAR: {question}")
             # Try Tabular Path
             tabular_result = self._handle_tabular_query(question, file_id, folder_id)
             if tabular_result:
                 # Success! Return early
+                tabular_result["deadline"] = deadline.report()
                 return tabular_result
             logger.info("Tabular path yielded no results. Falling back to semantic search.")
         
         try:
+            deadline.check("retrieval")
             if not ollama_llm.is_ready():
                 return {"success": False, "error": "Ollama LLM not available."}
 
@@ -381,14 +463,36 @@ Output format (JSON ONLY):
                 original_query=question,
                 file_id=file_id,
                 folder_id=folder_id,
-                top_k=max_chunks
+                top_k=max_chunks,
+                feedback=optimization.get("feedback", False) and settings["feedback"],
+                deadline=deadline,
+                profile=settings,
+                preferred_file_id=preferred_file_id
             )
+            if not relevant_chunks and routing and routing["scope"] == "hard":
+                # Nothing in the named document survived reranking: the name was probably incidental
+                logger.info(f"Routed search in {file_id} found nothing, retrying unscoped")
+                routing["fallback"] = "unscoped"
+                file_id = None
+                relevant_chunks, retrieval_stats = self._retrieve_and_rank(
+                    queries=queries_to_run,
+                    original_query=question,
+                    file_id=None,
+                    folder_id=folder_id,
+                    top_k=max_chunks,
+                    deadline=deadline,
+                    profile=settings
+                )
             t_retrieval_end = time.time()
             logger.info(f"[TIMER] Retrieval & Reranking (Pass 1): {(t_retrieval_end - t_retrieval_start)*1000:.2f}ms")
             
             # Build Context
-            context = self._build_context(relevant_chunks, max_length=8000, folder_id=folder_id)
+            context = self._build_context(
+                relevant_chunks, max_length=settings["context_chars"], folder_id=folder_id, chunk_chars=settings["chunk_chars"],
+                neighbor_window=settings["neighbor_window"], neighbor_hits=settings["neighbor_hits"]
+            )
             
+            deadline.check("sufficiency")
             # Sufficiency Check - Skip if no chunks at all to save an LLM call
             if not relevant_chunks:
                 is_sufficient = False
@@ -399,12 +503,20 @@ Output format (JSON ONLY):
                 t_suff_end = time.time()
                 logger.info(f"[TIMER] Sufficiency Check: {(t_suff_end - t_suff_start)*1000:.2f}ms")
             
-            # 2. Agentic Loop (Pass 2) - ONLY if needed
+            # 2. Agentic Loop (Pass 2) - ONLY if needed, and only if the profile and budget allow it
+            if not is_sufficient and not settings["pass2"]:
+                logger.info(f"Pass 2 disabled by profile '{settings['name']}'")
+                is_sufficient = True
+            if not is_sufficient and not deadline.has(cost["pass2"] + cost["generation"]):
+                deadline.degrade("pass2", "second retrieval pass skipped")
+                is_sufficient = True
             if not is_sufficient:
                 logger.info(f"Pass 1 Insufficient: {missing_reason}. Reformulating...")
                 
                 # Reformulate (Fallback to old simple logic or ask agent again?)
+                deadline.check("pass2")
                 new_query = self._reformulate_query(question, missing_reason)
+                deadline.check("pass2")
                 
                 # Retrieve Pass 2
                 chunks_p2, _ = self._retrieve_and_rank(
@@ -412,7 +524,9 @@ Output format (JSON ONLY):
                     original_query=new_query,
                     file_id=file_id,
                     folder_id=folder_id,
-                    top_k=max_chunks
+                    top_k=max_chunks,
+                    deadline=deadline,
+                    profile=settings
                 )
                 
                 # Merge Evidence
@@ -422,7 +536,10 @@ Output format (JSON ONLY):
                         relevant_chunks.append(c)
                         seen_ids.add(c["chunk_id"])
                 
-                context = self._build_context(relevant_chunks, max_length=10000, folder_id=folder_id)
+                context = self._build_context(
+                    relevant_chunks, max_length=settings["context_chars_pass2"], folder_id=folder_id, chunk_chars=settings["chunk_chars"],
+                    neighbor_window=settings["neighbor_window"], neighbor_hits=settings["neighbor_hits"]
+                )
 
             # 3. Final Generation
             if not context.strip() and not folder_id:
@@ -430,8 +547,13 @@ Output format (JSON ONLY):
                 sources = []
             else:
                 t_gen_start = time.time()
+                max_tokens = self._answer_token_budget(deadline)
                 # Pass "Antigravity" compliant instructions via system prompt override
-                answer = ollama_llm.answer_question(context, question)
+                # Streamed, so a disconnect stops Ollama mid-answer
+                deadline.check("generation")
+                answer = ollama_llm.answer_question(
+                    context, question, max_tokens=max_tokens, should_stop=lambda: deadline.cancelled
+                )
                 t_gen_end = time.time()
                 logger.info(f"[TIMER] Final LLM Generation: {(t_gen_end - t_gen_start)*1000:.2f}ms")
                 sources = self._extract_sources(relevant_chunks)
@@ -450,7 +572,8 @@ Output format (JSON ONLY):
                 generation_time_ms=total_time,
                 models_info={
                     "mode": "agentic_loop" if not is_sufficient else "optimized",
-                    "rewritten": optimization.get("rewrite_required")
+                    "rewritten": optimization.get("rewrite_required"),
+                    "expansion": optimization.get("mode")
                 },
                 file_id=file_id,
                 folder_id=folder_id
@@ -462,13 +585,145 @@ Output format (JSON ONLY):
                 "sources": sources,
                 "chunks_used": len(relevant_chunks),
                 "question": question,
-                "is_agentic": not is_sufficient
+                "is_agentic": not is_sufficient,
+                "routing": routing,
+                "profile": settings["name"],
+                "deadline": deadline.report(),
+                "expansion": {
+                    "mode": optimization.get("mode"),
+                    "queries": queries_to_run,
+                    "feedback_terms": retrieval_stats.get("feedback_terms", []),
+                    "latency_ms": optimization.get("latency_ms")
+                }
             }
 
+        except RequestCancelled as e:
+            return self._cancelled_result(e, deadline)
+        except LLMQueueTimeout as e:
+            # Load shedding, not a bug: answer fast instead of queueing behind the backlog
+            logger.warning(f"Question shed: {e}")
+            return {"success": False, "error": str(e), "deadline": deadline.report()}
         except Exception as e:
             logger.error(f"Error answering question: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
 
+    def _cancelled_result(self, e: RequestCancelled, deadline: Deadline) -> Dict:
+        self.cancelled_by_stage[e.stage] = self.cancelled_by_stage.get(e.stage, 0) + 1
+        logger.info(f"Question abandoned during {e.stage} after {deadline.elapsed_ms():.0f}ms ({deadline.cancel_reason})")
+        return {"success": False, "error": str(e), "cancelled": True, "deadline": deadline.report()}
+
+    # ------------------------------------------------------------------
+    # Passage search (retrieval only, no LLM)
+    # ------------------------------------------------------------------
+
+    MAX_SEARCH_RESULTS = 200
+
+    def search_passages(
+        self,
+        query: str,
+        file_id: str = None,
+        folder_id: str = None,
+        file_type: str = None,
+        rerank: bool = True,
+        page: int = 1,
+        page_size: int = 10,
+        profile: Optional[str] = None
+    ) -> Dict:
+        """
+        Ranked passages for a query: same hybrid retrieval (+ optional rerank) as
+        answer_question, without expansion rounds, pass 2 or generation.
+        """
+        start = time.time()
+        settings = profile_service.get(profile)
+        page = max(1, page)
+        page_size = max(1, min(page_size, 50))
+        # One extra result tells whether another page exists
+        wanted = min(page * page_size + 1, self.MAX_SEARCH_RESULTS)
+
+        try:
+            ranked, stats = self._retrieve_and_rank(
+                queries=[query],
+                original_query=query,
+                file_id=file_id,
+                folder_id=folder_id,
+                top_k=wanted,
+                profile=settings,
+                rerank=rerank,
+                file_type=file_type
+            )
+        except Exception as e:
+            logger.error(f"Passage search failed: {e}", exc_info=True)
+            return {"success": False, "error": str(e)}
+
+        # Later pages continue past the reranked head in fused order
+        ranked = ranked + stats["unreranked"]
+        offset = (page - 1) * page_size
+        terms = self._highlight_terms(query)
+        results = []
+        for rank, chunk in enumerate(ranked[offset:offset + page_size], offset + 1):
+            fid = chunk.get("file_id") or (chunk.get("metadata") or {}).get("doc_id")
+            meta = self.document_metadata.get(fid, {})
+            scores = stats["scores"].get(str(chunk.get("chunk_id")), {})
+            results.append({
+                "rank": rank,
+                "chunk_id": chunk.get("chunk_id"),
+                "file_id": fid,
+                "file_name": meta.get("file_name"),
+                "page": chunk.get("page") or (chunk.get("metadata") or {}).get("page"),
+                "score": scores.get("score"),
+                "rerank_score": scores.get("rerank_score"),
+                "text": self._strip_labels(chunk.get("text", "")),
+                "highlights": self._highlights(chunk.get("text", ""), terms),
+            })
+
+        took_ms = round((time.time() - start) * 1000, 2)
+        logger.info(f"[TIMER] Passage search (rerank={rerank}, profile={settings['name']}): {took_ms}ms")
+        return {
+            "success": True,
+            "query": query,
+            "results": results,
+            "page": page,
+            "page_size": page_size,
+            "has_more": len(ranked) > offset + page_size,
+            "candidates": stats.get("initial_recall", 0),
+            "profile": settings["name"],
+            "took_ms": took_ms
+        }
+
+    @staticmethod
+    def _strip_labels(text: str) -> str:
+        # Drop the injected [Document: ...] / Filename: ... header lines
+        lines = text.split("\n")
+        while lines and lines[0].startswith(("[Document:", "[Context:", "[Section:", "Filename:", "File ID:")):
+            lines.pop(0)
+        return "\n".join(lines).strip()
+
+    @staticmethod
+    def _highlight_terms(query: str) -> List[str]:
+        terms = query_expansion_service.tokenize(query) + re.findall(r"\b[\w.@/-]*\d[\w.@/-]*\b", query.lower())
+        # Longest first so "inv-2023-001" wins over "2023"
+        return sorted(set(terms), key=len, reverse=True)
+
+    def _highlights(self, text: str, terms: List[str], max_snippets: int = 3, window: int = 90) -> List[str]:
+        """Snippets around query-term matches, terms wrapped in <mark> (text is HTML-escaped)."""
+        text = self._strip_labels(text)
+        if not terms or not text:
+            return []
+        pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+        snippets, last_end = [], -1
+        for match in pattern.finditer(text):
+            if match.start() < last_end:
+                continue
+            lo, hi = max(0, match.start() - window), min(len(text), match.end() + window)
+            fragment = text[lo:hi]
+            marked = pattern.sub(lambda m: f"\x00{m.group(0)}\x01", fragment)
+            marked = html.escape(marked).replace("\x00", "<mark>").replace("\x01", "</mark>")
+            snippets.append(("..." if lo else "") + " ".join(marked.split()) + ("..." if hi < len(text) else ""))
+            last_end = hi
+            if len(snippets) >= max_snippets:
+                break
+        return snippets
+
     # ------------------------------------------------------------------
     # Retrieval helpers
     # ------------------------------------------------------------------
@@ -477,7 +732,10 @@ Output format (JSON ONLY):
         self,
         chunks: List[Dict],
         max_length: int,
-        folder_id: str = None
+        folder_id: str = None,
+        chunk_chars: int = 1500,
+        neighbor_window: int = 0,
+        neighbor_hits: int = 3
     ) -> str:
         parts = []
         length = 0
@@ -502,36 +760,77 @@ Output format (JSON ONLY):
                 parts.append(sys_context)
                 length += len(sys_context)
 
-        for i, chunk in enumerate(chunks, 1):
-            text = chunk["text"]
-            # Previously truncated to 500, now let's allow more per chunk if the total budget allows
-            # But we still want to avoid one massive chunk taking all space.
-            # Let's cap individual chunks at 1500 chars.
-            if len(text) > 1500:
-                text = text[:1500] + "..."
-
-            # Resolve Section Name from File Name
-            file_id = chunk.get("file_id")
-            section_name = "Unknown"
-            if file_id in self.document_metadata:
-                file_name = self.document_metadata[file_id]["file_name"]
-                # Strip extension (e.g. "Report.pdf" -> "Report")
-                section_name = Path(file_name).stem
-            else:
-                # Fallback if metadata missing
-                section_name = file_id
-
-            entry = f"[Section: {section_name} | Page {chunk.get('page', '?')}]\n{text}\n"
+        # 2. Ranked chunks first; each becomes a group that neighbours can join
+        groups = []
+        seen = set()
+        for chunk in chunks:
+            entry = self._context_entry(chunk, chunk_chars)
             
             # Check total length
             if length + len(entry) > max_length:
                 break
 
-            parts.append(entry)
+            groups.append({"chunk": chunk, "entries": [(0, entry)]})
+            seen.add((chunk.get("file_id"), str(chunk.get("chunk_id"))))
             length += len(entry)
 
+        # 3. Spend what is left on the chunks around the top hits (closest first)
+        if neighbor_window > 0:
+            added = 0
+            chunk_maps: Dict[str, Dict[str, Dict]] = {}
+            for group in groups[:neighbor_hits]:
+                file_id = group["chunk"].get("file_id")
+                for n in chunk_adjacency.neighbors(file_id, group["chunk"].get("chunk_id"), neighbor_window):
+                    if (file_id, n["chunk_id"]) in seen:
+                        continue
+                    neighbor = self._neighbor_chunk(file_id, n["chunk_id"], chunk_maps)
+                    if not neighbor or not neighbor.get("text"):
+                        continue
+                    entry = self._context_entry(neighbor, chunk_chars)
+                    if length + len(entry) > max_length:
+                        continue
+                    group["entries"].append((n["offset"], entry))
+                    seen.add((file_id, n["chunk_id"]))
+                    length += len(entry)
+                    added += 1
+            if added:
+                logger.info(f"Context expanded with {added} neighbouring chunks")
+
+        # Neighbours sit in reading order around their hit
+        for group in groups:
+            parts.extend(entry for _, entry in sorted(group["entries"], key=lambda e: e[0]))
+
         return "\n".join(parts)
 
+    def _neighbor_chunk(self, file_id: str, chunk_id: str, chunk_maps: Dict[str, Dict[str, Dict]]) -> Optional[Dict]:
+        """Chunk by (doc_id, chunk_id); each document is loaded and indexed once per context build."""
+        if file_id not in chunk_maps:
+            if file_id not in self.document_chunks:
+                self.load_processed_document(file_id, load_chunks=True)
+            chunk_maps[file_id] = {str(c.get("chunk_id")): c for c in self.document_chunks.get(file_id, [])}
+        return chunk_maps[file_id].get(str(chunk_id))
+
+    def _context_entry(self, chunk: Dict, chunk_chars: int) -> str:
+        text = chunk["text"]
+        # Previously truncated to 500, now let's allow more per chunk if the total budget allows
+        # But we still want to avoid one massive chunk taking all space.
+        # Let's cap individual chunks (1500 chars unless the profile says otherwise).
+        if len(text) > chunk_chars:
+            text = text[:chunk_chars] + "..."
+
+        # Resolve Section Name from File Name
+        file_id = chunk.get("file_id")
+        section_name = "Unknown"
+        if file_id in self.document_metadata:
+            file_name = self.document_metadata[file_id]["file_name"]
+            # Strip extension (e.g. "Report.pdf" -> "Report")
+            section_name = Path(file_name).stem
+        else:
+            # Fallback if metadata missing
+            section_name = file_id
+
+        return f"[Section: {section_name} | Page {chunk.get('page', '?')}]\n{text}\n"
+
     def _extract_sources(self, chunks: List[Dict]) -> List[Dict]:
         sources = []
         for chunk in chunks:
@@ -555,6 +854,14 @@ Output format (JSON ONLY):
         chunks: List[Dict],
         metadata: Dict
     ):
+        # First real section heading doubles as the document title for routing
+        if "title" not in metadata:
+            for chunk in chunks:
+                section = (chunk.get("metadata") or {}).get("section_title")
+                if section and section != "General":
+                    metadata["title"] = section
+                    break
+
         try:
             output = self.processed_dir / f"{file_id}.json"
             with open(output, "w", encoding="utf-8") as f:
@@ -566,6 +873,54 @@ Output format (JSON ONLY):
                 )
         except Exception as e:
             logger.error(f"Error saving processed document: {e}")
+            return
+
+        try:
+            query_expansion_service.index_document(file_id, chunks)
+        except Exception as e:
+            logger.warning(f"Query expansion stats not updated for {file_id}: {e}")
+
+        document_router.add(file_id, metadata)
+
+        try:
+            lexical_index_service.index_document(file_id, chunks)
+        except Exception as e:
+            logger.warning(f"Lexical index not updated for {file_id}: {e}")
+
+        try:
+            chunk_adjacency.index_document(file_id, chunks)
+        except Exception as e:
+            logger.warning(f"Adjacency index not updated for {file_id}: {e}")
+
+    def remove_document(self, file_id: str) -> bool:
+        """
+        Drop a document from memory, its processed JSON and its upload.
+        Returns True if anything was found for the file_id.
+        """
+        found = False
+        query_expansion_service.remove_document(file_id)
+        lexical_index_service.remove_document(file_id)
+        chunk_adjacency.remove_document(file_id)
+        document_router.remove(file_id)
+        meta = self.document_metadata.pop(file_id, None)
+        if self.document_chunks.pop(file_id, None) is not None or meta is not None:
+            found = True
+
+        processed_file = self.processed_dir / f"{file_id}.json"
+        if processed_file.exists():
+            processed_file.unlink()
+            found = True
+
+        # file_id is the stored upload name; metadata may hold a resolved path
+        candidates = [self.uploads_dir / file_id]
+        if meta and meta.get("file_path"):
+            candidates.append(Path(meta["file_path"]))
+        for upload_path in candidates:
+            if upload_path.exists() and upload_path.is_file():
+                upload_path.unlink()
+                found = True
+
+        return found
 
     def _load_existing_documents(self):
         try:
@@ -668,40 +1023,109 @@ Output format (JSON ONLY):
 
         return None
 
-    def _retrieve_and_rank(self, queries: List[str], original_query: str, file_id, folder_id, top_k=5) -> Tuple[List[Dict], Dict]:
+    def _answer_token_budget(self, deadline: Deadline) -> int:
+        """num_predict that fits the remaining budget at the expected generation speed."""
+        affordable = deadline.remaining_ms() / 1000 * self.GEN_TOKENS_PER_SEC
+        if affordable >= self.MAX_ANSWER_TOKENS:
+            return self.MAX_ANSWER_TOKENS
+        max_tokens = max(self.MIN_ANSWER_TOKENS, int(affordable))
+        deadline.degrade("generation", f"num_predict capped at {max_tokens}")
+        return max_tokens
+
+    def _route_to_document(self, question: str, folder_id: str = None) -> Optional[Dict]:
+        t_route = time.time()
+        scope = folder_service.get_files_in_folder(folder_id) if folder_id else None
+        routing = document_router.route(question, file_ids=scope)
+        if routing:
+            logger.info(
+                f"[TIMER] Routed to {routing['file_id']} ({routing['match']} '{routing['label']}', "
+                f"score {routing['score']}): {(time.time() - t_route)*1000:.2f}ms"
+            )
+        return routing
+
+    def _retrieve_and_rank(
+        self,
+        queries: List[str],
+        original_query: str,
+        file_id,
+        folder_id,
+        top_k=5,
+        feedback=False,
+        deadline: Optional[Deadline] = None,
+        profile: Optional[Dict] = None,
+        rerank: bool = True,
+        file_type: Optional[str] = None,
+        preferred_file_id: Optional[str] = None
+    ) -> Tuple[List[Dict], Dict]:
         # 1. Retrieval (Hybrid delegated to QdrantService)
         # qdrant_service.search now performs Dense + Sparse + Fusion
         
         all_candidates_map = {} 
-        search_k = 250
-        
-        for q in queries:
-             results = qdrant_service.search(
-                q, 
-                k=search_k, 
+        profile = profile or profile_service.get()
+        search_k = profile["search_k"]
+
+        # Lexical fast path: codes, IDs, emails and measurements resolve straight to chunks
+        # (the lexical index has no file_type, so type-scoped searches go through Qdrant only)
+        lexical_hits, dense_skipped = 0, False
+        if not file_type:
+            lexical_hits, covered = self._lexical_candidates(original_query, file_id, folder_id, all_candidates_map)
+            if covered:
+                # The hits hold every strong identifier and every other content word of the
+                # question: a handful of them needs no dense search, more get a narrower one
+                dense_skipped = len(all_candidates_map) <= self.LEXICAL_ONLY_MAX_HITS
+                search_k = min(search_k, self.LEXICAL_SEARCH_K)
+
+        if not dense_skipped:
+            # All variants go out as one batch and come back fused, so every chunk is hydrated once
+            t_dense = time.time()
+            results = qdrant_service.search_batch(
+                queries,
+                k=search_k,
                 folder_id=folder_id,
-                file_id=file_id
+                file_id=file_id,
+                file_type=file_type,
+                profile=profile
             )
-            
-             for res in results:
-                cid = res["chunk_id"]
-                if cid not in all_candidates_map:
-                    # Hydrate
-                    payload = res.get("payload", {})
-                    fid = payload.get("doc_id") or payload.get("file_id")
-                    
-                    if fid:
-                        c_idx = payload.get("chunk_index")
-                        chunk_data = self._hydrate_chunk(fid, cid, chunk_index=c_idx)
-                        if chunk_data:
-                            # Merge Qdrant Score
-                            chunk_data["qdrant_score"] = res["score"]
-                            # Add to candidates
-                            all_candidates_map[cid] = {
-                                "chunk": chunk_data,
-                                "score": res["score"],
-                                "id": cid
-                            }
+
+            self._hydrate_results(results, all_candidates_map)
+            logger.info(f"[TIMER] Dense/hybrid search (k={search_k}): {(time.time() - t_dense)*1000:.2f}ms")
+
+            if preferred_file_id and preferred_file_id != file_id:
+                # Soft routing: the named document's best chunks join the candidates
+                self._hydrate_results(
+                    qdrant_service.search_batch(
+                        [original_query], k=self.ROUTED_BOOST_K, file_id=preferred_file_id,
+                        file_type=file_type, profile=profile
+                    ),
+                    all_candidates_map
+                )
+
+        deadline = deadline or Deadline()
+        cost = self.STAGE_COST_MS
+        if feedback and not deadline.has(cost["feedback"] + cost["rerank"] + cost["generation"]):
+            deadline.degrade("retrieval", "pseudo-relevance feedback skipped")
+            feedback = False
+
+        # Pseudo-relevance feedback: one more search with terms from the best first-pass hits
+        feedback_terms = []
+        if feedback and all_candidates_map and not dense_skipped:
+            t_prf = time.time()
+            top_hits = sorted(all_candidates_map.values(), key=lambda c: c["score"], reverse=True)[:5]
+            feedback_terms = query_expansion_service.feedback_terms(
+                original_query, [c["chunk"].get("text", "") for c in top_hits]
+            )
+            if feedback_terms:
+                # First-pass hits are already candidates: a small k adds the new ones at a fraction of the cost
+                prf_results = qdrant_service.search_batch(
+                    [f"{original_query} {' '.join(feedback_terms)}"],
+                    k=min(search_k, self.FEEDBACK_SEARCH_K),
+                    folder_id=folder_id,
+                    file_id=file_id,
+                    file_type=file_type,
+                    profile=profile
+                )
+                self._hydrate_results(prf_results, all_candidates_map)
+            logger.info(f"[TIMER] Pseudo-relevance feedback {feedback_terms}: {(time.time() - t_prf)*1000:.2f}ms")
         
         all_candidates = list(all_candidates_map.values())
         
@@ -712,17 +1136,130 @@ Output format (JSON ONLY):
         # But let's stick to the prompt hint: "k=20-40" implies retrieval size. "Rerank top 20" implies reranker input.
         # I'll pass all (up to 40) to reranker, and return top_k (default 5 or 8).
         
+        deadline.check("rerank")
         rerank_input = all_candidates # No slicing needed if k=40, it's small enough.
-        reranked = reranker_service.rerank(original_query, rerank_input, top_k=top_k)
+        unreranked = []
+        if not rerank:
+            reranked = sorted(all_candidates, key=lambda c: c["score"], reverse=True)[:top_k]
+        elif deadline.has(cost["rerank"] + cost["generation"]):
+            if profile.get("rerank_top_n"):
+                # Profile caps the cross-encoder input to the best fused candidates; the rest
+                # stay available (fused order) for callers that page past the reranked head
+                fused = sorted(all_candidates, key=lambda c: c["score"], reverse=True)
+                rerank_input, unreranked = fused[:profile["rerank_top_n"]], fused[profile["rerank_top_n"]:]
+            reranked = reranker_service.rerank(
+                original_query, rerank_input, top_k=top_k, threshold=profile["rerank_threshold"]
+            )
+            unreranked = unreranked[:max(0, top_k - len(reranked))]
+        else:
+            # Out of budget: keep the fused retrieval order
+            deadline.degrade("rerank", "cross-encoder rerank skipped")
+            reranked = sorted(all_candidates, key=lambda c: c["score"], reverse=True)[:top_k]
         
         relevant_chunks = [r["chunk"] for r in reranked]
         
         stats = {
+            "queries": len(queries),
+            "feedback_terms": feedback_terms,
+            "lexical_hits": lexical_hits,
+            "dense_skipped": dense_skipped,
             "initial_recall": len(all_candidates),
-            "final_count": len(relevant_chunks)
+            "final_count": len(relevant_chunks),
+            # Candidates past the profile's rerank_top_n, best fused first
+            "unreranked": [r["chunk"] for r in unreranked],
+            # Per-request scores (chunk dicts are shared through the document cache)
+            "scores": {
+                str(r["id"]): {"score": r["score"], "rerank_score": r.get("rerank_score")}
+                for r in reranked + unreranked
+            }
         }
         return relevant_chunks, stats
 
+    # Lexical fast path tunables
+    LEXICAL_ONLY_MAX_HITS = 20  # skip dense search when all identifiers resolve to at most this many chunks
+    LEXICAL_SEARCH_K = 50       # otherwise dense search still runs, narrower
+    ROUTED_BOOST_K = 20         # chunks added from a softly routed document
+    FEEDBACK_SEARCH_K = 30      # feedback round only needs to surface what the first pass missed
+
+    def _lexical_candidates(self, query: str, file_id, folder_id, candidates: Dict[str, Dict]) -> Tuple[int, bool]:
+        """
+        Add chunks containing the query's identifiers to `candidates`.
+        Returns (hits, covered): covered means the query has strong identifiers (codes,
+        emails, long numbers) and a single matched chunk holds all of them together with
+        the query's other content words. Only then may dense search be cut down.
+        """
+        tokens = extract_identifiers(query)
+        if not tokens:
+            return 0, False
+
+        t_lex = time.time()
+        doc_ids = None
+        if file_id:
+            doc_ids = [file_id]
+        elif folder_id:
+            doc_ids = folder_service.get_files_in_folder(folder_id)
+
+        hits = lexical_index_service.lookup(tokens, doc_ids=doc_ids)
+        matched_by_chunk = {}
+        for hit in hits:
+            cid = hit["chunk_id"]
+            if cid in candidates:
+                matched_by_chunk[cid] = set(hit["matched"])
+                continue
+            chunk_data = self._hydrate_chunk(hit["doc_id"], cid, chunk_index=hit["chunk_index"])
+            if chunk_data:
+                matched_by_chunk[cid] = set(hit["matched"])
+                candidates[cid] = {
+                    "chunk": chunk_data,
+                    # Ranked by how many query identifiers the chunk holds; the reranker decides
+                    "score": len(hit["matched"]) / len(tokens),
+                    "id": cid
+                }
+
+        logger.info(f"[TIMER] Lexical lookup {tokens}: {len(candidates)} hits in {(time.time() - t_lex)*1000:.2f}ms")
+
+        strong = [t for t in tokens if is_strong_identifier(t)]
+        if not strong:
+            return len(candidates), False
+
+        # "why did revenue drop for QD109" needs a chunk about QD109 *and* revenue, not a
+        # QD109 chunk plus some other chunk that happens to mention revenue
+        identifier_forms = set(tokens) | {re.sub(r"[\-_/.]", "", t) for t in tokens}
+        content_terms = [t for t in query_expansion_service.tokenize(query) if t not in identifier_forms]
+        covered = False
+        for cid, matched in matched_by_chunk.items():
+            # Compact forms ("inv2023001") are extracted alongside the separated ones; either counts
+            if not all(t in matched or re.sub(r"[\-_/.]", "", t) in matched for t in strong):
+                continue
+            text = candidates[cid]["chunk"].get("text", "").lower()
+            if all(term in text for term in content_terms):
+                covered = True
+                break
+        return len(candidates), covered
+
+    def _hydrate_results(self, results: List[Dict], candidates: Dict[str, Dict]):
+        """Attach chunk text to search hits, skipping chunks already in `candidates`."""
+        for res in results:
+            cid = res["chunk_id"]
+            if cid in candidates:
+                continue
+            # Hydrate
+            payload = res.get("payload", {})
+            fid = payload.get("doc_id") or payload.get("file_id")
+
+            if fid:
+                c_idx = payload.get("chunk_index")
+                chunk_data = self._hydrate_chunk(fid, cid, chunk_index=c_idx)
+                if chunk_data:
+                    # Merge Qdrant Score
+                    chunk_data["qdrant_score"] = res["score"]
+                    # Add to candidates
+                    candidates[cid] = {
+                        "chunk": chunk_data,
+                        "score": res["score"],
+                        "id": cid
+                    }
+
     def _check_sufficiency(self, query: str, context: str) -> Tuple[bool, str]:
         """
         Always return sufficient to force an answer attempt.
@@ -834,7 +1371,7 @@ Rules:
 - Do not use markdown. Return ONLY the raw SQL query.
 - Use "LIMIT 20" unless user asks for all.
 """
-            generated_sql = ollama_llm.generate_response(sql_prompt).strip()
+            generated_sql = ollama_llm.generate_response(sql_prompt, lane="tabular").strip()
             generated_sql = generated_sql.replace("```sql", "").replace("```", "").strip()
             
             logger.info(f"Executing SQL: {generated_sql}")
@@ -859,7 +1396,7 @@ Question: {query}
 
 Answer in a natural, professional tone. If the answer is a single number, state it clearly."""
             
-            final_answer = ollama_llm.generate_response(synth_prompt)
+            final_answer = ollama_llm.generate_response(synth_prompt, lane="tabular")
             
             return {
                 "success": True,
@@ -1,11 +1,26 @@
+import os
+import time
 import logging
 import uuid
 import threading
-from typing import List, Dict, Optional
+import itertools
+import queue
+import sqlite3
+import hashlib
+import json
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterable, Set
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from qdrant_client.http.exceptions import ResponseHandlingException
 from fastembed import SparseTextEmbedding
 from .instructor_service import instructor_service
+from .chunk_catalog import chunk_catalog
+from .ann_index import LocalAnnIndex
+from .mmap_vector_service import MmapDenseIndex
+from .profile_service import profile_service
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +33,17 @@ class QdrantConfig:
     DB_PATH = "./qdrant_data"
     COLLECTION_NAME = "prism_vectors"
 
+    # Server mode: setting QDRANT_URL switches from the embedded store to a
+    # Qdrant server reached over gRPC through a pool of channels
+    URL = os.getenv("QDRANT_URL")
+    API_KEY = os.getenv("QDRANT_API_KEY")
+    PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+    GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))  # seconds
+    POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "4"))
+    MAX_RETRIES = int(os.getenv("QDRANT_MAX_RETRIES", "3"))
+    RETRY_BACKOFF = 0.5  # seconds, doubled per attempt
+
     VECTOR_SIZE = 768  # all-mpnet-base-v2 / instructor-xl
 
     # HNSW (recall-optimized)
@@ -28,15 +54,121 @@ class QdrantConfig:
     # Search
     SEARCH_EF = 512   # MUST be >= 2x k
 
+    # Query planner: scoped searches pick a strategy from the scope size (chunk catalog)
+    EXHAUSTIVE_SCOPE_MAX = int(os.getenv("QDRANT_EXHAUSTIVE_SCOPE_MAX", "2000"))  # score every point exactly
+    BROAD_FILTER_SELECTIVITY = 0.5  # filters keeping at least this share behave like unfiltered search
+    MIN_SEARCH_EF = 128
+    SCROLL_BATCH_SIZE = 512
+
+    # Two-level retrieval: unscoped questions first pick the top-M documents from a
+    # document-level collection (mean dense + averaged sparse of each file's chunks),
+    # then search only their chunks. Higher M = more recall, slower; 0 disables.
+    DOC_COLLECTION_NAME = "prism_documents"
+    TWO_LEVEL_TOP_M = int(os.getenv("QDRANT_TWO_LEVEL_TOP_M", "50"))
+    TWO_LEVEL_MIN_DOCS = int(os.getenv("QDRANT_TWO_LEVEL_MIN_DOCS", "200"))  # smaller corpora search globally
+
     # Optimizer
     INDEXING_THRESHOLD = 100000
 
+    # Payload indexes (keyword) for every field used in search filters
+    PAYLOAD_INDEX_FIELDS = ("folder_id", "doc_id", "file_type")
+
+    # Vacuum thresholds (applied at creation; compaction lowers them while it runs)
+    VACUUM_DELETED_THRESHOLD = 0.05
+    VACUUM_MIN_VECTOR_NUMBER = 100
+    COMPACTION_WAIT_SECONDS = 30
+    COMPACTION_MIN_VECTOR_NUMBER = 100  # lowest vacuum_min_vector_number Qdrant accepts
+
     # Ingestion
     BATCH_SIZE = 64
+    ENCODE_WORKERS = int(os.getenv("QDRANT_ENCODE_WORKERS", "1"))  # threads per encoder (dense/sparse)
+    PIPELINE_QUEUE_SIZE = 4  # encoded batches allowed in flight ahead of the writer
+
+    # Deletion
+    DELETE_BATCH_SIZE = 256
 
     # Sparse model
     SPARSE_MODEL_NAME = "Qdrant/bm25"
 
+    # Schema migration: texts for re-encoding missing vectors come from the processed chunks
+    PROCESSED_DIR = "data/processed"
+    MIGRATION_BATCH_SIZE = 256
+
+    # Embedded mode: in-process index for the dense vectors.
+    # "hnsw" = approximate (needs hnswlib), "mmap" = exact scan of a memory-mapped float16 matrix
+    LOCAL_ANN_ENABLED = os.getenv("QDRANT_LOCAL_ANN", "true").lower() == "true"
+    LOCAL_INDEX = os.getenv("QDRANT_LOCAL_INDEX", "hnsw").lower()
+    LOCAL_ANN_DIR = os.path.join(DB_PATH, "ann")
+    LOCAL_MMAP_DIR = os.path.join(DB_PATH, "mmap")
+    RRF_K = 60
+
+
+# =========================
+# Server Client Pool
+# =========================
+
+def _is_transient_error(e: Exception) -> bool:
+    if isinstance(e, (ResponseHandlingException, ConnectionError, TimeoutError)):
+        return True
+    try:
+        import grpc
+        if isinstance(e, grpc.RpcError):
+            return e.code() in {
+                grpc.StatusCode.UNAVAILABLE,
+                grpc.StatusCode.DEADLINE_EXCEEDED,
+                grpc.StatusCode.RESOURCE_EXHAUSTED,
+            }
+    except ImportError:
+        pass
+    return False
+
+
+class PooledQdrantClient:
+    """
+    Drop-in stand-in for QdrantClient in server mode.
+    Spreads calls round-robin over several clients (one gRPC channel each)
+    and retries transient failures with exponential backoff.
+    """
+
+    def __init__(self, clients: List[QdrantClient], max_retries: int, backoff: float):
+        self._clients = clients
+        self._cycle = itertools.cycle(clients)
+        self._cycle_lock = threading.Lock()
+        self._max_retries = max_retries
+        self._backoff = backoff
+
+    def _next_client(self) -> QdrantClient:
+        with self._cycle_lock:
+            return next(self._cycle)
+
+    def __getattr__(self, name):
+        attr = getattr(self._clients[0], name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            attempt = 0
+            while True:
+                client = self._next_client()
+                try:
+                    return getattr(client, name)(*args, **kwargs)
+                except Exception as e:
+                    if attempt >= self._max_retries or not _is_transient_error(e):
+                        raise
+                    delay = self._backoff * (2 ** attempt)
+                    logger.warning(f"Qdrant {name} failed ({e}). Retrying in {delay:.1f}s...")
+                    time.sleep(delay)
+                    attempt += 1
+
+        return call
+
+    def close(self):
+        for client in self._clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
 
 # =========================
 # Vector Service
@@ -49,6 +181,12 @@ class QdrantVectorService:
         self._lock = threading.RLock()
         self._initialized = False
         self.sparse_model: Optional[SparseTextEmbedding] = None
+        self._dense_executor: Optional[ThreadPoolExecutor] = None
+        self._sparse_executor: Optional[ThreadPoolExecutor] = None
+        self.ann_index: Optional[LocalAnnIndex] = None  # or MmapDenseIndex (same interface)
+        self._document_index_ready = False
+        # Collections whose catalog rows are known to match their points (see _sync_chunk_catalog)
+        self._catalog_complete: Set[str] = set()
 
     # -------------------------
     # Initialization
@@ -62,159 +200,1117 @@ class QdrantVectorService:
             if self._initialized:
                 return
 
-            logger.info(f"Initializing Qdrant at {self.config.DB_PATH}")
-            self.client = QdrantClient(path=self.config.DB_PATH)
+            self.client = self._create_client()
+            rebuild_ann = False
+
+            name = self.config.COLLECTION_NAME
+            physical = self._resolve_physical_collection(name)
 
-            collections = self.client.get_collections().collections
-            exists = any(c.name == self.config.COLLECTION_NAME for c in collections)
-            if exists:
+            if physical is None:
+                logger.info(f"Creating collection '{name}'")
+                # A fresh collection holds no points: forget any stale hash index rows
+                chunk_catalog.clear(name)
+                self._create_collection(name)
+            else:
+                drift = None
                 try:
-                    # Validate schema supports sparse vectors by checking collection info
-                    coll_info = self.client.get_collection(self.config.COLLECTION_NAME)
-                    has_sparse = False
-                    # Check if sparse_vectors config exists and contains "text-sparse"
-                    if hasattr(coll_info.config.params, 'sparse_vectors') and coll_info.config.params.sparse_vectors:
-                         if "text-sparse" in coll_info.config.params.sparse_vectors:
-                             has_sparse = True
-                    
-                    if not has_sparse:
-                        logger.warning(f"Collection '{self.config.COLLECTION_NAME}' missing sparse vectors. Recreating...")
-                        self.client.delete_collection(self.config.COLLECTION_NAME)
-                        exists = False
+                    coll_info = self.client.get_collection(physical)
+                    drift = self._schema_drift(coll_info.config.params)
                 except Exception as e:
-                    logger.warning(f"Failed to validate collection schema: {e}. Assuming recreation needed.")
-                    self.client.delete_collection(self.config.COLLECTION_NAME)
-                    exists = False
+                    # Never drop data on a failed check: keep serving the existing collection
+                    logger.error(f"Failed to validate collection schema: {e}. Leaving collection untouched.")
 
-            if not exists:
-                logger.info(f"Creating collection '{self.config.COLLECTION_NAME}'")
+                if drift:
+                    logger.warning(f"Collection '{name}' schema drift: {', '.join(drift)}. Migrating...")
+                    try:
+                        report = self._migrate_collection(drift)
+                        rebuild_ann = report["dense_encoded"] > 0
+                    except Exception as e:
+                        logger.error(f"Schema migration failed: {e}. Serving the existing collection as-is.")
+                else:
+                    logger.info(f"Connected to existing collection '{name}' ({physical})")
 
-                self.client.create_collection(
-                    collection_name=self.config.COLLECTION_NAME,
-                    vectors_config={
-                        "text-dense": models.VectorParams(
-                            size=self.config.VECTOR_SIZE,
-                            distance=models.Distance.COSINE
-                        )
-                    },
-                    sparse_vectors_config={
-                        "text-sparse": models.SparseVectorParams(
-                            index=models.SparseIndexParams(on_disk=True)
-                        )
-                    },
-                    hnsw_config=models.HnswConfigDiff(
-                        m=self.config.HNSW_M,
-                        ef_construct=self.config.HNSW_EF_CONSTRUCT,
-                        full_scan_threshold=self.config.HNSW_FULL_SCAN_THRESHOLD
-                    ),
-                    optimizers_config=models.OptimizersConfigDiff(
-                        indexing_threshold=self.config.INDEXING_THRESHOLD,
-                        default_segment_number=2
-                    ),
-                    quantization_config=None
-                )
-            else:
-                logger.info(f"Connected to existing collection '{self.config.COLLECTION_NAME}'")
+            # Runs for new and existing collections so older stores gain the indexes too
+            self._ensure_payload_indexes()
+            self._sync_chunk_catalog()
+
+            if not self.is_server_mode:
+                self._init_local_ann(force_rebuild=rebuild_ann)
+
+            self._init_document_index(force_rebuild=rebuild_ann)
 
             self._initialized = True
 
+    @property
+    def is_server_mode(self) -> bool:
+        return bool(self.config.URL)
+
+    def _create_client(self):
+        if not self.is_server_mode:
+            logger.info(f"Initializing embedded Qdrant at {self.config.DB_PATH}")
+            return QdrantClient(path=self.config.DB_PATH)
+
+        pool_size = max(1, self.config.POOL_SIZE)
+        logger.info(
+            f"Connecting to Qdrant server at {self.config.URL} "
+            f"(gRPC={self.config.PREFER_GRPC}, pool={pool_size}, timeout={self.config.TIMEOUT}s)"
+        )
+        clients = [
+            QdrantClient(
+                url=self.config.URL,
+                api_key=self.config.API_KEY,
+                prefer_grpc=self.config.PREFER_GRPC,
+                grpc_port=self.config.GRPC_PORT,
+                timeout=self.config.TIMEOUT,
+                grpc_options={
+                    "grpc.keepalive_time_ms": 30000,
+                    "grpc.keepalive_permit_without_calls": 1,
+                },
+            )
+            for _ in range(pool_size)
+        ]
+        return PooledQdrantClient(clients, self.config.MAX_RETRIES, self.config.RETRY_BACKOFF)
+
     # -------------------------
-    # Ingestion
+    # Schema & migration
     # -------------------------
 
-    def add_documents(self, chunks: List[Dict]):
+    @property
+    def physical_collection(self) -> str:
+        """
+        The collection currently behind the collection name. Resolved on every call, never
+        cached: reindex_all.py (another process, in server mode) may move the alias under us.
+        """
+        return self._resolve_physical_collection(self.config.COLLECTION_NAME) or self.config.COLLECTION_NAME
+
+    def _resolve_physical_collection(self, name: str) -> Optional[str]:
+        """
+        The collection actually behind `name`: the collection its alias points to, itself, or
+        the target of its pending alias (see _switch_alias). None if there is nothing.
+        """
+        aliases = {a.alias_name: a.collection_name for a in self.client.get_aliases().aliases}
+        if name in aliases:
+            return aliases[name]
+        if any(c.name == name for c in self.client.get_collections().collections):
+            return name
+        return aliases.get(f"{name}{self.PENDING_ALIAS_SUFFIX}")
+
+    def _create_collection(self, collection_name: str):
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config={
+                "text-dense": models.VectorParams(
+                    size=self.config.VECTOR_SIZE,
+                    distance=models.Distance.COSINE
+                )
+            },
+            sparse_vectors_config={
+                "text-sparse": models.SparseVectorParams(
+                    index=models.SparseIndexParams(on_disk=True)
+                )
+            },
+            hnsw_config=models.HnswConfigDiff(
+                m=self.config.HNSW_M,
+                ef_construct=self.config.HNSW_EF_CONSTRUCT,
+                full_scan_threshold=self.config.HNSW_FULL_SCAN_THRESHOLD
+            ),
+            optimizers_config=models.OptimizersConfigDiff(
+                indexing_threshold=self.config.INDEXING_THRESHOLD,
+                default_segment_number=2,
+                deleted_threshold=self.config.VACUUM_DELETED_THRESHOLD,
+                vacuum_min_vector_number=self.config.VACUUM_MIN_VECTOR_NUMBER
+            ),
+            quantization_config=None
+        )
+
+    def _schema_drift(self, params) -> List[str]:
+        """Differences between a collection's vector config and the target schema."""
+        drift = []
+        vectors = params.vectors if isinstance(params.vectors, dict) else {}
+        dense = vectors.get("text-dense")
+        if dense is None:
+            drift.append("missing text-dense")
+        elif dense.size != self.config.VECTOR_SIZE:
+            drift.append(f"text-dense size {dense.size} != {self.config.VECTOR_SIZE}")
+        elif dense.distance != models.Distance.COSINE:
+            drift.append(f"text-dense distance {dense.distance}")
+
+        if "text-sparse" not in (params.sparse_vectors or {}):
+            drift.append("missing text-sparse")
+        return drift
+
+    def _load_chunk_texts(self, doc_id: str) -> Dict[str, str]:
+        """chunk_id -> text from the processed JSON of a document (also keyed by chunk index)."""
+        path = Path(self.config.PROCESSED_DIR) / f"{doc_id}.json"
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                chunks = json.load(f).get("chunks", [])
+        except Exception as e:
+            logger.warning(f"Could not read processed chunks for {doc_id}: {e}")
+            return {}
+        texts = {}
+        for i, c in enumerate(chunks):
+            texts[f"#{i}"] = c.get("text", "")
+            if c.get("chunk_id") is not None:
+                texts[str(c["chunk_id"])] = c.get("text", "")
+        return texts
+
+    def _migrate_collection(self, drift: List[str]) -> Dict:
+        """
+        Copy the current collection into a new one with the target schema, then switch
+        the collection name over to it through an alias.
+        Compatible dense vectors are copied as-is; only vectors that are missing or
+        incompatible are re-encoded from the processed chunk texts.
+        """
+        name = self.config.COLLECTION_NAME
+        source = self.physical_collection
+        target = f"{name}_v{int(time.time())}"
+        self._create_collection(target)
+
+        report = {"source": source, "target": target, "drift": drift, "copied": 0,
+                  "dense_copied": 0, "dense_encoded": 0, "sparse_copied": 0, "sparse_encoded": 0,
+                  "without_sparse": 0, "dropped": 0}
+        start = time.time()
+        text_cache: Dict[str, Dict[str, str]] = {}
+
+        try:
+            offset = None
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name=source,
+                    limit=self.config.MIGRATION_BATCH_SIZE,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                if not records:
+                    break
+
+                rows = []
+                for r in records:
+                    payload = r.payload or {}
+                    vector = r.vector if isinstance(r.vector, dict) else {"text-dense": r.vector}
+                    dense = vector.get("text-dense")
+                    if dense is not None and len(dense) != self.config.VECTOR_SIZE:
+                        dense = None
+                    sparse = vector.get("text-sparse")
+
+                    text = None
+                    if dense is None or sparse is None:
+                        doc_id = str(payload.get("doc_id"))
+                        if doc_id not in text_cache:
+                            if len(text_cache) > 64:
+                                text_cache.clear()
+                            text_cache[doc_id] = self._load_chunk_texts(doc_id)
+                        texts = text_cache[doc_id]
+                        text = texts.get(str(payload.get("chunk_id"))) or texts.get(f"#{payload.get('chunk_index')}")
+
+                    if dense is None and not text:
+                        report["dropped"] += 1
+                        continue
+                    rows.append({"id": r.id, "payload": payload, "dense": dense, "sparse": sparse, "text": text})
+
+                need_dense = [row for row in rows if row["dense"] is None]
+                if need_dense:
+                    encoded = instructor_service.encode_documents([row["text"] for row in need_dense])
+                    for row, vec in zip(need_dense, encoded):
+                        row["dense"] = vec.tolist()
+                    report["dense_encoded"] += len(need_dense)
+
+                need_sparse = [row for row in rows if row["sparse"] is None and row["text"]]
+                if need_sparse:
+                    self._ensure_sparse_model()
+                    for row, vec in zip(need_sparse, self.sparse_model.embed([row["text"] for row in need_sparse])):
+                        row["sparse"] = models.SparseVector(indices=vec.indices.tolist(), values=vec.values.tolist())
+                    report["sparse_encoded"] += len(need_sparse)
+
+                points = []
+                for row in rows:
+                    vectors = {"text-dense": row["dense"]}
+                    if row["sparse"] is not None:
+                        vectors["text-sparse"] = row["sparse"]
+                    else:
+                        report["without_sparse"] += 1
+                    points.append(models.PointStruct(id=row["id"], vector=vectors, payload=row["payload"]))
+
+                if points:
+                    self.client.upsert(collection_name=target, points=points, wait=True)
+                report["copied"] += len(points)
+                report["dense_copied"] = report["copied"] - report["dense_encoded"]
+                report["sparse_copied"] = report["copied"] - report["sparse_encoded"] - report["without_sparse"]
+
+                elapsed = time.time() - start
+                logger.info(
+                    f"[QDRANT] Migration: {report['copied']} points copied "
+                    f"({report['copied'] / elapsed if elapsed > 0 else 0:.0f} points/s)"
+                )
+                if offset is None:
+                    break
+        except Exception:
+            self.client.delete_collection(target)
+            raise
+
+        # Recount the source now: every point it holds must be in the target (or knowingly dropped)
+        target_count = self.client.count(collection_name=target, exact=True).count
+        expected = self.client.count(collection_name=source, exact=True).count - report["dropped"]
+        if target_count != report["copied"] or target_count != expected:
+            self.client.delete_collection(target)
+            raise RuntimeError(
+                f"Migration aborted: target holds {target_count} points, copied {report['copied']}, "
+                f"source expects {expected}. Collection '{source}' left untouched."
+            )
+
+        self._switch_alias(name, source, target)
+
+        report["duration_s"] = round(time.time() - start, 2)
+        logger.info(f"[QDRANT] Schema migration complete: {report}")
+        return report
+
+    PENDING_ALIAS_SUFFIX = "_pending"
+
+    def _switch_alias(self, name: str, old_physical: str, new_physical: str):
+        """Point `name` at new_physical, then drop the old collection. The name never resolves to nothing."""
+        pending = f"{name}{self.PENDING_ALIAS_SUFFIX}"
+        if old_physical != name:
+            # Already alias-backed: both alias operations apply atomically
+            self.client.update_collection_aliases(change_aliases_operations=[
+                models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=name)),
+                models.CreateAliasOperation(create_alias=models.CreateAlias(
+                    collection_name=new_physical, alias_name=name
+                )),
+            ])
+            self.client.delete_collection(old_physical)
+        else:
+            # First migration: the name is a real collection. Embedded mode lets an alias shadow
+            # it, so the alias goes first and the collection is dropped once the name has moved.
+            create_alias = models.CreateAliasOperation(create_alias=models.CreateAlias(
+                collection_name=new_physical, alias_name=name
+            ))
+            try:
+                self.client.update_collection_aliases(change_aliases_operations=[create_alias])
+            except Exception as e:
+                # A Qdrant server refuses an alias that shadows a collection. A pending alias
+                # points at new_physical first: once the collection is gone the name resolves
+                # through it (in every process) until the real alias replaces it.
+                logger.info(f"Alias '{name}' cannot coexist with the collection ({e}). Switching through '{pending}'.")
+                # Left over from an earlier switch that never got its alias
+                stale = [
+                    models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=pending))
+                ] if any(a.alias_name == pending for a in self.client.get_aliases().aliases) else []
+                self.client.update_collection_aliases(change_aliases_operations=stale + [
+                    models.CreateAliasOperation(create_alias=models.CreateAlias(
+                        collection_name=new_physical, alias_name=pending
+                    ))
+                ])
+                self.client.delete_collection(old_physical)
+                for attempt in range(self.config.MAX_RETRIES + 1):
+                    try:
+                        self.client.update_collection_aliases(change_aliases_operations=[
+                            create_alias,
+                            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=pending)),
+                        ])
+                        break
+                    except Exception as alias_error:
+                        if attempt == self.config.MAX_RETRIES:
+                            logger.error(
+                                f"Alias '{name}' could not be created ({alias_error}). The name still resolves "
+                                f"to '{new_physical}' through '{pending}'; create the alias manually."
+                            )
+                            break
+                        time.sleep(self.config.RETRY_BACKOFF * (2 ** attempt))
+            else:
+                self.client.delete_collection(old_physical)
+        logger.info(f"Collection name '{name}' now points to '{new_physical}'")
+
+    # -------------------------
+    # Blue/green reindexing
+    # -------------------------
+
+    def create_shadow_collection(self) -> str:
+        """Empty collection with the target schema, filled while the live one keeps serving."""
         self._ensure_initialized()
-        if not chunks:
+        shadow = f"{self.config.COLLECTION_NAME}_v{int(time.time())}"
+        self._create_collection(shadow)
+        self._ensure_payload_indexes(shadow)
+        chunk_catalog.clear(shadow)
+        # Empty on both sides, and every write goes through add_documents
+        self._catalog_complete.add(shadow)
+        logger.info(f"Created shadow collection '{shadow}'")
+        return shadow
+
+    def collection_exists(self, collection_name: str) -> bool:
+        self._ensure_initialized()
+        return any(c.name == collection_name for c in self.client.get_collections().collections)
+
+    def count_points(self, collection_name: str) -> int:
+        self._ensure_initialized()
+        return self.client.count(collection_name=collection_name, exact=True).count
+
+    def drop_shadow_collection(self, shadow: str):
+        self._ensure_initialized()
+        if shadow == self.physical_collection:
+            raise ValueError(f"'{shadow}' is the live collection")
+        self.client.delete_collection(shadow)
+        chunk_catalog.clear(shadow)
+        logger.info(f"Dropped shadow collection '{shadow}'")
+
+    def cutover(self, shadow: str) -> str:
+        """
+        Point the collection name at `shadow` and drop the previous collection. Returns its name.
+        The document index is rebuilt before returning, so a short-lived caller (reindex_all.py)
+        does not exit halfway through it.
+        """
+        self._ensure_initialized()
+        with self._lock:
+            old = self.physical_collection
+            self._switch_alias(self.config.COLLECTION_NAME, old, shadow)
+            chunk_catalog.rename_collection(shadow, self.config.COLLECTION_NAME)
+            if shadow in self._catalog_complete:
+                self._catalog_complete.add(self.config.COLLECTION_NAME)
+            else:
+                self._catalog_complete.discard(self.config.COLLECTION_NAME)
+            self._catalog_complete.discard(shadow)
+            if self.ann_index is not None:
+                self._rebuild_local_ann()
+        self.rebuild_document_index()
+        logger.info(f"Cut over from '{old}' to '{shadow}'")
+        return old
+
+    # -------------------------
+    # Document-level index (two-level retrieval)
+    # -------------------------
+
+    def _init_document_index(self, force_rebuild: bool = False):
+        if self.config.TWO_LEVEL_TOP_M <= 0:
             return
+        name = self.config.DOC_COLLECTION_NAME
+        if not self.client.collection_exists(name):
+            self._create_document_collection()
 
-        logger.info(f"Ingesting {len(chunks)} chunks into Qdrant")
-
-        for i in range(0, len(chunks), self.config.BATCH_SIZE):
-            batch = chunks[i:i + self.config.BATCH_SIZE]
-
-            # Deduplication: Hash chunks to avoid re-embedding identical content
-            import hashlib
-            
-            unique_batch = []
-            seen_hashes = set()
-            
-            for chunk in batch:
-                chunk_text = chunk.get("text", "").strip()
-                text_hash = hashlib.sha256(chunk_text.encode('utf-8')).hexdigest()
-                
-                if text_hash not in seen_hashes:
-                    seen_hashes.add(text_hash)
-                    unique_batch.append(chunk)
-            
-            if not unique_batch:
-                continue
+        indexed = self.client.count(collection_name=name, exact=True).count
+        expected = chunk_catalog.count_documents(self.config.COLLECTION_NAME)
+        if force_rebuild:
+            logger.warning("Dense vectors were re-encoded. Rebuilding document index...")
+            self.rebuild_document_index(background=True)
+        elif indexed != expected:
+            logger.warning(f"Document index holds {indexed} documents, catalog holds {expected}. Rebuilding...")
+            self.rebuild_document_index(background=True)
+        else:
+            self._document_index_ready = True
 
-            texts = [c.get("text", "") for c in unique_batch]
-            dense_vectors = instructor_service.encode_documents(texts)
+    def _create_document_collection(self):
+        self.client.create_collection(
+            collection_name=self.config.DOC_COLLECTION_NAME,
+            vectors_config={
+                "text-dense": models.VectorParams(
+                    size=self.config.VECTOR_SIZE,
+                    distance=models.Distance.COSINE
+                )
+            },
+            sparse_vectors_config={"text-sparse": models.SparseVectorParams()}
+        )
 
-            with self._lock:
-                if not self.sparse_model:
-                    logger.info(f"Loading sparse model {self.config.SPARSE_MODEL_NAME}")
-                    self.sparse_model = SparseTextEmbedding(self.config.SPARSE_MODEL_NAME)
+    def rebuild_document_index(self, background: bool = False):
+        """Recreate the document-level collection from the live chunks."""
+        if self.config.TWO_LEVEL_TOP_M <= 0:
+            return
 
-            sparse_vectors = list(self.sparse_model.embed(texts))
+        def rebuild():
+            start = time.time()
+            self._document_index_ready = False
+            try:
+                with self._lock:
+                    if self.client.collection_exists(self.config.DOC_COLLECTION_NAME):
+                        self.client.delete_collection(self.config.DOC_COLLECTION_NAME)
+                    self._create_document_collection()
+                doc_ids = chunk_catalog.doc_ids(self.config.COLLECTION_NAME)
+                for i in range(0, len(doc_ids), self.config.DELETE_BATCH_SIZE):
+                    self._update_document_vectors(doc_ids[i:i + self.config.DELETE_BATCH_SIZE])
+                self._document_index_ready = True
+                logger.info(f"Document index rebuilt: {len(doc_ids)} documents in {time.time() - start:.1f}s")
+            except Exception as e:
+                logger.error(f"Document index rebuild failed: {e}. Unscoped search stays single-level.")
 
-            points = []
-            for idx, chunk in enumerate(unique_batch):
-                cid = str(chunk.get("chunk_id") or uuid.uuid4())
-                try:
-                    point_id = str(uuid.UUID(cid))
-                except Exception:
-                    point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, cid))
-
-                payload = {
-                    "chunk_id": cid,
-                    "doc_id": chunk.get("file_id") or chunk.get("doc_id", "unknown"),
-                    "folder_id": chunk.get("folder_id", "unknown"),
-                    "source_name": chunk.get("source_file", "unknown"),
-                    "page": chunk.get("page"),
-                    "chunk_index": chunk.get("chunk_index", 0),
-                    "file_type": chunk.get("file_type", "unknown"),
+        if background:
+            threading.Thread(target=rebuild, name="qdrant-doc-index", daemon=True).start()
+        else:
+            rebuild()
+
+    def _update_document_vectors(self, doc_ids: Iterable[str]):
+        """Recompute the document-level point of each document from its chunk vectors."""
+        points, emptied = [], []
+        for doc_id in doc_ids:
+            doc_filter = models.Filter(must=[
+                models.FieldCondition(key="doc_id", match=models.MatchValue(value=doc_id))
+            ])
+            dense_sum, sparse, count, payload = None, {}, 0, {}
+            offset = None
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name=self.config.COLLECTION_NAME,
+                    scroll_filter=doc_filter,
+                    limit=self.config.SCROLL_BATCH_SIZE,
+                    offset=offset,
+                    with_payload=["folder_id", "file_type"],
+                    with_vectors=True
+                )
+                for r in records:
+                    vectors = r.vector if isinstance(r.vector, dict) else {}
+                    dense = vectors.get("text-dense")
+                    if dense is None:
+                        continue
+                    vec = np.asarray(dense, dtype=np.float32)
+                    vec /= np.linalg.norm(vec) + 1e-12
+                    dense_sum = vec if dense_sum is None else dense_sum + vec
+                    count += 1
+                    sparse_vec = vectors.get("text-sparse")
+                    if sparse_vec is not None:
+                        for idx, value in zip(sparse_vec.indices, sparse_vec.values):
+                            sparse[idx] = sparse.get(idx, 0.0) + value
+                    payload = payload or (r.payload or {})
+                if offset is None:
+                    break
+
+            if not count:
+                emptied.append(self._point_id(f"doc:{doc_id}"))
+                continue
+
+            vector = {"text-dense": (dense_sum / count).tolist()}
+            if sparse:
+                # Averaged so long documents do not win on term mass alone
+                vector["text-sparse"] = models.SparseVector(
+                    indices=list(sparse.keys()),
+                    values=[v / count for v in sparse.values()]
+                )
+            points.append(models.PointStruct(
+                id=self._point_id(f"doc:{doc_id}"),
+                vector=vector,
+                payload={
+                    "doc_id": doc_id,
+                    "folder_id": payload.get("folder_id"),
+                    "file_type": payload.get("file_type"),
+                    "chunks": count
                 }
+            ))
 
-                points.append(
-                    models.PointStruct(
-                        id=point_id,
-                        vector={
-                            "text-dense": dense_vectors[idx].tolist(),
-                            "text-sparse": models.SparseVector(
-                                indices=sparse_vectors[idx].indices.tolist(),
-                                values=sparse_vectors[idx].values.tolist()
-                            )
-                        },
-                        payload=payload
-                    )
+        with self._lock:
+            if points:
+                self.client.upsert(collection_name=self.config.DOC_COLLECTION_NAME, points=points, wait=True)
+            if emptied:
+                self.client.delete(
+                    collection_name=self.config.DOC_COLLECTION_NAME,
+                    points_selector=models.PointIdsList(points=emptied),
+                    wait=True
                 )
 
-            with self._lock:
-                self.client.upsert(
-                    collection_name=self.config.COLLECTION_NAME,
-                    points=points
+    def _select_documents(self, queries: List[str], dense_vecs, sparse_vecs=None, top_m: Optional[int] = None) -> List[str]:
+        """Top-M documents for the queries (hybrid RRF per query, fused across queries)."""
+        top_m = top_m or self.config.TWO_LEVEL_TOP_M
+        if sparse_vecs is None:
+            sparse_vecs = self._encode_sparse_queries(queries)
+        requests = []
+        for i, dense in enumerate(dense_vecs):
+            prefetch = [models.Prefetch(using="text-dense", query=list(map(float, dense)), limit=top_m)]
+            if sparse_vecs:
+                prefetch.append(models.Prefetch(using="text-sparse", query=sparse_vecs[i], limit=top_m))
+            requests.append(models.QueryRequest(
+                prefetch=prefetch,
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=top_m,
+                with_payload=["doc_id"]
+            ))
+        responses = self.client.query_batch_points(
+            collection_name=self.config.DOC_COLLECTION_NAME,
+            requests=requests
+        )
+        rankings = [[p.payload["doc_id"] for p in r.points if p.payload] for r in responses]
+        return [doc_id for doc_id, _ in self._rrf_fuse(rankings, top_m, self.config.RRF_K)]
+
+    def _two_level_scope(
+        self,
+        collection: str,
+        queries: List[str],
+        dense_vecs,
+        sparse_vecs=None,
+        profile: Optional[Dict] = None
+    ) -> Optional[List[str]]:
+        """Documents an unscoped search should be restricted to, or None to search globally."""
+        top_m = (profile or {}).get("two_level_top_m", self.config.TWO_LEVEL_TOP_M)
+        if (
+            self.config.TWO_LEVEL_TOP_M <= 0
+            or not top_m
+            or not self._document_index_ready
+            or collection != self.config.COLLECTION_NAME
+        ):
+            return None
+        if chunk_catalog.count_documents(collection) < max(self.config.TWO_LEVEL_MIN_DOCS, top_m + 1):
+            return None
+        start = time.time()
+        try:
+            doc_ids = self._select_documents(queries, dense_vecs, sparse_vecs, top_m)
+        except Exception as e:
+            logger.error(f"Document-level search failed: {e}. Searching all chunks.")
+            return None
+        logger.info(f"[QDRANT] Two-level: top {len(doc_ids)} documents in {(time.time() - start) * 1000:.1f}ms")
+        return doc_ids or None
+
+    def _init_local_ann(self, force_rebuild: bool = False):
+        if not self.config.LOCAL_ANN_ENABLED:
+            return
+        if self.config.LOCAL_INDEX == "mmap":
+            self.ann_index = MmapDenseIndex(self.config.LOCAL_MMAP_DIR)
+        elif not LocalAnnIndex.is_available():
+            logger.info("hnswlib not installed: embedded search stays exhaustive")
+            return
+        else:
+            self.ann_index = LocalAnnIndex(
+                self.config.LOCAL_ANN_DIR,
+                dim=self.config.VECTOR_SIZE,
+                m=self.config.HNSW_M,
+                ef_construct=self.config.HNSW_EF_CONSTRUCT,
+                ef_search=self.config.SEARCH_EF,
+                exact_scope_limit=self.config.EXHAUSTIVE_SCOPE_MAX
+            )
+        self.ann_index.load()
+
+        if force_rebuild:
+            logger.warning("Dense vectors were re-encoded. Rebuilding local ANN index...")
+            self._rebuild_local_ann()
+            return
+
+        # Same count is not enough: a lost add and a lost delete cancel out
+        collection = self.config.COLLECTION_NAME
+        if collection in self._catalog_complete:
+            point_ids = set(chunk_catalog.get_point_ids(collection))
+        else:
+            point_ids = set(self._scroll_point_ids(None))
+        indexed = self.ann_index.point_ids()
+        if indexed != point_ids:
+            logger.warning(
+                f"Local ANN index holds {len(indexed)} vectors, collection holds {len(point_ids)} "
+                f"({len(point_ids - indexed)} missing, {len(indexed - point_ids)} stale). Rebuilding..."
+            )
+            self._rebuild_local_ann()
+
+    def _rebuild_local_ann(self, batch_size: int = 1000):
+        """
+        Rebuild the ANN index from the stored dense vectors. Points are added in folder,
+        document and chunk order, so an index that scopes by payload gets contiguous ranges.
+        """
+        collection = self.config.COLLECTION_NAME
+        self.ann_index.clear()
+        fields = ["doc_id", "folder_id", "file_type", "chunk_index"]
+        points = []
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection,
+                limit=batch_size,
+                offset=offset,
+                with_payload=models.PayloadSelectorInclude(include=fields),
+                with_vectors=False
+            )
+            points.extend((str(r.id), r.payload or {}) for r in records)
+            if offset is None:
+                break
+        points.sort(key=lambda p: (str(p[1].get("folder_id")), str(p[1].get("doc_id")), p[1].get("chunk_index") or 0))
+
+        total = 0
+        for i in range(0, len(points), batch_size):
+            batch = points[i:i + batch_size]
+            vectors = self._fetch_vectors([pid for pid, _ in batch], collection)
+            batch = [(pid, payload) for pid, payload in batch if pid in vectors]
+            self.ann_index.add(
+                [pid for pid, _ in batch],
+                [vectors[pid]["text-dense"] for pid, _ in batch],
+                payloads=[payload for _, payload in batch]
+            )
+            total += len(batch)
+        self.ann_index.save()
+        logger.info(f"Local ANN index rebuilt with {total} vectors")
+
+    def _update_local_ann(self, collection: str, written: Dict[str, Dict], catalog_rows: List[Dict]):
+        """Mirror one add_documents call into the local ANN index."""
+        vectors = {pid: v["text-dense"] for pid, v in written.items()}
+        if self.ann_index.SCOPES_BY_PAYLOAD:
+            # Payload-only updates (a file moved to another folder) must move the row's range too
+            moved = [row["point_id"] for row in catalog_rows if row["point_id"] not in vectors]
+            for pid, v in self._fetch_vectors(moved, collection).items():
+                vectors[pid] = v["text-dense"]
+        if not vectors:
+            return
+        payloads = {row["point_id"]: row for row in catalog_rows}
+        point_ids = list(vectors)
+        self.ann_index.add(
+            point_ids, [vectors[pid] for pid in point_ids], payloads=[payloads.get(pid, {}) for pid in point_ids]
+        )
+        self.ann_index.save()
+
+    def _ann_scope(
+        self,
+        collection: str,
+        folder_id: Optional[str],
+        file_id: Optional[str],
+        file_type: Optional[str],
+        doc_ids: Optional[List[str]]
+    ) -> Dict:
+        """Scope arguments for ann_index.search: payload fields if it keeps them, else point ids from the catalog."""
+        if not (folder_id or file_id or file_type or doc_ids):
+            return {}
+        if self.ann_index.SCOPES_BY_PAYLOAD:
+            return {"scope": {"folder_id": folder_id, "doc_id": file_id, "file_type": file_type, "doc_ids": doc_ids}}
+        return {"allowed_point_ids": set(chunk_catalog.get_point_ids(
+            collection, folder_id=folder_id, doc_id=file_id, file_type=file_type, doc_ids=doc_ids
+        ))}
+
+    # -------------------------
+    # Chunk catalog sync
+    # -------------------------
+
+    def _sync_chunk_catalog(self):
+        """
+        Backfill the chunk catalog from the collection payloads when the two disagree
+        (stores ingested before the catalog existed, or a catalog lost/reset on disk).
+        Scope lookups, planning and the document index all read the catalog.
+        """
+        collection = self.config.COLLECTION_NAME
+        try:
+            points_count = self.client.count(collection_name=collection, exact=True).count
+            catalog_count = chunk_catalog.count(collection)
+            if catalog_count == points_count:
+                self._catalog_complete.add(collection)
+                return
+            logger.warning(
+                f"Chunk catalog holds {catalog_count} rows, collection holds {points_count}. Backfilling..."
+            )
+            if catalog_count > points_count:
+                # Rows for points that no longer exist: start over from the collection
+                chunk_catalog.clear(collection)
+
+            start = time.time()
+            offset = None
+            total = 0
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name=collection,
+                    limit=self.config.SCROLL_BATCH_SIZE,
+                    offset=offset,
+                    with_payload=["chunk_id", "doc_id", "folder_id", "chunk_index", "file_type", "content_hash"],
+                    with_vectors=False
                 )
+                chunk_catalog.backfill(collection, [
+                    {"point_id": str(r.id), **(r.payload or {})}
+                    for r in records
+                ])
+                total += len(records)
+                if offset is None:
+                    break
+            logger.info(f"Chunk catalog backfilled from {total} points in {time.time() - start:.1f}s")
+            if chunk_catalog.count(collection) == points_count:
+                self._catalog_complete.add(collection)
+        except Exception as e:
+            logger.error(f"Chunk catalog backfill failed: {e}")
 
-        logger.info("Ingestion completed")
+    def _ensure_payload_indexes(self, collection_name: Optional[str] = None):
+        """Create keyword payload indexes for filter fields that do not have one yet."""
+        collection_name = collection_name or self.physical_collection
+        try:
+            coll_info = self.client.get_collection(collection_name)
+            existing = coll_info.payload_schema or {}
+        except Exception as e:
+            logger.warning(f"Could not read payload schema: {e}")
+            existing = {}
+
+        for field in self.config.PAYLOAD_INDEX_FIELDS:
+            if field in existing:
+                continue
+            try:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field,
+                    field_schema=models.PayloadSchemaType.KEYWORD,
+                    wait=True
+                )
+                logger.info(f"Created keyword payload index on '{field}'")
+            except Exception as e:
+                logger.warning(f"Failed to create payload index on '{field}': {e}")
 
     # -------------------------
-    # Search
+    # Ingestion
     # -------------------------
 
-    def search(
-        self,
-        query: str,
-        k: int = 40,
-        folder_id: Optional[str] = None,
-        file_id: Optional[str] = None
-    ) -> List[Dict]:
+    @staticmethod
+    def _point_id(cid: str) -> str:
+        try:
+            return str(uuid.UUID(cid))
+        except Exception:
+            return str(uuid.uuid5(uuid.NAMESPACE_DNS, cid))
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _payload_hash(payload: Dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _ensure_sparse_model(self):
+        with self._lock:
+            if not self.sparse_model:
+                logger.info(f"Loading sparse model {self.config.SPARSE_MODEL_NAME}")
+                self.sparse_model = SparseTextEmbedding(self.config.SPARSE_MODEL_NAME)
+
+    def _plan_batch(self, batch: List[Dict], collection: str, call_hashes: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        Classify a batch against the content-hash index:
+        - unchanged: same point, same content, same payload -> nothing to do
+        - metadata: same point and content, new payload -> payload update only
+        - reuse: content already embedded under another point -> copy its vectors
+        - encode: new content -> dense + sparse encoding
+        call_hashes (content hash -> point id) covers earlier batches of the same call,
+        which the catalog may not hold yet while the pipeline is ahead of the writes.
+        """
+        entries = []
+        for chunk in batch:
+            text = chunk.get("text", "")
+            cid = str(chunk.get("chunk_id") or uuid.uuid4())
+            content_hash = self._content_hash(text)
+            payload = {
+                "chunk_id": cid,
+                "doc_id": chunk.get("file_id") or chunk.get("doc_id", "unknown"),
+                "folder_id": chunk.get("folder_id", "unknown"),
+                "source_name": chunk.get("source_file", "unknown"),
+                "page": chunk.get("page"),
+                "chunk_index": chunk.get("chunk_index", 0),
+                "file_type": chunk.get("file_type", "unknown"),
+                "content_hash": content_hash,
+            }
+            entries.append({
+                "point_id": self._point_id(cid),
+                "text": text,
+                "content_hash": content_hash,
+                "payload": payload,
+                "payload_hash": self._payload_hash(payload),
+            })
+
+        known = chunk_catalog.lookup_points(collection, [e["point_id"] for e in entries])
+
+        plan = {"entries": entries, "unchanged": [], "metadata": [], "reuse": [], "encode": []}
+        pending = []
+        for e in entries:
+            row = known.get(e["point_id"])
+            if row and row["content_hash"] == e["content_hash"]:
+                if row["payload_hash"] == e["payload_hash"]:
+                    plan["unchanged"].append(e)
+                else:
+                    plan["metadata"].append(e)
+            else:
+                pending.append(e)
+
+        reusable = chunk_catalog.lookup_hashes(collection, {e["content_hash"] for e in pending})
+        if call_hashes:
+            reusable.update({e["content_hash"]: call_hashes[e["content_hash"]]
+                             for e in pending if e["content_hash"] in call_hashes})
+        for e in pending:
+            source_point = reusable.get(e["content_hash"])
+            if source_point and source_point != e["point_id"]:
+                e["source_point"] = source_point
+                plan["reuse"].append(e)
+            else:
+                plan["encode"].append(e)
+
+        return plan
+
+    def _fetch_vectors(self, point_ids: List[str], collection: str) -> Dict[str, Dict]:
+        if not point_ids:
+            return {}
+        records = self.client.retrieve(
+            collection_name=collection,
+            ids=point_ids,
+            with_payload=False,
+            with_vectors=True
+        )
+        return {str(r.id): r.vector for r in records}
+
+    def _get_encode_executors(self):
+        with self._lock:
+            if self._dense_executor is None:
+                workers = max(1, self.config.ENCODE_WORKERS)
+                self._dense_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dense-encode")
+                self._sparse_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sparse-encode")
+        return self._dense_executor, self._sparse_executor
+
+    @staticmethod
+    def _timed(fn, *args):
+        start = time.time()
+        result = fn(*args)
+        return result, time.time() - start
+
+    def _encode_dense(self, texts: List[str]):
+        return instructor_service.encode_documents(texts)
+
+    def _encode_sparse(self, texts: List[str]):
+        self._ensure_sparse_model()
+        return list(self.sparse_model.embed(texts))
+
+    @staticmethod
+    def _build_point(entry: Dict, dense_vector, sparse_vector) -> models.PointStruct:
+        return models.PointStruct(
+            id=entry["point_id"],
+            vector={
+                "text-dense": dense_vector.tolist(),
+                "text-sparse": models.SparseVector(
+                    indices=sparse_vector.indices.tolist(),
+                    values=sparse_vector.values.tolist()
+                )
+            },
+            payload=entry["payload"]
+        )
 
+    def add_documents(self, chunks: List[Dict], collection_name: Optional[str] = None):
+        """
+        Pipelined ingestion:
+        plan (hash index) -> dense + sparse encoding on separate executors
+        -> asynchronous upserts, closed by a flush barrier.
+        Stages overlap through a bounded queue, so encoding of batch N+1 runs
+        while batch N is being written.
+        collection_name targets a shadow collection (blue/green reindex) instead of the live one.
+        """
         self._ensure_initialized()
+        counts = {"encoded": 0, "reused": 0, "metadata": 0, "unchanged": 0}
+        timings = {"plan": 0.0, "dense": 0.0, "sparse": 0.0, "upsert": 0.0, "flush": 0.0}
+        if not chunks:
+            counts["stats"] = self._ingest_stats(0, 0.0, timings)
+            return counts
 
-        query_vec = instructor_service.encode_query(query).tolist()
+        collection = collection_name or self.config.COLLECTION_NAME
+        logger.info(f"Ingesting {len(chunks)} chunks into Qdrant collection '{collection}'")
+        dense_executor, sparse_executor = self._get_encode_executors()
+
+        work_queue: queue.Queue = queue.Queue(maxsize=self.config.PIPELINE_QUEUE_SIZE)
+        catalog_rows: List[Dict] = []
+        written: Dict[str, Dict] = {}  # point id -> vectors written by this call
+        call_hashes: Dict[str, str] = {}
+        consumer_error: List[Exception] = []
+        wall_start = time.time()
 
+        def consume():
+            flush = None  # repeats one item of the most recent write with wait=True
+            while True:
+                item = work_queue.get()
+                if item is None:
+                    break
+                if consumer_error:
+                    continue  # drain so the producer never blocks
+                try:
+                    flush = self._write_batch(
+                        collection, item, counts, timings, catalog_rows, written
+                    ) or flush
+                except Exception as e:
+                    consumer_error.append(e)
+
+            # Flush barrier: updates apply in order, so awaiting a repeat of the
+            # last (idempotent) operation guarantees every earlier one is applied
+            if flush and not consumer_error:
+                flush_start = time.time()
+                try:
+                    with self._lock:
+                        flush()
+                except Exception as e:
+                    consumer_error.append(e)
+                timings["flush"] += time.time() - flush_start
+
+        consumer = threading.Thread(target=consume, name="qdrant-upsert", daemon=True)
+        consumer.start()
+
+        try:
+            # Deployment profile may resize batches (falls back to BATCH_SIZE)
+            batch_size = profile_service.get().get("ingest_batch_size") or self.config.BATCH_SIZE
+            for i in range(0, len(chunks), batch_size):
+                if consumer_error:
+                    break
+                batch = chunks[i:i + batch_size]
+
+                plan_start = time.time()
+                plan = self._plan_batch(batch, collection, call_hashes)
+                timings["plan"] += time.time() - plan_start
+                for e in plan["encode"]:
+                    call_hashes.setdefault(e["content_hash"], e["point_id"])
+
+                # Encode each distinct new text once; dense and sparse run concurrently
+                unique_hashes = list(dict.fromkeys(e["content_hash"] for e in plan["encode"]))
+                if unique_hashes:
+                    text_by_hash = {e["content_hash"]: e["text"] for e in plan["encode"]}
+                    texts = [text_by_hash[h] for h in unique_hashes]
+                    plan["slots"] = {h: idx for idx, h in enumerate(unique_hashes)}
+                    plan["dense_future"] = dense_executor.submit(self._timed, self._encode_dense, texts)
+                    plan["sparse_future"] = sparse_executor.submit(self._timed, self._encode_sparse, texts)
+
+                work_queue.put(plan)
+        finally:
+            work_queue.put(None)
+            consumer.join()
+
+        if consumer_error:
+            # Writes issued without wait may not have landed: forget what this call recorded
+            chunk_catalog.delete_points(collection, [row["point_id"] for row in catalog_rows])
+            self._catalog_complete.discard(collection)
+            raise consumer_error[0]
+
+        if collection == self.config.COLLECTION_NAME and self._document_index_ready and catalog_rows:
+            try:
+                self._update_document_vectors({row["doc_id"] for row in catalog_rows})
+            except Exception as e:
+                logger.error(f"Document index update failed: {e}. Rebuilding...")
+                self.rebuild_document_index(background=True)
+        # The local ANN index mirrors the live collection only
+        if self.ann_index is not None and catalog_rows and collection == self.config.COLLECTION_NAME:
+            self._update_local_ann(collection, written, catalog_rows)
+
+        counts["stats"] = self._ingest_stats(len(chunks), time.time() - wall_start, timings)
+
+        logger.info(
+            f"Ingestion completed: {counts['encoded']} encoded, {counts['reused']} vectors reused, "
+            f"{counts['metadata']} metadata-only, {counts['unchanged']} unchanged"
+        )
+        logger.info(f"[QDRANT] Ingestion throughput: {counts['stats']}")
+        return counts
+
+    @staticmethod
+    def _ingest_stats(total: int, wall: float, timings: Dict) -> Dict:
+        return {
+            "chunks": total,
+            "wall_seconds": round(wall, 3),
+            "chunks_per_sec": round(total / wall, 1) if wall > 0 else None,
+            "stage_seconds": {k: round(v, 3) for k, v in timings.items()},
+            "stage_chunks_per_sec": {
+                stage: round(total / secs, 1) if secs > 0 else None
+                for stage, secs in timings.items()
+            },
+        }
+
+    def _write_batch(
+        self,
+        collection: str,
+        plan: Dict,
+        counts: Dict,
+        timings: Dict,
+        catalog_rows: List[Dict],
+        written: Dict[str, Dict]
+    ):
+        """
+        Consumer side of the pipeline: assemble points, issue non-blocking writes and
+        record them in the catalog (per batch, so later batches and calls can reuse them).
+        Returns the flush barrier for this batch, or None if nothing was written.
+        """
+        points = []
+
+        if plan["encode"]:
+            (dense_vectors, dense_secs) = plan["dense_future"].result()
+            (sparse_vectors, sparse_secs) = plan["sparse_future"].result()
+            timings["dense"] += dense_secs
+            timings["sparse"] += sparse_secs
+            for e in plan["encode"]:
+                idx = plan["slots"][e["content_hash"]]
+                points.append(self._build_point(e, dense_vectors[idx], sparse_vectors[idx]))
+
+        # Known content under another point: copy the stored vectors
+        if plan["reuse"]:
+            # Points written earlier in this call may not be applied yet: take their vectors from memory
+            sources = {e["source_point"] for e in plan["reuse"]}
+            stored = {pid: written[pid] for pid in sources if pid in written}
+            stored.update(self._fetch_vectors([pid for pid in sources if pid not in stored], collection))
+            missing = []
+            for e in plan["reuse"]:
+                vector = stored.get(e["source_point"])
+                if vector is None:
+                    missing.append(e)
+                    continue
+                points.append(models.PointStruct(id=e["point_id"], vector=vector, payload=e["payload"]))
+
+            # Stale catalog rows: fall back to encoding
+            if missing:
+                texts = [e["text"] for e in missing]
+                dense_vectors, dense_secs = self._timed(self._encode_dense, texts)
+                sparse_vectors, sparse_secs = self._timed(self._encode_sparse, texts)
+                timings["dense"] += dense_secs
+                timings["sparse"] += sparse_secs
+                for idx, e in enumerate(missing):
+                    points.append(self._build_point(e, dense_vectors[idx], sparse_vectors[idx]))
+                missing_ids = {e["point_id"] for e in missing}
+                plan["reuse"] = [e for e in plan["reuse"] if e["point_id"] not in missing_ids]
+                plan["encode"].extend(missing)
+
+        for point in points:
+            written[str(point.id)] = point.vector
+
+        upsert_start = time.time()
+        with self._lock:
+            if points:
+                self.client.upsert(
+                    collection_name=collection,
+                    points=points,
+                    wait=False
+                )
+
+            # Same content, changed metadata: payload-only update
+            metadata_ops = [
+                models.SetPayloadOperation(
+                    set_payload=models.SetPayload(payload=e["payload"], points=[e["point_id"]])
+                )
+                for e in plan["metadata"]
+            ]
+            if metadata_ops:
+                self.client.batch_update_points(
+                    collection_name=collection,
+                    update_operations=metadata_ops,
+                    wait=False
+                )
+        timings["upsert"] += time.time() - upsert_start
+
+        rows = [
+            {
+                "point_id": e["point_id"],
+                "chunk_id": e["payload"]["chunk_id"],
+                "doc_id": e["payload"]["doc_id"],
+                "folder_id": e["payload"]["folder_id"],
+                "chunk_index": e["payload"]["chunk_index"],
+                "file_type": e["payload"]["file_type"],
+                "content_hash": e["content_hash"],
+                "payload_hash": e["payload_hash"],
+            }
+            for e in plan["encode"] + plan["reuse"] + plan["metadata"]
+        ]
+        chunk_catalog.upsert(collection, rows)
+        catalog_rows.extend(rows)
+
+        counts["encoded"] += len(plan["encode"])
+        counts["reused"] += len(plan["reuse"])
+        counts["metadata"] += len(plan["metadata"])
+        counts["unchanged"] += len(plan["unchanged"])
+
+        # Only the last operation is repeated: waiting on it waits on everything before it
+        if metadata_ops:
+            return lambda: self.client.batch_update_points(
+                collection_name=collection, update_operations=metadata_ops[-1:], wait=True
+            )
+        if points:
+            return lambda: self.client.upsert(collection_name=collection, points=points[-1:], wait=True)
+        return None
+
+    # -------------------------
+    # Search
+    # -------------------------
+
+    def _build_filter(
+        self,
+        folder_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        doc_ids: Optional[List[str]] = None
+    ) -> Optional[models.Filter]:
         conditions = []
         if folder_id:
             conditions.append(models.FieldCondition(
@@ -226,19 +1322,147 @@ class QdrantVectorService:
                 key="doc_id",
                 match=models.MatchValue(value=file_id)
             ))
+        if file_type:
+            conditions.append(models.FieldCondition(
+                key="file_type",
+                match=models.MatchValue(value=file_type)
+            ))
+        if doc_ids:
+            conditions.append(models.FieldCondition(
+                key="doc_id",
+                match=models.MatchAny(any=doc_ids)
+            ))
+        return models.Filter(must=conditions) if conditions else None
+
+    def get_filter_cardinality(
+        self,
+        folder_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        collection_name: Optional[str] = None,
+        doc_ids: Optional[List[str]] = None
+    ) -> int:
+        """Number of points matching a scope filter (whole collection if unscoped)."""
+        self._ensure_initialized()
+        collection = collection_name or self.config.COLLECTION_NAME
+        # The catalog answers from sqlite indexes, but a partial one would under-report the scope
+        if collection in self._catalog_complete:
+            return chunk_catalog.count(collection, folder_id=folder_id, doc_id=file_id, file_type=file_type, doc_ids=doc_ids)
+        # Planning only needs the order of magnitude: the estimate comes from the payload
+        # indexes instead of a scan of every matching point on each scoped search
+        return self.client.count(
+            collection_name=collection,
+            count_filter=self._build_filter(folder_id, file_id, file_type, doc_ids),
+            exact=False
+        ).count
+
+    def _plan_search(
+        self,
+        collection: str,
+        k: int,
+        folder_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        doc_ids: Optional[List[str]] = None,
+        profile: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Pick a strategy for one search:
+        - "ann": unscoped, plain HNSW
+        - "exhaustive": small scope, every point scored exactly (no candidate can be missed)
+        - "filtered_ann": large scope, filtered HNSW with ef sized to the filter selectivity
+        k is capped at the scope size only when the catalog counted it exactly: an estimate
+        may pick the strategy but must not drop results. A retrieval profile overrides ef and
+        the exhaustive limit.
+        """
+        start = time.time()
+        profile = profile or {}
+        search_ef = profile.get("search_ef") or self.config.SEARCH_EF
+        exhaustive_max = profile.get("exhaustive_scope_max", self.config.EXHAUSTIVE_SCOPE_MAX)
+        if not (folder_id or file_id or file_type or doc_ids):
+            plan = {"strategy": "ann", "scope_size": None, "k": k, "ef": max(search_ef, k * 2)}
+        else:
+            size = self.get_filter_cardinality(folder_id, file_id, file_type, collection, doc_ids)
+            exact = collection in self._catalog_complete
+            k_eff = min(k, size) if exact else k
+            if size <= exhaustive_max:
+                plan = {"strategy": "exhaustive", "scope_size": size, "exact": exact, "k": k_eff, "ef": None}
+            else:
+                total = max(self.get_filter_cardinality(collection_name=collection), size)
+                selectivity = size / total
+                # Narrow filters prune most graph neighbours: they need the wide beam
+                if selectivity >= self.config.BROAD_FILTER_SELECTIVITY:
+                    ef = max(min(self.config.MIN_SEARCH_EF, search_ef), k_eff * 2)
+                else:
+                    ef = max(search_ef, k_eff * 2)
+                plan = {
+                    "strategy": "filtered_ann",
+                    "scope_size": size,
+                    "exact": exact,
+                    "selectivity": round(selectivity, 4),
+                    "k": k_eff,
+                    "ef": ef
+                }
+
+        scope_docs = f" doc_ids={len(doc_ids)}" if doc_ids else ""
+        logger.info(
+            f"[PLANNER] folder_id={folder_id} doc_id={file_id} file_type={file_type}{scope_docs} -> {plan} "
+            f"({(time.time() - start) * 1000:.1f}ms)"
+        )
+        return plan
+
+    def search(
+        self,
+        query: str,
+        k: int = 40,
+        folder_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        collection_name: Optional[str] = None,
+        profile: Optional[Dict] = None
+    ) -> List[Dict]:
+
+        self._ensure_initialized()
+        collection = collection_name or self.config.COLLECTION_NAME
+        start = time.time()
+
+        query_vec = instructor_service.encode_query(query).tolist()
 
-        q_filter = models.Filter(must=conditions) if conditions else None
-        ef = max(self.config.SEARCH_EF, k * 2)
+        # Unscoped: narrow to the best documents first (two-level retrieval)
+        doc_ids = None
+        if not (folder_id or file_id or file_type):
+            doc_ids = self._two_level_scope(collection, [query], [query_vec], profile=profile)
+
+        q_filter = self._build_filter(folder_id, file_id, file_type, doc_ids)
+        plan = self._plan_search(collection, k, folder_id, file_id, file_type, doc_ids, profile)
+        k, ef = plan["k"], plan["ef"]
+        if k == 0:
+            # Only an exact count gets here: estimated plans keep the requested k
+            logger.info("[QDRANT] Scope is empty, nothing to search")
+            return []
+
+        # -------- Embedded mode with local ANN index --------
+        # (scopes the planner marks exhaustive are scored exactly inside the index)
+        if self.ann_index is not None and collection == self.config.COLLECTION_NAME:
+            return self._search_local_ann(
+                query, query_vec, k, q_filter, folder_id, file_id, file_type,
+                ef=ef, doc_ids=doc_ids, exact=plan["strategy"] == "exhaustive"
+            )
+
+        # -------- Small scope: exact scoring --------
+        if plan["strategy"] == "exhaustive":
+            results = self._search_exhaustive(collection, [query_vec], self._encode_sparse_queries([query]), k, q_filter)
+            logger.info(f"[QDRANT] Retrieved {len(results)} points (exhaustive, {(time.time() - start) * 1000:.1f}ms)")
+            return results
 
         # -------- Hybrid Search --------
         try:
-            if not self.sparse_model:
-                self.sparse_model = SparseTextEmbedding(self.config.SPARSE_MODEL_NAME)
+            self._ensure_sparse_model()
 
             sparse_q = list(self.sparse_model.embed([query]))[0]
 
             results = self.client.query_points(
-                collection_name=self.config.COLLECTION_NAME,
+                collection_name=collection,
                 prefetch=[
                     models.Prefetch(
                         using="text-sparse",
@@ -265,19 +1489,19 @@ class QdrantVectorService:
             logger.error(f"Hybrid search failed: {e}. Falling back to dense-only.")
 
             results = self.client.query_points(
-                collection_name=self.config.COLLECTION_NAME,
+                collection_name=collection,
                 query=query_vec,
                 using="text-dense",
                 limit=k,
-                filter=q_filter,
-                params=models.SearchParams(hnsw_ef=ef)
+                query_filter=q_filter,
+                search_params=models.SearchParams(hnsw_ef=ef)
             ).points
 
         if not results:
             logger.error("Qdrant returned 0 results — retrieval failure")
             return []
 
-        logger.info(f"[QDRANT] Retrieved {len(results)} points")
+        logger.info(f"[QDRANT] Retrieved {len(results)} points ({plan['strategy']}, {(time.time() - start) * 1000:.1f}ms)")
 
         return [
             {
@@ -289,19 +1513,489 @@ class QdrantVectorService:
             for p in results
         ]
 
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 40,
+        folder_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        file_type: Optional[str] = None,
+        collection_name: Optional[str] = None,
+        profile: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Multi-query retrieval: all variants are encoded in one batch, searched in one
+        batched request and fused client-side with RRF. Each point appears once.
+        """
+        queries = list(dict.fromkeys(q for q in queries if q and q.strip()))
+        if not queries:
+            return []
+        if len(queries) == 1:
+            return self.search(queries[0], k, folder_id, file_id, file_type, collection_name, profile)
+
+        self._ensure_initialized()
+        collection = collection_name or self.config.COLLECTION_NAME
+        start = time.time()
+
+        dense_vecs = instructor_service.encode_queries(queries)
+        sparse_vecs = self._encode_sparse_queries(queries)
+        t_encode = time.time()
+
+        # Unscoped: narrow to the best documents first (two-level retrieval)
+        doc_ids = None
+        if not (folder_id or file_id or file_type):
+            doc_ids = self._two_level_scope(collection, queries, dense_vecs, sparse_vecs, profile)
+
+        q_filter = self._build_filter(folder_id, file_id, file_type, doc_ids)
+        plan = self._plan_search(collection, k, folder_id, file_id, file_type, doc_ids, profile)
+        k, ef = plan["k"], plan["ef"]
+        if k == 0:
+            # Only an exact count gets here: estimated plans keep the requested k
+            logger.info("[QDRANT] Scope is empty, nothing to search")
+            return []
+
+        rankings: List[List[str]] = []
+        payloads: Dict[str, Dict] = {}
+
+        if plan["strategy"] == "exhaustive" and not (self.ann_index is not None and collection == self.config.COLLECTION_NAME):
+            results = self._search_exhaustive(collection, dense_vecs, sparse_vecs, k, q_filter)
+            logger.info(
+                f"[QDRANT] Multi-query: {len(queries)} variants -> {len(results)} fused points, exhaustive "
+                f"(encode {(t_encode - start) * 1000:.1f}ms, search {(time.time() - t_encode) * 1000:.1f}ms)"
+            )
+            return results
+
+        if self.ann_index is not None and collection == self.config.COLLECTION_NAME:
+            # Dense legs in-process, sparse legs as one batched request
+            scope = self._ann_scope(collection, folder_id, file_id, file_type, doc_ids)
+            exact = plan["strategy"] == "exhaustive"
+            for vec in dense_vecs:
+                rankings.append([pid for pid, _ in self.ann_index.search(vec, k, ef=ef, exact=exact, **scope)])
+            if sparse_vecs:
+                responses = self.client.query_batch_points(
+                    collection_name=collection,
+                    requests=[
+                        models.QueryRequest(
+                            query=vec, using="text-sparse", limit=k, filter=q_filter, with_payload=False
+                        )
+                        for vec in sparse_vecs
+                    ]
+                )
+                rankings.extend([str(p.id) for p in r.points] for r in responses)
+        else:
+            def hybrid_request(dense, sparse):
+                prefetch = [models.Prefetch(
+                    using="text-dense",
+                    query=dense.tolist(),
+                    limit=k,
+                    filter=q_filter,
+                    params=models.SearchParams(hnsw_ef=ef)
+                )]
+                if sparse is not None:
+                    prefetch.append(models.Prefetch(using="text-sparse", query=sparse, limit=k, filter=q_filter))
+                return models.QueryRequest(
+                    prefetch=prefetch,
+                    query=models.FusionQuery(fusion=models.Fusion.RRF),
+                    limit=k,
+                    with_payload=True
+                )
+
+            try:
+                responses = self.client.query_batch_points(
+                    collection_name=collection,
+                    requests=[
+                        hybrid_request(dense, sparse_vecs[i] if sparse_vecs else None)
+                        for i, dense in enumerate(dense_vecs)
+                    ]
+                )
+            except Exception as e:
+                logger.error(f"Batched hybrid search failed: {e}. Falling back to dense-only.")
+                responses = self.client.query_batch_points(
+                    collection_name=collection,
+                    requests=[
+                        models.QueryRequest(
+                            query=dense.tolist(),
+                            using="text-dense",
+                            limit=k,
+                            filter=q_filter,
+                            params=models.SearchParams(hnsw_ef=ef),
+                            with_payload=True
+                        )
+                        for dense in dense_vecs
+                    ]
+                )
+            for r in responses:
+                rankings.append([str(p.id) for p in r.points])
+                for p in r.points:
+                    payloads[str(p.id)] = p.payload or {}
+        t_search = time.time()
+
+        fused = self._rrf_fuse(rankings, k, self.config.RRF_K)
+        missing = [pid for pid, _ in fused if pid not in payloads]
+        if missing:
+            for r in self.client.retrieve(collection_name=collection, ids=missing, with_payload=True, with_vectors=False):
+                payloads[str(r.id)] = r.payload or {}
+
+        logger.info(
+            f"[QDRANT] Multi-query: {len(queries)} variants -> {len(fused)} fused points, {plan['strategy']} "
+            f"(encode {(t_encode - start) * 1000:.1f}ms, search {(t_search - t_encode) * 1000:.1f}ms)"
+        )
+        if not fused:
+            logger.error("Qdrant returned 0 results — retrieval failure")
+
+        return [
+            {
+                "id": pid,
+                "score": score,
+                "payload": payloads[pid],
+                "chunk_id": payloads[pid].get("chunk_id", pid)
+            }
+            for pid, score in fused
+            if pid in payloads
+        ]
+
+    def _encode_sparse_queries(self, queries: List[str]) -> Optional[List[models.SparseVector]]:
+        try:
+            self._ensure_sparse_model()
+            return [
+                models.SparseVector(indices=v.indices.tolist(), values=v.values.tolist())
+                for v in self.sparse_model.embed(queries)
+            ]
+        except Exception as e:
+            logger.error(f"Sparse encoding failed: {e}. Using dense-only legs.")
+            return None
+
+    def _search_exhaustive(
+        self,
+        collection: str,
+        dense_vecs,
+        sparse_vecs: Optional[List[models.SparseVector]],
+        k: int,
+        q_filter: Optional[models.Filter]
+    ) -> List[Dict]:
+        """
+        Small scopes: pull every dense vector of the scope and score it exactly,
+        sparse legs go to Qdrant unbounded (the inverted index is exact anyway).
+        """
+        point_ids, vectors, payloads = [], [], {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection,
+                scroll_filter=q_filter,
+                limit=self.config.SCROLL_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=["text-dense"]
+            )
+            for p in points:
+                vector = p.vector.get("text-dense") if isinstance(p.vector, dict) else p.vector
+                if vector is None:
+                    continue
+                point_ids.append(str(p.id))
+                vectors.append(vector)
+                payloads[str(p.id)] = p.payload or {}
+            if offset is None:
+                break
+        if not point_ids:
+            return []
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        queries = np.asarray(dense_vecs, dtype=np.float32).reshape(len(dense_vecs), -1)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+        scores = queries @ matrix.T
+
+        rankings = [[point_ids[i] for i in np.argsort(-row)[:k]] for row in scores]
+        if sparse_vecs:
+            try:
+                responses = self.client.query_batch_points(
+                    collection_name=collection,
+                    requests=[
+                        models.QueryRequest(
+                            query=vec, using="text-sparse", limit=len(point_ids), filter=q_filter, with_payload=False
+                        )
+                        for vec in sparse_vecs
+                    ]
+                )
+                rankings.extend([str(p.id) for p in r.points] for r in responses)
+            except Exception as e:
+                logger.error(f"Sparse leg failed: {e}. Using dense-only results.")
+
+        fused = self._rrf_fuse(rankings, k, self.config.RRF_K)
+        return [
+            {
+                "id": pid,
+                "score": score,
+                "payload": payloads[pid],
+                "chunk_id": payloads[pid].get("chunk_id", pid)
+            }
+            for pid, score in fused
+            if pid in payloads
+        ]
+
+    @staticmethod
+    def _rrf_fuse(rankings: List[List[str]], k: int, rrf_k: int = 60) -> List[tuple]:
+        """Reciprocal Rank Fusion over ranked id lists -> [(id, score)] best first."""
+        scores: Dict[str, float] = {}
+        for ranking in rankings:
+            for rank, pid in enumerate(ranking):
+                scores[pid] = scores.get(pid, 0.0) + 1.0 / (rrf_k + rank + 1)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def _search_local_ann(
+        self,
+        query: str,
+        query_vec: List[float],
+        k: int,
+        q_filter: Optional[models.Filter],
+        folder_id: Optional[str],
+        file_id: Optional[str],
+        file_type: Optional[str],
+        ef: Optional[int] = None,
+        doc_ids: Optional[List[str]] = None,
+        exact: Optional[bool] = None
+    ) -> List[Dict]:
+        """Dense leg from the HNSW index, sparse leg from Qdrant, fused client-side with RRF."""
+        collection = self.config.COLLECTION_NAME
+
+        # Pre-filter: payload ranges or point ids from the catalog, depending on the index
+        scope = self._ann_scope(collection, folder_id, file_id, file_type, doc_ids)
+        dense_hits = self.ann_index.search(query_vec, k, ef=ef, exact=exact, **scope)
+
+        sparse_hits = []
+        try:
+            self._ensure_sparse_model()
+            sparse_q = list(self.sparse_model.embed([query]))[0]
+            sparse_hits = self.client.query_points(
+                collection_name=collection,
+                query=models.SparseVector(
+                    indices=sparse_q.indices.tolist(),
+                    values=sparse_q.values.tolist()
+                ),
+                using="text-sparse",
+                limit=k,
+                query_filter=q_filter,
+                with_payload=False
+            ).points
+        except Exception as e:
+            logger.error(f"Sparse leg failed: {e}. Using dense-only results.")
+
+        fused = self._rrf_fuse(
+            [[pid for pid, _ in dense_hits], [str(p.id) for p in sparse_hits]],
+            k,
+            self.config.RRF_K
+        )
+        if not fused:
+            logger.error("Qdrant returned 0 results — retrieval failure")
+            return []
+
+        records = self.client.retrieve(
+            collection_name=collection,
+            ids=[pid for pid, _ in fused],
+            with_payload=True,
+            with_vectors=False
+        )
+        payloads = {str(r.id): r.payload or {} for r in records}
+
+        logger.info(f"[QDRANT] Retrieved {len(fused)} points (local ANN + sparse)")
+
+        return [
+            {
+                "id": pid,
+                "score": score,
+                "payload": payloads[pid],
+                "chunk_id": payloads[pid].get("chunk_id", pid)
+            }
+            for pid, score in fused
+            if pid in payloads
+        ]
+
+    # -------------------------
+    # Deletion
+    # -------------------------
+
+    def delete_documents(self, file_ids: List[str]) -> int:
+        """
+        Filter-based delete of every point belonging to the given documents.
+        Returns the number of points removed.
+        """
+        self._ensure_initialized()
+        if not file_ids:
+            return 0
+
+        removed = 0
+        for i in range(0, len(file_ids), self.config.DELETE_BATCH_SIZE):
+            batch = file_ids[i:i + self.config.DELETE_BATCH_SIZE]
+            doc_filter = models.Filter(must=[
+                models.FieldCondition(key="doc_id", match=models.MatchAny(any=batch))
+            ])
+
+            if self.ann_index is not None:
+                self.ann_index.delete(self._scroll_point_ids(doc_filter))
+                self.ann_index.save()
+
+            with self._lock:
+                matched = self.client.count(
+                    collection_name=self.config.COLLECTION_NAME,
+                    count_filter=doc_filter,
+                    exact=True
+                ).count
+                if matched:
+                    self.client.delete(
+                        collection_name=self.config.COLLECTION_NAME,
+                        points_selector=models.FilterSelector(filter=doc_filter),
+                        wait=True
+                    )
+            removed += matched
+            chunk_catalog.delete_documents(self.config.COLLECTION_NAME, batch)
+            if self._document_index_ready:
+                self._update_document_vectors(batch)
+
+        logger.info(f"[QDRANT] Deleted {removed} points for {len(file_ids)} documents")
+        return removed
+
+    def _scroll_point_ids(self, scroll_filter: models.Filter) -> List[str]:
+        point_ids = []
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.config.COLLECTION_NAME,
+                scroll_filter=scroll_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            point_ids.extend(str(r.id) for r in records)
+            if offset is None or not records:
+                break
+        return point_ids
+
+    def _local_storage_file(self) -> Path:
+        return Path(self.config.DB_PATH) / "collection" / self.physical_collection / "storage.sqlite"
+
+    def _server_disk_usage(self, collection: str) -> Optional[int]:
+        """Bytes on disk across a collection's segments, from the server telemetry."""
+        def total(node) -> int:
+            if isinstance(node, dict):
+                return sum(v if k == "disk_usage_bytes" and isinstance(v, int) else total(v) for k, v in node.items())
+            if isinstance(node, list):
+                return sum(total(v) for v in node)
+            return 0
+
+        try:
+            telemetry = self.client.http.service_api.telemetry(details_level=3).result
+            collections = telemetry.model_dump().get("collections", {}).get("collections") or []
+            return sum(total(c) for c in collections if c.get("id") == collection)
+        except Exception as e:
+            logger.warning(f"Could not read disk usage of '{collection}': {e}")
+            return None
+
+    def compact(self) -> Dict:
+        """
+        Reclaim space left behind by deletes.
+        Server mode: lower the vacuum thresholds so every segment with deletions is rewritten,
+        wait for the optimizer, then restore the configured thresholds.
+        Embedded mode: VACUUM the collection's sqlite storage (the local client commits after
+        every write, so a second connection can take the lock between writes).
+        reclaimed_bytes compares the storage size before and after.
+        """
+        self._ensure_initialized()
+        collection = self.physical_collection
+        report = {"mode": "server" if self.is_server_mode else "embedded", "reclaimed_bytes": None}
+        start = time.time()
+
+        if not self.is_server_mode:
+            storage = self._local_storage_file()
+            if not storage.exists():
+                return report
+            with self._lock:
+                before = storage.stat().st_size
+                try:
+                    conn = sqlite3.connect(str(storage), timeout=self.config.COMPACTION_WAIT_SECONDS)
+                    try:
+                        conn.execute("VACUUM")
+                    finally:
+                        conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Local storage VACUUM failed: {e}")
+                    report["error"] = str(e)
+                after = storage.stat().st_size
+            report.update(size_before=before, size_after=after, reclaimed_bytes=before - after)
+        else:
+            before = self._server_disk_usage(collection)
+            info = self.client.get_collection(collection)
+            report["segments_before"] = info.segments_count
+            try:
+                self.client.update_collection(
+                    collection_name=collection,
+                    optimizers_config=models.OptimizersConfigDiff(
+                        deleted_threshold=0.0,
+                        vacuum_min_vector_number=self.config.COMPACTION_MIN_VECTOR_NUMBER
+                    )
+                )
+                # The optimizer picks the change up asynchronously: GREEN straight after the
+                # update may just mean it has not started yet
+                deadline = time.time() + self.config.COMPACTION_WAIT_SECONDS
+                grace = time.time() + 2
+                while time.time() < deadline:
+                    info = self.client.get_collection(collection)
+                    if info.status == models.CollectionStatus.GREEN and time.time() >= grace:
+                        break
+                    time.sleep(0.5)
+                report["timed_out"] = info.status != models.CollectionStatus.GREEN
+            except Exception as e:
+                logger.warning(f"Collection compaction failed: {e}")
+                report["error"] = str(e)
+            finally:
+                self.client.update_collection(
+                    collection_name=collection,
+                    optimizers_config=models.OptimizersConfigDiff(
+                        deleted_threshold=self.config.VACUUM_DELETED_THRESHOLD,
+                        vacuum_min_vector_number=self.config.VACUUM_MIN_VECTOR_NUMBER
+                    )
+                )
+            report["segments_after"] = info.segments_count
+            after = self._server_disk_usage(collection)
+            report.update(size_before=before, size_after=after)
+            if before is not None and after is not None:
+                report["reclaimed_bytes"] = before - after
+
+        report["duration_ms"] = round((time.time() - start) * 1000, 2)
+        logger.info(f"[QDRANT] Compaction finished: {report}")
+        return report
+
     # -------------------------
     # Utilities
     # -------------------------
 
     def delete_collection(self):
         self._ensure_initialized()
-        self.client.delete_collection(self.config.COLLECTION_NAME)
+        self.client.delete_collection(self.physical_collection)
+        chunk_catalog.clear(self.config.COLLECTION_NAME)
+        self._catalog_complete.discard(self.config.COLLECTION_NAME)
+        if self.ann_index is not None:
+            self.ann_index.clear()
+        if self.client.collection_exists(self.config.DOC_COLLECTION_NAME):
+            self.client.delete_collection(self.config.DOC_COLLECTION_NAME)
+        self._document_index_ready = False
         self._initialized = False
         logger.warning("Qdrant collection deleted")
 
     def get_count(self) -> int:
         self._ensure_initialized()
-        return self.client.get_collection(self.config.COLLECTION_NAME).points_count
+        return self.client.get_collection(self.physical_collection).points_count
+
+    def close(self):
+        """Persist the local ANN index and release the client (app shutdown)."""
+        with self._lock:
+            if not self._initialized:
+                return
+            if self.ann_index is not None:
+                self.ann_index.save()
+            self.client.close()
+            self._initialized = False
 
 
 # Singleton
@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import logging
+import threading
+import itertools
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her", "was",
+    "one", "our", "out", "has", "have", "this", "that", "with", "from", "they", "will", "would",
+    "there", "their", "what", "about", "which", "when", "where", "who", "how", "why", "does",
+    "did", "been", "into", "than", "then", "them", "these", "those", "its", "his", "she", "also",
+    "were", "each", "more", "most", "other", "some", "such", "only", "over", "under", "per",
+    "may", "shall", "should", "could", "must", "being", "between", "both", "after", "before",
+    "file", "filename", "page", "document", "tell", "show", "give", "find", "list", "say", "says",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9\-]{2,}")
+# "Long Form Name (LFN)" and "LFN (Long Form Name)"
+ACRONYM_AFTER_RE = re.compile(r"\b((?:[A-Z][a-zA-Z]+[\s\-]+){1,6}[A-Z][a-zA-Z]+)\s*\(([A-Z][A-Z0-9&]{1,9})\)")
+ACRONYM_BEFORE_RE = re.compile(r"\b([A-Z][A-Z0-9&]{1,9})\s*\(((?:[A-Z][a-zA-Z]+[\s\-]+){1,6}[A-Z][a-zA-Z]+)\)")
+
+
+class QueryExpansionService:
+    """
+    LLM-free query expansion.
+    - Corpus statistics (document frequency, term co-occurrence, acronym table) are
+      built incrementally at ingestion time into a small sqlite store.
+    - expand() turns a query into a few variants in milliseconds: acronym
+      expansion + strongly co-occurring terms.
+    - feedback_terms() adds pseudo-relevance feedback from first-pass hits.
+    QUERY_EXPANSION_MODE=local|llm|off selects it against the LLM rewriter.
+    """
+
+    TERMS_PER_CHUNK = 16       # most frequent terms kept per chunk for co-occurrence
+    MIN_COOCCURRENCE = 2
+    RELATED_PER_TERM = 2
+    MAX_VARIANTS = 3
+    SHORT_QUERY_TOKENS = 6     # longer queries are specific enough on their own
+
+    def __init__(self, db_path: str = "data/query_expansion.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.mode = os.getenv("QUERY_EXPANSION_MODE", "local").lower()
+        self._write_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cooc (
+                    term_a TEXT NOT NULL,
+                    term_b TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (term_a, term_b)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS acronyms (
+                    acronym TEXT NOT NULL,
+                    expansion TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (acronym, expansion)
+                )
+            """)
+            # Per-document contributions, so re-ingest and delete can be subtracted exactly
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS doc_terms (
+                    doc_id TEXT PRIMARY KEY,
+                    chunk_terms TEXT NOT NULL,
+                    acronyms TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.commit()
+
+    # -------------------------
+    # Text analysis
+    # -------------------------
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and not t.isdigit()]
+
+    @staticmethod
+    def _strip_context_header(text: str) -> str:
+        # Chunks carry an injected "[Document: ...]" (older: "Filename: ...\nFile ID: ...") header
+        lines = text.split("\n")
+        return "\n".join(l for l in lines if not l.startswith(("Filename:", "File ID:", "[Document:")))
+
+    def _chunk_terms(self, text: str) -> List[str]:
+        counts = Counter(self.tokenize(self._strip_context_header(text)))
+        return [t for t, _ in counts.most_common(self.TERMS_PER_CHUNK)]
+
+    @staticmethod
+    def _extract_acronyms(text: str) -> List[Tuple[str, str]]:
+        found = []
+        for long_form, acronym in ACRONYM_AFTER_RE.findall(text):
+            found.append((acronym, long_form))
+        for acronym, long_form in ACRONYM_BEFORE_RE.findall(text):
+            found.append((acronym, long_form))
+
+        valid = []
+        for acronym, long_form in found:
+            words = re.split(r"[\s\-]+", long_form.strip())
+            letters = acronym.replace("&", "")
+            # Keep the trailing words whose initials spell the acronym
+            if len(words) >= len(letters):
+                tail = words[-len(letters):]
+                if "".join(w[0] for w in tail).upper() == letters.upper():
+                    valid.append((acronym.lower(), " ".join(tail).lower()))
+        return valid
+
+    # -------------------------
+    # Ingestion-time statistics
+    # -------------------------
+
+    def index_document(self, doc_id: str, chunks: List[Dict]):
+        """(Re)build the statistics contributed by one document."""
+        chunk_terms = [self._chunk_terms(c.get("text", "")) for c in chunks]
+        chunk_terms = [terms for terms in chunk_terms if terms]
+        acronyms = []
+        for c in chunks:
+            acronyms.extend(self._extract_acronyms(c.get("text", "")))
+
+        start = time.time()
+        with self._write_lock, self._connect() as conn:
+            self._subtract_document(conn, doc_id)
+            self._apply(conn, chunk_terms, acronyms, sign=1)
+            conn.execute(
+                "INSERT OR REPLACE INTO doc_terms (doc_id, chunk_terms, acronyms) VALUES (?, ?, ?)",
+                (doc_id, json.dumps(chunk_terms), json.dumps(acronyms))
+            )
+            conn.commit()
+        logger.info(
+            f"Query expansion stats updated for {doc_id}: {len(chunk_terms)} chunks, "
+            f"{len(acronyms)} acronyms ({(time.time() - start) * 1000:.1f}ms)"
+        )
+
+    def remove_document(self, doc_id: str):
+        with self._write_lock, self._connect() as conn:
+            self._subtract_document(conn, doc_id)
+            conn.commit()
+
+    def _subtract_document(self, conn, doc_id: str):
+        row = conn.execute("SELECT chunk_terms, acronyms FROM doc_terms WHERE doc_id = ?", (doc_id,)).fetchone()
+        if not row:
+            return
+        self._apply(conn, json.loads(row[0]), [tuple(a) for a in json.loads(row[1])], sign=-1)
+        conn.execute("DELETE FROM doc_terms WHERE doc_id = ?", (doc_id,))
+
+    def _apply(self, conn, chunk_terms: List[List[str]], acronyms: List[Tuple[str, str]], sign: int):
+        df = Counter(t for terms in chunk_terms for t in set(terms))
+        pairs = Counter(
+            pair for terms in chunk_terms for pair in itertools.combinations(sorted(set(terms)), 2)
+        )
+
+        conn.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+            [(t, sign * n) for t, n in df.items()]
+        )
+        conn.executemany(
+            "INSERT INTO cooc (term_a, term_b, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(term_a, term_b) DO UPDATE SET count = count + excluded.count",
+            [(a, b, sign * n) for (a, b), n in pairs.items()]
+        )
+        conn.executemany(
+            "INSERT INTO acronyms (acronym, expansion, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(acronym, expansion) DO UPDATE SET count = count + excluded.count",
+            [(a, e, sign * n) for (a, e), n in Counter(acronyms).items()]
+        )
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('chunks', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+            (sign * len(chunk_terms),)
+        )
+        if sign < 0:
+            conn.execute("DELETE FROM terms WHERE df <= 0")
+            conn.execute("DELETE FROM cooc WHERE count <= 0")
+            conn.execute("DELETE FROM acronyms WHERE count <= 0")
+
+    def build_if_empty(self, processed_dir: Path):
+        """Backfill from processed documents (stores ingested before this index existed)."""
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM doc_terms LIMIT 1").fetchone():
+                return
+        files = list(Path(processed_dir).glob("*.json"))
+        if not files:
+            return
+
+        def build():
+            start = time.time()
+            for path in files:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        chunks = json.load(f).get("chunks", [])
+                    self.index_document(path.stem, chunks)
+                except Exception as e:
+                    logger.warning(f"Query expansion backfill skipped {path.name}: {e}")
+            logger.info(f"Query expansion stats built for {len(files)} documents in {time.time() - start:.1f}s")
+
+        threading.Thread(target=build, name="query-expansion-backfill", daemon=True).start()
+
+    # -------------------------
+    # Query time
+    # -------------------------
+
+    def _related_terms(self, conn, terms: List[str], total_chunks: int) -> List[str]:
+        placeholders = ", ".join("?" for _ in terms)
+        rows = conn.execute(
+            f"""
+            SELECT c.term_a, c.term_b, c.count, ta.df, tb.df FROM cooc c
+            JOIN terms ta ON ta.term = c.term_a
+            JOIN terms tb ON tb.term = c.term_b
+            WHERE (c.term_a IN ({placeholders}) OR c.term_b IN ({placeholders})) AND c.count >= ?
+            """,
+            [*terms, *terms, self.MIN_COOCCURRENCE]
+        ).fetchall()
+
+        # Normalized co-occurrence weighted by rarity of the related term
+        candidates: Dict[str, Dict[str, float]] = {t: {} for t in terms}
+        for a, b, count, df_a, df_b in rows:
+            for source, related, df_related in ((a, b, df_b), (b, a, df_a)):
+                if source in candidates and related not in candidates:
+                    idf = math.log((total_chunks + 1) / (df_related + 1))
+                    candidates[source][related] = count / math.sqrt(df_a * df_b) * idf
+
+        related = []
+        for source in terms:
+            best = sorted(candidates[source].items(), key=lambda item: item[1], reverse=True)
+            related.extend(t for t, _ in best[:self.RELATED_PER_TERM] if t not in related)
+        return related
+
+    def is_short(self, query: str) -> bool:
+        return 0 < len(set(self.tokenize(query))) <= self.SHORT_QUERY_TOKENS
+
+    def expand(self, query: str) -> List[str]:
+        """Original query first, then up to MAX_VARIANTS - 1 expanded variants."""
+        start = time.time()
+        if not self.is_short(query):
+            return [query]
+        terms = list(dict.fromkeys(self.tokenize(query)))
+
+        variants = [query]
+        with self._connect() as conn:
+            total_chunks = (conn.execute("SELECT value FROM meta WHERE key = 'chunks'").fetchone() or [0])[0]
+            if not total_chunks:
+                return [query]
+
+            # Acronyms both ways: "what is the SLA" <-> "service level agreement"
+            placeholders = ", ".join("?" for _ in terms)
+            expansions = [
+                r[0] for r in conn.execute(
+                    f"SELECT expansion FROM acronyms WHERE acronym IN ({placeholders}) ORDER BY count DESC",
+                    terms
+                )
+            ]
+            lowered = query.lower()
+            expansions += [
+                r[0] for r in conn.execute("SELECT acronym, expansion FROM acronyms ORDER BY count DESC LIMIT 500")
+                if r[1] in lowered
+            ]
+            if expansions:
+                variants.append(f"{query} {' '.join(dict.fromkeys(expansions[:2]))}")
+
+            related = self._related_terms(conn, terms, total_chunks)
+            if related:
+                variants.append(f"{query} {' '.join(related)}")
+
+        logger.info(f"[EXPANSION] local: {len(variants) - 1} variants in {(time.time() - start) * 1000:.1f}ms")
+        return variants[:self.MAX_VARIANTS]
+
+    def feedback_terms(self, query: str, texts: List[str], top_n: int = 5) -> List[str]:
+        """Pseudo-relevance feedback: distinctive terms of the top hits not already in the query."""
+        if not texts:
+            return []
+        query_terms = set(self.tokenize(query))
+        tf = Counter()
+        for text in texts:
+            tf.update(set(self.tokenize(self._strip_context_header(text))))
+        candidates = [t for t, n in tf.items() if n >= 2 and t not in query_terms]
+        if not candidates:
+            return []
+
+        with self._connect() as conn:
+            total_chunks = (conn.execute("SELECT value FROM meta WHERE key = 'chunks'").fetchone() or [0])[0]
+            placeholders = ", ".join("?" for _ in candidates)
+            df = dict(conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", candidates))
+
+        scored = [
+            (t, tf[t] * math.log((total_chunks + 1) / (df.get(t, 0) + 1)))
+            for t in candidates
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return [t for t, _ in scored[:top_n]]
+
+
+# Singleton
+query_expansion_service = QueryExpansionService()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs the work,
+    callers arriving while it is in flight await the same result.
+    Nothing is cached: once the call finishes, the next caller starts a fresh one.
+    If every waiter is cancelled (clients gone), abort() of the call is invoked and the
+    key is freed so a retry starts over. Event-loop only (no locks needed).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.abandoned = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+        self._aborts: Dict[Hashable, Callable[[], None]] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        abort: Optional[Callable[[], None]] = None
+    ) -> Any:
+        self.requests += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+            logger.info(f"[SINGLEFLIGHT] {self.name}: joined in-flight call ({self._waiters[key]} waiting)")
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            if abort is not None:
+                self._aborts[key] = abort
+            task.add_done_callback(lambda t: self._finish(key, t))
+        # shield: a caller going away must not cancel the work the others are waiting on
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            self._leave(key, task)
+            raise
+
+    def _leave(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is not task or task.done():
+            return
+        self._waiters[key] -= 1
+        if self._waiters[key] > 0:
+            return
+        # Last waiter gone: stop the work and let the next caller start fresh
+        self.abandoned += 1
+        del self._inflight[key]
+        self._waiters.pop(key, None)
+        abort = self._aborts.pop(key, None)
+        logger.info(f"[SINGLEFLIGHT] {self.name}: all waiters gone, aborting in-flight call")
+        if abort is not None:
+            abort()
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+            self._aborts.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def metrics(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / self.requests, 3) if self.requests else 0.0,
+            "errors": self.errors,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._inflight),
+            "max_waiters": self.max_waiters,
+        }
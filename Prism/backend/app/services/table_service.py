@@ -208,5 +208,30 @@ class TableService:
         finally:
             con.close()
 
+    def delete_tables_for_files(self, file_ids: List[str]) -> int:
+        """
+        Drop the tab_* tables and metadata rows of the given files.
+        Returns the number of tables dropped.
+        """
+        if not file_ids:
+            return 0
+
+        placeholders = ", ".join("?" for _ in file_ids)
+        con = self._get_connection()
+        try:
+            rows = con.execute(
+                f"SELECT table_id FROM table_metadata WHERE file_id IN ({placeholders})", file_ids
+            ).fetchall()
+            for (table_id,) in rows:
+                con.execute(f"DROP TABLE IF EXISTS tab_{table_id.replace('-', '_')}")
+            con.execute(f"DELETE FROM table_metadata WHERE file_id IN ({placeholders})", file_ids)
+            # Flush the WAL so freed blocks are reusable
+            con.execute("CHECKPOINT")
+        finally:
+            con.close()
+
+        logger.info(f"Dropped {len(rows)} tables for {len(file_ids)} files from DuckDB")
+        return len(rows)
+
 # Global Instance
 table_service = TableService()
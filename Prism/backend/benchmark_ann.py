@@ -0,0 +1,145 @@
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Setup environment
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.ann_index import LocalAnnIndex
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+
+def random_unit_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_top_k(corpus: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = corpus @ query
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def bench_hnsw(corpus, queries, truth, k, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalAnnIndex(
+            tmp,
+            dim=corpus.shape[1],
+            m=args.m,
+            ef_construct=args.ef_construct,
+            ef_search=args.ef,
+            initial_capacity=len(corpus)
+        )
+        index.clear()
+        start = time.time()
+        for i in range(0, len(corpus), 10000):
+            batch = corpus[i:i + 10000]
+            index.add([str(j) for j in range(i, i + len(batch))], batch)
+        build_s = time.time() - start
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            found = index.search(query, k)
+            latencies.append(time.perf_counter() - t0)
+            hits += len({int(pid) for pid, _ in found} & set(expected.tolist()))
+
+    return build_s, latencies, hits / (len(queries) * k)
+
+
+def bench_exact(corpus, queries, k):
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        exact_top_k(corpus, query, k)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def bench_qdrant_local(corpus, queries, truth, k):
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = QdrantClient(path=tmp)
+        client.create_collection(
+            collection_name="bench",
+            vectors_config={"text-dense": models.VectorParams(size=corpus.shape[1], distance=models.Distance.COSINE)}
+        )
+        for i in range(0, len(corpus), 1000):
+            batch = corpus[i:i + 1000]
+            client.upsert(
+                collection_name="bench",
+                points=[
+                    models.PointStruct(id=i + j, vector={"text-dense": vec.tolist()})
+                    for j, vec in enumerate(batch)
+                ]
+            )
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            found = client.query_points(
+                collection_name="bench", query=query.tolist(), using="text-dense", limit=k
+            ).points
+            latencies.append(time.perf_counter() - t0)
+            hits += len({int(p.id) for p in found} & set(expected.tolist()))
+        client.close()
+
+    return latencies, hits / (len(queries) * k)
+
+
+def report(label, latencies, recall=None, extra=""):
+    recall_str = f"  recall@k={recall:.3f}" if recall is not None else ""
+    print(
+        f"  {label:<14} p50={percentile_ms(latencies, 50):8.2f}ms  "
+        f"p95={percentile_ms(latencies, 95):8.2f}ms{recall_str}{extra}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local HNSW vs exhaustive dense search latency and recall.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=32)
+    parser.add_argument("--ef-construct", type=int, default=200)
+    parser.add_argument("--ef", type=int, default=512)
+    parser.add_argument(
+        "--qdrant-max", type=int, default=20000,
+        help="Largest corpus also timed against the embedded Qdrant client (it is slow to load)"
+    )
+    args = parser.parse_args()
+
+    if not LocalAnnIndex.is_available():
+        print("hnswlib is not installed: pip install hnswlib")
+        sys.exit(1)
+
+    for size in args.sizes:
+        print(f"\n--- {size} vectors, dim={args.dim}, k={args.k} ---")
+        corpus = random_unit_vectors(size, args.dim, seed=0)
+        queries = random_unit_vectors(args.queries, args.dim, seed=1)
+        truth = [exact_top_k(corpus, q, args.k) for q in queries]
+
+        build_s, latencies, recall = bench_hnsw(corpus, queries, truth, args.k, args)
+        report("hnsw", latencies, recall, f"  build={build_s:.1f}s")
+        report("exact numpy", bench_exact(corpus, queries, args.k), 1.0)
+
+        if size <= args.qdrant_max:
+            latencies, recall = bench_qdrant_local(corpus, queries, truth, args.k)
+            report("qdrant local", latencies, recall)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,84 @@ except ImportError:
     progress_service = None
 
 
+# -------------------------
+# Identifier extraction (lexical fast path)
+# -------------------------
+
+# Codes mixing letters and digits: QD109, INV-2023-001, AB12/34, v2.1.3
+_CODE_RE = re.compile(r"\b(?=[A-Za-z0-9\-_/.]*\d)(?=[A-Za-z0-9\-_/.]*[A-Za-z])[A-Za-z0-9][A-Za-z0-9\-_/.]{1,30}[A-Za-z0-9]\b")
+_EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+_UNIT_RE = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s?(?:kwh|kw|mw|mah|ghz|mhz|hz|kg|mg|km|cm|mm|gb|mb|tb|psi|bar|usd|eur|inr|v|a|g|m|%)(?![A-Za-z])",
+    re.IGNORECASE
+)
+_LONG_NUMBER_RE = re.compile(r"\b\d{5,}\b")  # invoice / order / part numbers
+_SEPARATORS_RE = re.compile(r"[\-_/.\s]")
+# Everyday words that look like codes: "2nd", "30-day", "24-hour", "3-year"
+_ORDINAL_RE = re.compile(r"^\d+(?:st|nd|rd|th)$")
+_TIME_RE = re.compile(r"^\d{1,2}(?:[:.]\d{2})?(?:am|pm|h|hrs)$")  # "10am", "9.30pm", "18h"
+_COUNTED_WORD_RE = re.compile(
+    r"^\d+[\-_]?(?:day|days|week|weeks|month|months|year|years|yr|hour|hours|hr|minute|minutes|min|"
+    r"second|seconds|sec|person|people|page|pages|point|step|steps|inch|foot|feet|d|x)$"
+)
+
+
+def extract_identifiers(text: str) -> List[str]:
+    """
+    Identifier-like tokens of a text, normalized (lowercase).
+    Codes are also emitted without separators so "INV-2023-001" matches "INV2023001".
+    """
+    if not text:
+        return []
+    found = []
+    for match in _EMAIL_RE.findall(text):
+        found.append(match.lower())
+    text_wo_emails = _EMAIL_RE.sub(" ", text)
+    for match in _CODE_RE.findall(text_wo_emails):
+        token = match.lower()
+        if _ORDINAL_RE.match(token) or _TIME_RE.match(token) or _COUNTED_WORD_RE.match(token):
+            continue
+        found.append(token)
+        compact = _SEPARATORS_RE.sub("", token)
+        if compact != token:
+            found.append(compact)
+    for match in _UNIT_RE.findall(text_wo_emails):
+        found.append(re.sub(r"\s", "", match.lower()).replace(",", "."))
+    found.extend(_LONG_NUMBER_RE.findall(text_wo_emails))
+    return list(dict.fromkeys(found))
+
+
+def is_strong_identifier(token: str) -> bool:
+    """
+    Tokens specific enough to stand in for a search on their own: emails, long numbers,
+    and codes of 4+ characters mixing letters and digits (qd109, inv2023001).
+    Measurements ("10%", "5kg"), ordinals ("2nd") and times ("10am") are not strong.
+    """
+    token = token.lower()
+    if "@" in token or _LONG_NUMBER_RE.fullmatch(token):
+        return True
+    if _UNIT_RE.fullmatch(token) or _ORDINAL_RE.match(token) or _TIME_RE.match(token):
+        return False
+    compact = _SEPARATORS_RE.sub("", token)
+    return (
+        len(compact) >= 4
+        and any(c.isdigit() for c in compact)
+        and any(c.isalpha() for c in compact)
+    )
+
+
+def link_neighbors(chunks: List[Dict]) -> List[Dict]:
+    """
+    Record reading order on a document's chunks: chunk_index plus prev/next chunk_id
+    pointers (None at the ends). Re-run whenever chunk_ids are reassigned.
+    """
+    for i, chunk in enumerate(chunks):
+        chunk["chunk_index"] = i
+        chunk["prev_chunk_id"] = chunks[i - 1].get("chunk_id") if i > 0 else None
+        chunk["next_chunk_id"] = chunks[i + 1].get("chunk_id") if i + 1 < len(chunks) else None
+    return chunks
+
+
 class DocumentChunker:
     def __init__(
         self,
@@ -130,7 +208,7 @@ class DocumentChunker:
         
         # Filter None chunks (dropped by Quality Guard)
         valid_chunks = [c for c in chunks if c is not None]
-        return valid_chunks
+        return link_neighbors(valid_chunks)
 
     def _create_chunk(self, text_list, file_id, chunk_id, metadata, page, chunk_type="text", file_name=None):
         """
@@ -198,6 +276,7 @@ class DocumentChunker:
             "text": final_text,
             "char_count": len(final_text),
             "type": chunk_type,
+            "identifiers": extract_identifiers(raw_text),
             "metadata": chunk_meta
         }
 
@@ -246,6 +325,7 @@ class DocumentChunker:
         # Re-index all chunks to ensure unique chunk_ids across the entire document
         for i, chunk in enumerate(all_chunks):
             chunk["chunk_id"] = i
+        link_neighbors(all_chunks)
 
         if progress_service and progress_file_id:
             progress_service.update_progress(
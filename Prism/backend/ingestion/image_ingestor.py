@@ -58,7 +58,8 @@ def ingest_image(file_path: str, file_id: str, progress_callback=None) -> list:
         caption = ollama_llm.generate_vision_response(
             prompt=prompt,
             image_base64=image_base64,
-            temperature=0.2 # Lower temperature for more factual description
+            temperature=0.2, # Lower temperature for more factual description
+            lane="ingestion" # never ahead of interactive questions
         )
 
         if progress_callback:
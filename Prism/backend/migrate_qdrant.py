@@ -0,0 +1,87 @@
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+# Setup environment
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from dotenv import load_dotenv
+load_dotenv(backend_dir / ".env")
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from app.services.qdrant_service import qdrant_service, QdrantConfig
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate(url: str, source_path: str, batch_size: int):
+    print(f"--- Migrating embedded Qdrant store '{source_path}' to {url} ---")
+
+    # Point the service at the server before it initializes, so the target
+    # collection is bootstrapped with the exact same schema as in embedded mode
+    QdrantConfig.URL = url
+    qdrant_service._ensure_initialized()
+    target = qdrant_service.client
+
+    # Embedded store holds a file lock: the API must not run in embedded mode meanwhile
+    source = QdrantClient(path=source_path)
+    collection = QdrantConfig.COLLECTION_NAME
+    total = source.count(collection_name=collection, exact=True).count
+    print(f"Source points: {total}")
+
+    migrated = 0
+    offset = None
+    start = time.time()
+
+    while True:
+        points, offset = source.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if not points:
+            break
+
+        target.upsert(
+            collection_name=collection,
+            points=[
+                models.PointStruct(id=p.id, vector=p.vector, payload=p.payload)
+                for p in points
+            ],
+            wait=True
+        )
+
+        migrated += len(points)
+        elapsed = time.time() - start
+        rate = migrated / elapsed if elapsed > 0 else 0.0
+        print(f"  {migrated}/{total} points ({rate:.0f} points/s)")
+
+        if offset is None:
+            break
+
+    source.close()
+
+    target_count = qdrant_service.get_count()
+    print("\n--- Migration Complete ---")
+    print(f"Migrated: {migrated} points in {time.time() - start:.1f}s")
+    print(f"Target collection now holds {target_count} points")
+    if target_count < total:
+        print("WARNING: target holds fewer points than the source.")
+    print(f"Set QDRANT_URL={url} in .env to run the API against the server.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream points from the embedded Qdrant store to a Qdrant server.")
+    parser.add_argument("--url", required=True, help="Qdrant server URL, e.g. http://localhost:6333")
+    parser.add_argument("--source", default=QdrantConfig.DB_PATH, help="Path of the embedded store")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    migrate(args.url, args.source, args.batch_size)
@@ -1,7 +1,12 @@
-
 import sys
+import json
+import time
+import random
+import argparse
 import logging
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Setup environment
 backend_dir = Path(__file__).parent
@@ -11,64 +16,205 @@ from dotenv import load_dotenv
 load_dotenv(backend_dir / ".env")
 
 from app.services.qa_service import qa_service
-from app.services.qdrant_service import qdrant_service
+from app.services.qdrant_service import qdrant_service, QdrantConfig
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def reindex_all():
-    print("Starting Global Re-indexing...")
-    
+CHECKPOINT_FILE = Path("data") / "reindex_checkpoint.json"
+_checkpoint_lock = threading.Lock()
+
+
+# -------------------------
+# Checkpoint
+# -------------------------
+
+def load_checkpoint():
+    if not CHECKPOINT_FILE.exists():
+        return None
+    try:
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable checkpoint: {e}")
+        return None
+
+
+def save_checkpoint(state):
+    with _checkpoint_lock:
+        CHECKPOINT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CHECKPOINT_FILE.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        tmp.replace(CHECKPOINT_FILE)
+
+
+# -------------------------
+# Indexing
+# -------------------------
+
+def load_chunks(file_id):
+    # Read straight from disk so workers do not share qa_service's in-memory cache
+    if not qa_service.load_processed_document(file_id, load_chunks=True):
+        return []
+    chunks = qa_service.document_chunks.pop(file_id, [])
+
+    # Ensure each chunk has at least basic metadata if missing
+    for i, chunk in enumerate(chunks):
+        if 'doc_id' not in chunk: chunk['doc_id'] = file_id
+        if 'file_id' not in chunk: chunk['file_id'] = file_id
+        if 'chunk_index' not in chunk: chunk['chunk_index'] = i
+
+    # Fix legacy integer/string chunk_ids to be globally unique
+    for chunk in chunks:
+        cid = chunk.get("chunk_id")
+        # If cid is int, or if it doesn't start with file_id (heuristic), prefix it
+        if isinstance(cid, int) or (isinstance(cid, str) and not cid.startswith(file_id)):
+            chunk["chunk_id"] = f"{file_id}_{cid}"
+
+    return chunks
+
+
+def index_document(file_id, shadow):
+    chunks = load_chunks(file_id)
+    if chunks:
+        qdrant_service.add_documents(chunks, collection_name=shadow)
+    # Points are keyed by chunk_id: duplicates inside a document collapse to one
+    return len({str(c.get("chunk_id")) for c in chunks})
+
+
+# -------------------------
+# Verification
+# -------------------------
+
+def verify(shadow, expected_points, samples, k=10, min_self_recall=0.8):
+    """Compare the shadow against expectations and the live collection before cutover."""
+    shadow_count = qdrant_service.count_points(shadow)
+    live_count = qdrant_service.get_count()
+    print(f"Points: shadow={shadow_count} expected={expected_points} live={live_count}")
+    counts_ok = shadow_count == expected_points
+
+    docs = [d["file_id"] for d in qa_service.list_documents()]
+    random.shuffle(docs)
+    probes = []
+    for file_id in docs:
+        chunks = [c for c in load_chunks(file_id) if c.get("text", "").strip()]
+        if chunks:
+            probes.append(random.choice(chunks))
+        if len(probes) >= samples:
+            break
+
+    self_hits, overlap_total = 0, 0.0
+    for chunk in probes:
+        query = chunk["text"][:200]
+        shadow_ids = [str(r["chunk_id"]) for r in qdrant_service.search(query, k=k, collection_name=shadow)]
+        live_ids = [str(r["chunk_id"]) for r in qdrant_service.search(query, k=k)]
+        if str(chunk["chunk_id"]) in shadow_ids:
+            self_hits += 1
+        overlap_total += len(set(shadow_ids) & set(live_ids)) / k
+
+    self_recall = self_hits / len(probes) if probes else 1.0
+    overlap = overlap_total / len(probes) if probes else 1.0
+    print(f"Sample queries: {len(probes)}  self-recall@{k}={self_recall:.2f}  overlap with live={overlap:.2f}")
+
+    ok = counts_ok and self_recall >= min_self_recall
+    if not counts_ok:
+        print("VERIFY FAILED: shadow point count does not match the indexed chunks.")
+    if self_recall < min_self_recall:
+        print(f"VERIFY FAILED: self-recall below {min_self_recall}.")
+    return ok
+
+
+# -------------------------
+# Driver
+# -------------------------
+
+def reindex_all(workers=2, run_verify=False, samples=20, fresh=False):
+    print("Starting Global Re-indexing (blue/green)...")
+    if not qdrant_service.is_server_mode:
+        # Embedded store holds a file lock: only server mode can reindex next to a running API
+        print(f"Embedded Qdrant store '{QdrantConfig.DB_PATH}': stop the API before re-indexing (single-process lock).")
+
     # QA Service auto-loads processed docs from disk on init
     docs = qa_service.list_documents()
     print(f"Found {len(docs)} documents in QA Service.")
-    
-    # Clear existing indices to avoid duplicates/conflicts during re-run
-    print("Clearing Vector Stores...")
-    qdrant_service.delete_collection()
-
-    
-    total_chunks = 0
-    
-    for doc in docs:
-        file_id = doc['file_id']
-        print(f"Indexing {doc['file_name']}...")
-        
-        # Force load chunks for indexing
-        if file_id not in qa_service.document_chunks:
-            qa_service.load_processed_document(file_id, load_chunks=True)
-            
-        chunks = qa_service.document_chunks.get(file_id, [])
-        
-        if chunks:
-            # Ensure each chunk has at least basic metadata if missing
-            for i, chunk in enumerate(chunks):
-                if 'doc_id' not in chunk: chunk['doc_id'] = file_id
-                if 'file_id' not in chunk: chunk['file_id'] = file_id
-                if 'chunk_index' not in chunk: chunk['chunk_index'] = i
-            
-            # Fix legacy integer/string chunk_ids to be globally unique
-            for chunk in chunks:
-                cid = chunk.get("chunk_id")
-                # If cid is int, or if it doesn't start with file_id (heuristic), prefix it
-                if isinstance(cid, int) or (isinstance(cid, str) and not cid.startswith(file_id)):
-                     chunk["chunk_id"] = f"{file_id}_{cid}"
-            
-            # 1. Sync to Qdrant (via qdrant_service)
-            qdrant_service.add_documents(chunks)
-            
-
-
-            total_chunks += len(chunks)
-            
-            # Optimize memory: Unload chunks after indexing
-            if file_id in qa_service.document_chunks:
-                del qa_service.document_chunks[file_id]
-            
-    print(f"\n--- Re-indexing Complete ---")
+
+    # Encoders are created lazily: size them before the first batch
+    QdrantConfig.ENCODE_WORKERS = workers
+
+    state = load_checkpoint()
+    if state and fresh:
+        if qdrant_service.collection_exists(state["shadow"]):
+            qdrant_service.drop_shadow_collection(state["shadow"])
+        state = None
+    if state and not qdrant_service.collection_exists(state["shadow"]):
+        print(f"Checkpoint shadow '{state['shadow']}' is gone. Starting over.")
+        state = None
+
+    if state:
+        print(f"Resuming into '{state['shadow']}': {len(state['done'])} documents already indexed.")
+    else:
+        state = {
+            "shadow": qdrant_service.create_shadow_collection(),
+            "done": [],
+            "failed": {},
+            "points": 0,
+            "started_at": time.time()
+        }
+        save_checkpoint(state)
+
+    shadow = state["shadow"]
+    done = set(state["done"])
+    state["failed"] = {}
+    pending = [d["file_id"] for d in docs if d["file_id"] not in done]
+    print(f"Indexing {len(pending)} documents with {workers} workers (live collection keeps serving)...")
+
+    start = time.time()
+    finished = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(index_document, file_id, shadow): file_id for file_id in pending}
+        for future in as_completed(futures):
+            file_id = futures[future]
+            finished += 1
+            try:
+                points = future.result()
+                with _checkpoint_lock:
+                    state["done"].append(file_id)
+                    state["points"] += points
+            except Exception as e:
+                logger.error(f"Failed to index {file_id}: {e}")
+                state["failed"][file_id] = str(e)
+            save_checkpoint(state)
+
+            elapsed = time.time() - start
+            rate = finished / elapsed if elapsed > 0 else 0.0
+            eta = (len(pending) - finished) / rate if rate > 0 else 0.0
+            print(f"  [{finished}/{len(pending)}] {file_id}  {rate:.2f} docs/s  ETA {eta:.0f}s")
+
+    if state["failed"]:
+        print(f"\n{len(state['failed'])} documents failed. Live collection untouched; re-run to resume.")
+        sys.exit(1)
+
+    if run_verify and not verify(shadow, state["points"], samples):
+        print(f"Shadow '{shadow}' kept for inspection; live collection untouched.")
+        sys.exit(1)
+
+    old = qdrant_service.cutover(shadow)
+    CHECKPOINT_FILE.unlink(missing_ok=True)
+
+    print("\n--- Re-indexing Complete ---")
     print(f"Total Documents: {len(docs)}")
-    print(f"Total Chunks: {total_chunks}")
-    print("Qdrant Vector Store is ready for Global RAG.")
+    print(f"Total Points: {state['points']}")
+    print(f"Took: {time.time() - state['started_at']:.1f}s")
+    print(f"'{QdrantConfig.COLLECTION_NAME}' now serves '{shadow}' (dropped '{old}').")
+
 
 if __name__ == "__main__":
-    reindex_all()
+    parser = argparse.ArgumentParser(description="Rebuild the vector index into a shadow collection and swap it in.")
+    parser.add_argument("--workers", type=int, default=2, help="Parallel indexing workers")
+    parser.add_argument("--verify", action="store_true", help="Check counts and sample queries before cutover")
+    parser.add_argument("--samples", type=int, default=20, help="Sample queries for --verify")
+    parser.add_argument("--fresh", action="store_true", help="Discard any checkpoint and its shadow collection")
+    args = parser.parse_args()
+
+    reindex_all(workers=args.workers, run_verify=args.verify, samples=args.samples, fresh=args.fresh)
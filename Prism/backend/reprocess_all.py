@@ -1,8 +1,12 @@
+import os
 import sys
+import json
+import time
 import asyncio
+import argparse
 import logging
 from pathlib import Path
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # Setup environment
 backend_dir = Path(__file__).parent
@@ -12,48 +16,191 @@ from dotenv import load_dotenv
 load_dotenv(backend_dir / ".env")
 
 from app.services.qa_service import qa_service
-from app.services.ingestion_service import ingestion_service
+from app.services.ingestion_service import ingestion_service, IngestionStatus
 from app.services.qdrant_service import qdrant_service
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def reprocess_all():
+CHECKPOINT_FILE = Path("data") / "reprocess_checkpoint.json"
+
+# Heavier document kinds get their own concurrency caps on top of the worker pool
+TYPE_CLASSES = {
+    ".jpg": "vision", ".jpeg": "vision", ".png": "vision", ".webp": "vision",
+    ".mp3": "audio", ".wav": "audio", ".m4a": "audio",
+}
+DEFAULT_TYPE_LIMITS = {"vision": 1, "audio": 1, "ocr": 2}
+
+
+def type_class(file_path):
+    """Concurrency class of a document. PDFs count as "ocr" only when they lack a text layer."""
+    path = Path(file_path)
+    if path.suffix.lower() != ".pdf":
+        return TYPE_CLASSES.get(path.suffix.lower())
+    # Same test as ingestion stage 2, stopping as soon as enough text is found
+    try:
+        import pdfplumber
+        total = 0
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                total += len(page.extract_text() or "")
+                if total >= ingestion_service.OCR_TEXT_THRESHOLD:
+                    return None
+        return "ocr"
+    except Exception as e:
+        logger.warning(f"Could not read text layer of {path.name}: {e}")
+        return "ocr"
+
+
+# -------------------------
+# Checkpoint
+# -------------------------
+
+def load_checkpoint():
+    if not CHECKPOINT_FILE.exists():
+        return None
+    try:
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable checkpoint: {e}")
+        return None
+
+
+def save_checkpoint(state):
+    CHECKPOINT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CHECKPOINT_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    tmp.replace(CHECKPOINT_FILE)
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+
+# -------------------------
+# Driver
+# -------------------------
+
+async def reprocess_all(workers, type_limits, reset=True, fresh=False):
     print("--- Starting Full Reprocess (Re-Parsing & Re-Indexing) ---")
-    
+
     # 1. Get List of Existing Docs
     docs = qa_service.list_documents()
     print(f"Found {len(docs)} documents to reprocess.")
-    
-    # 2. Reset Vector DB
-    print("Clearing Vector Database...")
-    qdrant_service.delete_collection()
-    
-    # 3. Reprocess Each File
+
+    state = None if fresh else load_checkpoint()
+    if state:
+        print(f"Resuming: {len(state['done'])} documents already reprocessed.")
+    else:
+        state = {"started_at": time.time(), "done": [], "failed": {}}
+        # 2. Reset Vector DB (fresh runs only: a resumed run keeps what it already indexed)
+        if reset:
+            print("Clearing Vector Database...")
+            qdrant_service.delete_collection()
+        save_checkpoint(state)
+
+    done = set(state["done"])
+    state["failed"] = {}
+    pending = []
     for doc in docs:
-        file_id = doc['file_id']
-        file_path = doc.get('file_path')
-        
-        if not file_path:
-            print(f"Skipping {file_id}: No file path found.")
+        if doc['file_id'] in done:
+            continue
+        if not doc.get('file_path'):
+            print(f"Skipping {doc['file_id']}: No file path found.")
             continue
-            
-        print(f"Reprocessing: {doc.get('file_name')} ({file_id})...")
-        
-        # Manually create a job object to mimic the queue processing
-        # We call the internal _process_job directly to avoid queue complexity
-        # But we need to ensure the DB job record exists or is updated
-        
-        # Re-add job to Ingestion DB to ensure status tracking works
-        ingestion_service.add_job(file_path, file_id, doc.get('folder_id'))
-        
-        # Run processing directly
-        await ingestion_service._process_job(file_id)
-        
-        print(f"Completed: {doc.get('file_name')}")
-        
+        pending.append(doc)
+
+    # Parsing and encoding run in threads: size the default executor to the pool
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers + 4))
+
+    pool = asyncio.Semaphore(workers)
+    type_semaphores = {kind: asyncio.Semaphore(limit) for kind, limit in type_limits.items()}
+    print(f"Reprocessing {len(pending)} documents: {workers} workers, type limits {type_limits}")
+
+    start = time.time()
+    progress = {"finished": 0}
+
+    async def reprocess(doc):
+        file_id = doc['file_id']
+        kind = await asyncio.to_thread(type_class, doc['file_path'])
+        type_semaphore = type_semaphores.get(kind)
+
+        # Wait for the type cap first so queued heavy documents do not hold pool slots
+        if type_semaphore:
+            await type_semaphore.acquire()
+        try:
+            async with pool:
+                # Re-add job to Ingestion DB to ensure status tracking works
+                ingestion_service.add_job(doc['file_path'], file_id, doc.get('folder_id'))
+                await ingestion_service._process_job(file_id)
+        finally:
+            if type_semaphore:
+                type_semaphore.release()
+
+        # _process_job records failures in the job table instead of raising
+        status = ingestion_service.get_status(file_id) or {}
+        if status.get("status") == IngestionStatus.COMPLETED:
+            state["done"].append(file_id)
+        else:
+            state["failed"][file_id] = status.get("error_message") or "unknown error"
+        save_checkpoint(state)
+
+        progress["finished"] += 1
+        finished = progress["finished"]
+        elapsed = time.time() - start
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = (len(pending) - finished) / rate if rate > 0 else 0.0
+        print(
+            f"  [{finished}/{len(pending)}] {doc.get('file_name')} "
+            f"{'ok' if file_id not in state['failed'] else 'FAILED'}  "
+            f"{rate * 60:.1f} docs/min  ETA {format_eta(eta)}"
+        )
+
+    # 3. Reprocess in parallel
+    await asyncio.gather(*(reprocess(doc) for doc in pending))
+
     print("\n--- Reprocessing Complete ---")
+    print(f"Reprocessed: {len(state['done'])}/{len(docs)} in {format_eta(time.time() - state['started_at'])}")
+    if state["failed"]:
+        print(f"Failed ({len(state['failed'])}): re-run to retry them.")
+        for file_id, error in state["failed"].items():
+            print(f"  {file_id}: {error}")
+    else:
+        CHECKPOINT_FILE.unlink(missing_ok=True)
     print("Please restart the backend server to load the new data.")
 
+
+def parse_type_limits(values):
+    limits = dict(DEFAULT_TYPE_LIMITS)
+    for value in values or []:
+        kind, _, limit = value.partition("=")
+        limits[kind] = int(limit)
+    return limits
+
+
 if __name__ == "__main__":
-    asyncio.run(reprocess_all())
+    parser = argparse.ArgumentParser(description="Re-parse and re-index every document, resumably.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Documents processed concurrently")
+    parser.add_argument(
+        "--limit", action="append", metavar="KIND=N",
+        help=f"Per-type concurrency cap (kinds: vision, audio, ocr). Defaults: {DEFAULT_TYPE_LIMITS}"
+    )
+    parser.add_argument("--no-reset", action="store_true", help="Keep the vector index on a fresh start")
+    parser.add_argument("--fresh", action="store_true", help="Ignore any checkpoint and start over")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(reprocess_all(
+            workers=max(1, args.workers),
+            type_limits=parse_type_limits(args.limit),
+            reset=not args.no_reset,
+            fresh=args.fresh
+        ))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Progress is saved in {CHECKPOINT_FILE}; re-run to resume.")
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+if str(backend_dir) not in sys.path:
+    sys.path.insert(0, str(backend_dir))
+
+
+def pytest_sessionstart(session):
+    # Service singletons create their sqlite stores under ./data on import: keep them out of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="prism-tests-"))
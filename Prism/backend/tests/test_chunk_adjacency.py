@@ -0,0 +1,37 @@
+from app.services.chunk_adjacency import ChunkAdjacencyIndex
+
+
+def make_index(tmp_path):
+    index = ChunkAdjacencyIndex(str(tmp_path / "adjacency.db"))
+    index.index_document("doc1", [{"chunk_id": f"c{i}"} for i in range(5)])
+    return index
+
+
+def test_neighbors_closest_first(tmp_path):
+    neighbors = make_index(tmp_path).neighbors("doc1", "c2", window=2)
+    assert [(n["chunk_id"], n["offset"]) for n in neighbors] == [
+        ("c1", -1), ("c3", 1), ("c0", -2), ("c4", 2)
+    ]
+    assert neighbors[0]["position"] == 1
+
+
+def test_neighbors_stop_at_document_edges(tmp_path):
+    index = make_index(tmp_path)
+    assert [n["chunk_id"] for n in index.neighbors("doc1", "c0", window=1)] == ["c1"]
+    assert [n["chunk_id"] for n in index.neighbors("doc1", "c4", window=1)] == ["c3"]
+
+
+def test_unknown_chunk_and_zero_window(tmp_path):
+    index = make_index(tmp_path)
+    assert index.neighbors("doc1", "missing", window=1) == []
+    assert index.neighbors("doc2", "c1", window=1) == []
+    assert index.neighbors("doc1", "c2", window=0) == []
+
+
+def test_reindex_and_remove(tmp_path):
+    index = make_index(tmp_path)
+    index.index_document("doc1", [{"chunk_id": "a"}, {"chunk_id": "b"}])
+    assert [n["chunk_id"] for n in index.neighbors("doc1", "a", window=3)] == ["b"]
+    assert index.neighbors("doc1", "c1", window=1) == []
+    index.remove_document("doc1")
+    assert index.neighbors("doc1", "a", window=1) == []
@@ -0,0 +1,53 @@
+from app.services.document_router_service import DocumentRouter
+
+
+def make_router():
+    router = DocumentRouter()
+    router.enabled = True
+    router.rebuild({
+        "budget.xlsx": {"file_name": "budget.xlsx"},
+        "travel_policy.pdf": {"file_name": "travel_policy.pdf"},
+        "Q3_Board_Deck_2023.pdf": {"file_name": "Q3_Board_Deck_2023.pdf"},
+        "employee-handbook.docx": {"file_name": "employee-handbook.docx", "title": "Employee Handbook and Leave Policy"},
+    })
+    return router
+
+
+def test_multi_word_name_scopes_hard():
+    route = make_router().route("what does the travel policy say about hotels")
+    assert route["file_id"] == "travel_policy.pdf"
+    assert route["scope"] == "hard"
+
+
+def test_file_id_mention_scopes_hard():
+    route = make_router().route("what is in budget.xlsx")
+    assert route["file_id"] == "budget.xlsx"
+    assert route["match"] == "file_id"
+    assert route["scope"] == "hard"
+    # Quoted, punctuated or differently cased mentions still match
+    assert make_router().route("Summarize 'Q3_Board_Deck_2023.PDF'?")["match"] == "file_id"
+
+
+def test_single_word_name_is_only_a_soft_hint():
+    route = make_router().route("What is the travel budget for the trip?")
+    assert route["file_id"] == "budget.xlsx"
+    assert route["scope"] == "soft"
+
+
+def test_fuzzy_title_match():
+    route = make_router().route("leave rules in the employe handbook")
+    assert route["file_id"] == "employee-handbook.docx"
+
+
+def test_no_match_and_ambiguity():
+    router = make_router()
+    assert router.route("what is churn") is None
+    # Names two documents: nothing is picked
+    assert router.route("compare the q3 board deck 2023 with the employee handbook") is None
+
+
+def test_scope_and_removal():
+    router = make_router()
+    assert router.route("what does the travel policy say", file_ids=["budget.xlsx"]) is None
+    router.remove("travel_policy.pdf")
+    assert router.route("what does the travel policy say") is None
@@ -0,0 +1,35 @@
+from ingestion.chunker import extract_identifiers, is_strong_identifier
+
+
+def test_codes_are_extracted_with_and_without_separators():
+    found = extract_identifiers("Invoice INV-2023-001 covers part QD109.")
+    assert "inv-2023-001" in found
+    assert "inv2023001" in found
+    assert "qd109" in found
+
+
+def test_emails_long_numbers_and_units():
+    found = extract_identifiers("Mail ops@example.com about order 1234567, a 5 kg box at 10%.")
+    assert "ops@example.com" in found
+    assert "1234567" in found
+    assert "5kg" in found
+    assert "10%" in found
+
+
+def test_everyday_tokens_are_not_identifiers():
+    found = extract_identifiers("The 2nd review at 10am of the 30-day and 24-hour windows")
+    assert "2nd" not in found
+    assert "10am" not in found
+    assert "30-day" not in found
+    assert "24-hour" not in found
+
+
+def test_strong_identifiers():
+    for token in ("qd109", "inv2023001", "inv-2023-001", "ops@example.com", "1234567"):
+        assert is_strong_identifier(token), token
+
+
+def test_weak_identifiers():
+    # Too short, no letters, a measurement, an ordinal or a time of day
+    for token in ("a1", "v2", "2023", "10%", "5kg", "2nd", "21st", "10am", "9.30pm", "10AM"):
+        assert not is_strong_identifier(token), token
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from app.services.deadline import RequestCancelled
+from app.services.llm_service import LLMGateway, LLMQueueTimeout
+
+LANES = {
+    "interactive": {"max_concurrency": 2, "max_wait_s": 5},
+    "tabular": {"max_concurrency": 1, "max_wait_s": 5},
+    "ingestion": {"max_concurrency": 1, "max_wait_s": 0},
+}
+
+
+def run_in_slot(gateway, lane, order, name, hold):
+    with gateway.slot(lane):
+        order.append(name)
+        hold.wait(5)
+
+
+def test_higher_lane_is_admitted_first():
+    gateway = LLMGateway(LANES, max_inflight=1)
+    order = []
+    release = [threading.Event() for _ in range(3)]
+
+    first = threading.Thread(target=run_in_slot, args=(gateway, "ingestion", order, "ingestion-1", release[0]))
+    first.start()
+    while not order:
+        time.sleep(0.01)
+
+    # Queued behind the running call: ingestion first, then a question
+    queued = [
+        threading.Thread(target=run_in_slot, args=(gateway, "ingestion", order, "ingestion-2", release[1])),
+        threading.Thread(target=run_in_slot, args=(gateway, "interactive", order, "question", release[2])),
+    ]
+    for thread in queued:
+        thread.start()
+        time.sleep(0.05)
+    assert gateway.metrics()["lanes"]["ingestion"]["queued"] == 1
+    assert gateway.metrics()["lanes"]["interactive"]["queued"] == 1
+
+    for event in release:
+        event.set()
+    for thread in [first] + queued:
+        thread.join(5)
+    assert order == ["ingestion-1", "question", "ingestion-2"]
+
+
+def test_lane_cap_holds_below_the_global_limit():
+    gateway = LLMGateway(LANES, max_inflight=4)
+    hold = threading.Event()
+    order = []
+    thread = threading.Thread(target=run_in_slot, args=(gateway, "tabular", order, "tab-1", hold))
+    thread.start()
+    while not order:
+        time.sleep(0.01)
+    # One tabular call at a time even though the gateway has room
+    lanes = dict(LANES, tabular={"max_concurrency": 1, "max_wait_s": 0.2})
+    gateway.lanes = lanes
+    with pytest.raises(LLMQueueTimeout):
+        with gateway.slot("tabular"):
+            pass
+    hold.set()
+    thread.join(5)
+    assert gateway.metrics()["lanes"]["tabular"]["timeouts"] == 1
+
+
+def test_queue_wait_past_slo_times_out():
+    lanes = dict(LANES, interactive={"max_concurrency": 1, "max_wait_s": 0.2})
+    gateway = LLMGateway(lanes, max_inflight=1)
+    hold = threading.Event()
+    order = []
+    thread = threading.Thread(target=run_in_slot, args=(gateway, "interactive", order, "long", hold))
+    thread.start()
+    while not order:
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    with pytest.raises(LLMQueueTimeout):
+        with gateway.slot("interactive"):
+            pass
+    assert time.monotonic() - start < 2
+    hold.set()
+    thread.join(5)
+
+    metrics = gateway.metrics()
+    assert metrics["lanes"]["interactive"]["timeouts"] == 1
+    assert metrics["lanes"]["interactive"]["queued"] == 0
+    assert metrics["in_flight"] == 0
+
+
+def test_cancelled_request_leaves_the_queue():
+    gateway = LLMGateway(LANES, max_inflight=1)
+    hold = threading.Event()
+    order = []
+    thread = threading.Thread(target=run_in_slot, args=(gateway, "interactive", order, "long", hold))
+    thread.start()
+    while not order:
+        time.sleep(0.01)
+
+    with pytest.raises(RequestCancelled):
+        with gateway.slot("tabular", should_stop=lambda: True):
+            pass
+    hold.set()
+    thread.join(5)
+    assert gateway.metrics()["lanes"]["tabular"]["cancelled_while_queued"] == 1
+
+
+def test_unknown_lane():
+    with pytest.raises(ValueError):
+        with LLMGateway(LANES, max_inflight=1).slot("batch"):
+            pass
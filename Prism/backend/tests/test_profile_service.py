@@ -0,0 +1,72 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.services.profile_service import DEFAULT_SETTINGS, ProfileService
+
+
+def write_profiles(path, data, bump=0):
+    path.write_text(json.dumps(data) if isinstance(data, dict) else data)
+    # Make the change visible even on filesystems with coarse mtimes
+    stamp = time.time() + bump
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.fixture
+def profiles_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("RETRIEVAL_PROFILE", raising=False)
+    path = tmp_path / "retrieval_profiles.json"
+    write_profiles(path, {
+        "default": "balanced",
+        "profiles": {
+            "low_latency": {"search_k": 60, "pass2": False},
+            "balanced": {},
+            "high_recall": {"search_k": 400},
+        },
+    })
+    return path
+
+
+def test_profiles_override_defaults(profiles_file):
+    service = ProfileService(str(profiles_file))
+    assert service.get()["name"] == "balanced"
+    assert service.get()["search_k"] == DEFAULT_SETTINGS["search_k"]
+    low = service.get("low_latency")
+    assert low["search_k"] == 60
+    assert low["pass2"] is False
+    assert low["chunk_chars"] == DEFAULT_SETTINGS["chunk_chars"]
+
+
+def test_unknown_profile_falls_back_to_default(profiles_file):
+    assert ProfileService(str(profiles_file)).get("nope")["name"] == "balanced"
+
+
+def test_environment_picks_the_default(profiles_file, monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_PROFILE", "high_recall")
+    assert ProfileService(str(profiles_file)).get()["search_k"] == 400
+
+
+def test_edits_apply_without_restart(profiles_file):
+    service = ProfileService(str(profiles_file))
+    assert service.get("low_latency")["search_k"] == 60
+    write_profiles(profiles_file, {"default": "low_latency", "profiles": {"low_latency": {"search_k": 77}}}, bump=5)
+    assert service.get()["name"] == "low_latency"
+    assert service.get()["search_k"] == 77
+
+
+def test_invalid_file_keeps_last_good_profiles(profiles_file):
+    service = ProfileService(str(profiles_file))
+    assert service.get("low_latency")["search_k"] == 60
+    write_profiles(profiles_file, "{not json", bump=5)
+    assert service.get("low_latency")["search_k"] == 60
+    write_profiles(profiles_file, {"profiles": {}}, bump=10)
+    assert service.get("low_latency")["search_k"] == 60
+
+
+def test_missing_file_serves_built_in_defaults(tmp_path, monkeypatch):
+    monkeypatch.delenv("RETRIEVAL_PROFILE", raising=False)
+    settings = ProfileService(str(tmp_path / "missing.json")).get()
+    assert settings["name"] == "balanced"
+    assert settings["search_k"] == DEFAULT_SETTINGS["search_k"]
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("qdrant_client")
+pytest.importorskip("fastembed")
+
+from app.services.qdrant_service import QdrantConfig, QdrantVectorService  # noqa: E402
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    """A service whose scope sizes come from a table instead of a collection."""
+    sizes = {"total": 100_000, "small-doc": 300, "big-folder": 80_000, "narrow-folder": 5_000}
+    service = QdrantVectorService()
+
+    def cardinality(folder_id=None, file_id=None, file_type=None, collection_name=None, doc_ids=None):
+        return sizes.get(file_id or folder_id or "total", 0)
+
+    monkeypatch.setattr(service, "get_filter_cardinality", cardinality)
+    return service
+
+
+def test_unscoped_search_uses_ann(planner):
+    plan = planner._plan_search("prism_vectors", k=40)
+    assert plan["strategy"] == "ann"
+    assert plan["ef"] >= 80
+
+
+def test_small_scope_is_scored_exhaustively(planner):
+    plan = planner._plan_search("prism_vectors", k=40, file_id="small-doc")
+    assert plan["strategy"] == "exhaustive"
+    assert plan["scope_size"] == 300
+
+
+def test_k_is_capped_at_an_exact_scope_size(planner):
+    planner._catalog_complete.add("prism_vectors")
+    plan = planner._plan_search("prism_vectors", k=500, file_id="small-doc")
+    assert plan["exact"]
+    assert plan["k"] == 300
+
+
+def test_estimated_scope_size_never_caps_k(planner):
+    planner._catalog_complete.discard("prism_vectors")
+    plan = planner._plan_search("prism_vectors", k=500, file_id="small-doc")
+    assert not plan["exact"]
+    assert plan["k"] == 500
+    # An estimated empty scope still searches
+    assert planner._plan_search("prism_vectors", k=40, file_id="missing-doc")["k"] == 40
+
+
+def test_large_scope_uses_filtered_ann_with_ef_from_selectivity(planner):
+    broad = planner._plan_search("prism_vectors", k=40, folder_id="big-folder")
+    narrow = planner._plan_search("prism_vectors", k=40, folder_id="narrow-folder")
+    assert broad["strategy"] == narrow["strategy"] == "filtered_ann"
+    assert broad["selectivity"] == 0.8
+    # Narrow filters prune most graph neighbours and get the wide beam
+    assert narrow["ef"] == QdrantConfig.SEARCH_EF
+    assert broad["ef"] < narrow["ef"]
+
+
+def test_profile_overrides_the_exhaustive_limit(planner):
+    plan = planner._plan_search("prism_vectors", k=40, folder_id="narrow-folder", profile={"exhaustive_scope_max": 10_000})
+    assert plan["strategy"] == "exhaustive"
@@ -0,0 +1,78 @@
+import asyncio
+
+from app.services.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("q", work) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["answer"] * 3
+    assert len(calls) == 1
+    metrics = flight.metrics()
+    assert metrics["executed"] == 1
+    assert metrics["coalesced"] == 2
+    assert metrics["in_flight"] == 0
+
+
+def test_nothing_is_cached_after_completion():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return [await flight.do("q", work), await flight.do("q", work)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_one_waiter_leaving_keeps_the_call_running():
+    flight = SingleFlight("test")
+    aborted = []
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("q", work, abort=lambda: aborted.append(1)))
+        second = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+    assert not aborted
+
+
+def test_last_waiter_leaving_aborts_the_call():
+    flight = SingleFlight("test")
+    aborted = []
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        waiters = [asyncio.ensure_future(flight.do("q", work, abort=lambda: aborted.append(1))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        # The key is free again: the next caller starts a fresh call
+        return flight.metrics()["in_flight"]
+
+    assert asyncio.run(main()) == 0
+    assert aborted == [1]
+    assert flight.metrics()["abandoned"] == 1